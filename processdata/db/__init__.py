@@ -0,0 +1,46 @@
+"""processdata各脚本共用的数据库连接池
+
+用法:
+    from db import get_pool
+
+    pool = get_pool(driver='mysql-connector')
+    with pool.connection() as conn:
+        ...
+
+连接参数默认连接本地的lunwen库，可通过 LUNWEN_DB_HOST / LUNWEN_DB_PORT /
+LUNWEN_DB_USER / LUNWEN_DB_PASSWORD / LUNWEN_DB_NAME / LUNWEN_DB_DRIVER 等环境变量修改。
+"""
+
+from .config import (
+    DRIVER_PYMYSQL,
+    DRIVER_MYSQL_CONNECTOR,
+    load_db_config,
+    describe_config
+)
+from .pool import (
+    ConnectionPool,
+    PoolTimeoutError,
+    get_pool,
+    pool_metrics,
+    close_all_pools
+)
+from .versions import (
+    DATA_VERSIONS_TABLE,
+    bump_table_version,
+    read_table_version
+)
+
+__all__ = [
+    'DRIVER_PYMYSQL',
+    'DRIVER_MYSQL_CONNECTOR',
+    'load_db_config',
+    'describe_config',
+    'ConnectionPool',
+    'PoolTimeoutError',
+    'get_pool',
+    'pool_metrics',
+    'close_all_pools',
+    'DATA_VERSIONS_TABLE',
+    'bump_table_version',
+    'read_table_version'
+]
@@ -0,0 +1,54 @@
+import os
+
+# 支持的数据库驱动
+DRIVER_PYMYSQL = 'pymysql'
+DRIVER_MYSQL_CONNECTOR = 'mysql-connector'
+
+# 默认配置，可通过环境变量覆盖
+DEFAULT_DB_CONFIG = {
+    'host': 'localhost',
+    'port': 3306,
+    'user': 'root',
+    'password': '123456',
+    'database': 'lunwen',
+    'charset': 'utf8mb4',
+    'driver': DRIVER_PYMYSQL
+}
+
+# 环境变量与配置项的对应关系
+ENV_VARS = {
+    'host': 'LUNWEN_DB_HOST',
+    'port': 'LUNWEN_DB_PORT',
+    'user': 'LUNWEN_DB_USER',
+    'password': 'LUNWEN_DB_PASSWORD',
+    'database': 'LUNWEN_DB_NAME',
+    'charset': 'LUNWEN_DB_CHARSET',
+    'driver': 'LUNWEN_DB_DRIVER'
+}
+
+# 连接池参数
+DEFAULT_POOL_SIZE = int(os.environ.get('LUNWEN_DB_POOL_SIZE', '5'))
+DEFAULT_POOL_TIMEOUT = float(os.environ.get('LUNWEN_DB_POOL_TIMEOUT', '30'))
+# 空闲超过该秒数的连接在取出前先ping一次
+DEFAULT_HEALTH_CHECK_INTERVAL = float(os.environ.get('LUNWEN_DB_HEALTH_CHECK_INTERVAL', '30'))
+
+def load_db_config(**overrides):
+    """读取数据库配置：默认值 < 环境变量 < 调用方传入的参数
+
+    overrides中值为None的项会被忽略；database传空字符串表示不指定数据库。
+    """
+    config = dict(DEFAULT_DB_CONFIG)
+    for key, env_name in ENV_VARS.items():
+        if os.environ.get(env_name) is not None:
+            config[key] = os.environ[env_name]
+    for key, value in overrides.items():
+        if value is not None:
+            config[key] = value
+    config['port'] = int(config['port'])
+    if config['driver'] not in (DRIVER_PYMYSQL, DRIVER_MYSQL_CONNECTOR):
+        raise ValueError(f"不支持的数据库驱动: {config['driver']}")
+    return config
+
+def describe_config(config):
+    """用于打印的配置（隐藏密码）"""
+    return {k: ('******' if k == 'password' else v) for k, v in config.items()}
@@ -0,0 +1,228 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import (
+    DRIVER_PYMYSQL,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_POOL_TIMEOUT,
+    DEFAULT_HEALTH_CHECK_INTERVAL,
+    load_db_config,
+    describe_config
+)
+
+class PoolTimeoutError(Exception):
+    """在超时时间内没有可用的连接"""
+
+def _connect(config):
+    """按配置中的驱动创建一个新连接"""
+    params = {k: v for k, v in config.items() if k not in ('driver', 'options')}
+    if not params.get('database'):
+        params.pop('database', None)
+    params.update(config.get('options', {}))
+    if config['driver'] == DRIVER_PYMYSQL:
+        import pymysql
+        return pymysql.connect(**params)
+    import mysql.connector
+    return mysql.connector.connect(**params)
+
+def _ping(connection, driver):
+    """检查连接是否可用，断开时尝试重连"""
+    if driver == DRIVER_PYMYSQL:
+        connection.ping(reconnect=True)
+    else:
+        connection.ping(reconnect=True, attempts=1, delay=0)
+
+class ConnectionPool:
+    """线程安全的数据库连接池，同时支持mysql-connector和pymysql"""
+
+    def __init__(self, config, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        self.config = config
+        self.driver = config['driver']
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.idle = []  # [(connection, 放回时间)]，后进先出，优先复用最近用过的连接
+        self.in_use = set()
+        self.closed = False
+        self.condition = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'closed': 0,
+            'acquired': 0,
+            'reused': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0
+        }
+
+    def acquire(self, timeout=None):
+        """取出一个连接，池满时等待其他线程归还"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            waited = False
+            wait_start = time.monotonic()
+            while True:
+                if self.closed:
+                    raise RuntimeError("连接池已关闭")
+                if self.idle:
+                    connection, released_at = self.idle.pop()
+                    break
+                if len(self.in_use) < self.max_size:
+                    connection, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"等待数据库连接超时（{timeout}秒），连接池大小: {self.max_size}")
+                waited = True
+                self.condition.wait(remaining)
+            if waited:
+                self.stats['waits'] += 1
+                self.stats['wait_time'] += time.monotonic() - wait_start
+            # 先占位，在锁外建立连接或做健康检查
+            placeholder = object()
+            self.in_use.add(placeholder)
+
+        try:
+            if connection is not None and time.monotonic() - released_at > self.health_check_interval:
+                if not self._check(connection):
+                    connection = None
+            if connection is None:
+                connection = _connect(self.config)
+                reused = False
+            else:
+                reused = True
+        except Exception:
+            with self.condition:
+                self.in_use.discard(placeholder)
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.in_use.discard(placeholder)
+            self.in_use.add(connection)
+            self.stats['acquired'] += 1
+            if reused:
+                self.stats['reused'] += 1
+            else:
+                self.stats['created'] += 1
+        return connection
+
+    def release(self, connection, discard=False):
+        """归还连接；会回滚未提交的事务，避免下一个使用者看到旧的事务快照"""
+        if connection is None:
+            return
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        with self.condition:
+            self.in_use.discard(connection)
+            if discard or self.closed:
+                self._close(connection)
+            else:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """with get_pool().connection() as conn: ... 用完自动归还"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def _check(self, connection):
+        try:
+            _ping(connection, self.driver)
+            return True
+        except Exception:
+            self.stats['health_check_failures'] += 1
+            self._close(connection)
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self.stats['closed'] += 1
+
+    def health_check(self):
+        """检查所有空闲连接，移除失效的连接，返回检查结果"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+        healthy = []
+        for connection, _ in idle:
+            if self._check(connection):
+                healthy.append((connection, time.monotonic()))
+        with self.condition:
+            self.idle.extend(healthy)
+            self.condition.notify_all()
+        return {'checked': len(idle), 'healthy': len(healthy), 'removed': len(idle) - len(healthy)}
+
+    def metrics(self):
+        with self.condition:
+            return dict(
+                self.stats,
+                config=describe_config(self.config),
+                max_size=self.max_size,
+                in_use=len(self.in_use),
+                idle=len(self.idle)
+            )
+
+    def close(self):
+        """关闭所有空闲连接；使用中的连接在归还时关闭"""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.condition.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+# 按配置共享的连接池
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(database=None, driver=None, max_size=None, timeout=None, **options):
+    """获取（或创建）与配置对应的共享连接池
+
+    options为驱动相关的额外连接参数，例如pymysql的cursorclass、
+    mysql-connector的use_pure等；不同的options使用不同的连接池。
+    """
+    config = load_db_config(database=database, driver=driver)
+    config['options'] = options
+    key = (
+        config['driver'], config['host'], config['port'], config['user'],
+        config['database'], config['charset'],
+        tuple(sorted((k, repr(v)) for k, v in options.items()))
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(
+                config,
+                max_size=DEFAULT_POOL_SIZE if max_size is None else max_size,
+                timeout=DEFAULT_POOL_TIMEOUT if timeout is None else timeout
+            )
+            _pools[key] = pool
+        return pool
+
+def pool_metrics():
+    """所有连接池的统计信息"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.metrics() for pool in pools]
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,35 @@
+"""数据表的版本号：导入脚本写入数据后递增，读取方据此低成本地判断数据是否变化"""
+
+DATA_VERSIONS_TABLE = 'data_versions'
+
+def _first_value(row):
+    # pymysql的DictCursor返回字典，其余游标返回元组
+    if row is None:
+        return None
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+def bump_table_version(cursor, table):
+    """数据表写入新数据后调用，把该表的版本号加1（调用方负责提交）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_VERSIONS_TABLE} (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute(f"""
+        INSERT INTO {DATA_VERSIONS_TABLE} (table_name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (table,))
+
+def read_table_version(cursor, table):
+    """读取数据表的版本号；版本表或记录不存在时返回None"""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (DATA_VERSIONS_TABLE,)
+    )
+    if not _first_value(cursor.fetchone()):
+        return None
+    cursor.execute(f"SELECT version FROM {DATA_VERSIONS_TABLE} WHERE table_name = %s", (table,))
+    version = _first_value(cursor.fetchone())
+    return None if version is None else int(version)
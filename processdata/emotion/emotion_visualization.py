@@ -4,28 +4,46 @@ import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
 import hdbscan
 import umap
+from pynndescent import NNDescent
+from sklearn.neighbors import NearestNeighbors
+from sklearn.manifold import trustworthiness
 import mysql.connector
 from scipy.interpolate import splprep, splev
 import seaborn as sns
 import argparse
 from matplotlib.widgets import Button, CheckButtons
 import matplotlib.patches as patches
+import sys
+import os
+import time
+import json
+import itertools
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 导入上级目录的公共模块：数据库连接池、可视化缓存（写入新结果后通知websocket服务器刷新缓存）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_pool, describe_config, DRIVER_MYSQL_CONNECTOR
+import emotion_snapshot
+import umap_models
+try:
+    from visualization_cache import mark_visualization_updated
+except ImportError:
+    mark_visualization_updated = None
 
 # 设置中文字体显示
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
 plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 
 # 数据库配置
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'lunwen',
-    'charset': 'utf8mb4',
+# 连接参数（主机、用户、数据库等）见db/config.py，可用环境变量覆盖
+DB_OPTIONS = {
     'connect_timeout': 600,  # 连接超时时间设为10分钟
     'raise_on_warnings': True,  # 显示警告信息
     'use_pure': True  # 使用纯Python实现，避免C扩展可能的问题
 }
+db_pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR, **DB_OPTIONS)
 
 # 情感映射字典
 EMOTION_MAP = {
@@ -67,12 +85,40 @@ EMOTION_CLASS_COLORS = [
     EMOTION_COLORS['怒']
 ]
 
-def get_data_from_db():
-    """从数据库获取情感概率数据"""
+# 保存的UMAP模型名称（见umap_models.py）
+EMOTION_MODEL_NAME = 'emotion_umap'
+# 增量模式下新增、变化、删除的诗词超过训练数据的该比例时完整重新拟合
+DEFAULT_REFIT_THRESHOLD = 0.1
+# 参数扫描时计算trustworthiness的抽样数量和邻居数
+DEFAULT_SWEEP_SAMPLE = 2000
+DEFAULT_TRUST_NEIGHBORS = 10
+
+# 降维结果按运行（run）保存：数据表保存所有运行的结果，指针表记录当前运行，
+# 读取方使用的emotion_probability_visualization是只包含当前运行的视图
+VIS_TABLE = 'emotion_probability_visualization'
+VIS_DATA_TABLE = 'emotion_probability_visualization_data'
+VIS_RUNS_TABLE = 'emotion_probability_visualization_runs'
+VIS_ACTIVE_TABLE = 'emotion_probability_visualization_active'
+VIS_COLUMNS = ['poem_id', 'original_emotion', 'si_prob', 'le_prob', 'ai_prob', 'xi_prob', 'nu_hao_prob',
+               'umap_x', 'umap_y', 'cluster_label']
+# 保留最近几次完成的运行（当前运行始终保留）
+DEFAULT_KEEP_RUNS = 3
+# 每次executemany写入的行数（都在同一个事务中）
+DEFAULT_WRITE_BATCH = 10000
+
+def get_data_from_db(snapshot_mode='auto'):
+    """从数据库获取情感概率数据
+
+    snapshot_mode不为off且安装了pyarrow时使用本地Arrow快照（见emotion_snapshot.py），
+    数据表的行数、最大id和版本号未变化时不再全表查询。
+    """
+    if snapshot_mode != 'off' and emotion_snapshot.snapshot_available():
+        return emotion_snapshot.load_emotion_data(db_pool, snapshot_mode)
+
     try:
         print("正在连接数据库...")
-        print(f"连接配置: {DB_CONFIG}")
-        conn = mysql.connector.connect(**DB_CONFIG)
+        print(f"连接配置: {describe_config(db_pool.config)}")
+        conn = db_pool.acquire()
         print("数据库连接成功")
         
         cursor = conn.cursor()
@@ -121,17 +167,23 @@ def get_data_from_db():
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
-            print("数据库连接已关闭")
+            db_pool.release(conn)
+            print("数据库连接已归还连接池")
 
 def get_vectors_from_probabilities(df):
     """从概率数据中提取情感向量"""
+    # 从快照读取的数据已带有float32向量矩阵（直接映射快照文件，已填充缺失值）
+    if 'vectors' in df.attrs:
+        vectors = df.attrs['vectors']
+        print(f"成功构建{len(vectors)}个情感概率向量")
+        return vectors
+
     # 提取概率列形成向量矩阵
-    prob_columns = ['si_prob', 'le_prob', 'ai_prob', 'xi_prob', 'nu_hao_prob']
+    prob_columns = emotion_snapshot.VECTOR_COLUMNS
     vectors = df[prob_columns].values
     
-    # 确保数据是浮点型
-    vectors = vectors.astype(float)
+    # 确保数据是浮点型（数据库中为FLOAT，float32可无损表示）
+    vectors = vectors.astype(np.float32)
     
     # 检查是否有缺失值，用0填充
     if np.isnan(vectors).any():
@@ -141,38 +193,50 @@ def get_vectors_from_probabilities(df):
     print(f"成功构建{len(vectors)}个情感概率向量")
     return vectors
 
-def classify_by_dominant_emotion(vectors):
-    """直接根据主导情感（概率最高的情感）进行分类"""
-    # 找出每个向量的主导情感（概率最高的）
+def enhance_dominant_emotion(vectors, boost=1.5):
+    """一次计算主导情感标签和增强后的向量
+
+    主导情感（每行概率最高的一项，并列时取第一个）乘以boost后按行重新归一化，
+    行和为0的向量保持不变。返回 (dominant_emotions, enhanced_vectors)。
+    """
     dominant_emotions = np.argmax(vectors, axis=1)
     
+    enhanced_vectors = np.array(vectors, copy=True)
+    enhanced_vectors[np.arange(len(enhanced_vectors)), dominant_emotions] *= boost
+    row_sums = enhanced_vectors.sum(axis=1, keepdims=True)
+    np.divide(enhanced_vectors, row_sums, out=enhanced_vectors, where=row_sums > 0)
+    
+    return dominant_emotions, enhanced_vectors
+
+def classify_by_dominant_emotion(vectors, dominant_emotions=None):
+    """直接根据主导情感（概率最高的情感）进行分类
+
+    已由enhance_dominant_emotion算出标签时可通过dominant_emotions传入，避免重复计算。
+    """
+    # 找出每个向量的主导情感（概率最高的）
+    if dominant_emotions is None:
+        dominant_emotions = np.argmax(vectors, axis=1)
+    
     # 统计每种情感的数量
-    emotion_counts = {}
+    counts = np.bincount(dominant_emotions, minlength=5)
     for i in range(5):  # 5种情感
-        count = np.sum(dominant_emotions == i)
-        emotion_name = EMOTION_NAMES[i]
-        emotion_counts[emotion_name] = count
-        print(f"情感 '{emotion_name}' 主导的诗歌有 {count} 首")
+        print(f"情感 '{EMOTION_NAMES[i]}' 主导的诗歌有 {counts[i]} 首")
     
     return dominant_emotions
 
-def reduce_dimensions(vectors, n_components=2, n_neighbors=15, min_dist=0.1, spread=1.0, scale=1.2, random_state=42):
-    """使用监督式UMAP进行降维，利用情感标签引导降维过程"""
-    # 直接使用原始向量进行处理
-    enhanced_vectors = vectors.copy()
-    
-    # 找出每个向量的主导情感（概率最高的）
-    dominant_emotions = np.argmax(vectors, axis=1)
-    
-    # 应用情感权重增强，让主导情感更显著
-    for i in range(len(enhanced_vectors)):
-        # 找出每行的最大值（主导情感）
-        max_idx = np.argmax(enhanced_vectors[i])
-        # 强化主导情感的权重
-        enhanced_vectors[i, max_idx] *= 1.5  # 增强主导情感与其他情感的差距
-        # 重新归一化
-        if np.sum(enhanced_vectors[i]) > 0:
-            enhanced_vectors[i] = enhanced_vectors[i] / np.sum(enhanced_vectors[i])
+def reduce_dimensions(vectors, n_components=2, n_neighbors=15, min_dist=0.1, spread=1.0, scale=1.2, random_state=42,
+                      prepared=None, return_model=False, precomputed_knn=(None, None, None)):
+    """使用监督式UMAP进行降维，利用情感标签引导降维过程
+
+    prepared为enhance_dominant_emotion的返回值，传入时不再重复预处理。
+    return_model为True时返回 (coords, model)，model包含拟合好的reducer和坐标标准化参数，
+    可用place_new_poems放置新诗词。
+    precomputed_knn为预先计算的 (knn_indices, knn_dists)，列数需等于n_neighbors（见compute_knn_graph）。
+    """
+    # 应用情感权重增强，让主导情感更显著（主导情感×1.5后重新归一化）
+    if prepared is None:
+        prepared = enhance_dominant_emotion(vectors)
+    dominant_emotions, enhanced_vectors = prepared
     
     # 使用监督式UMAP降维，利用情感类别标签引导降维
     reducer = umap.UMAP(
@@ -187,18 +251,219 @@ def reduce_dimensions(vectors, n_components=2, n_neighbors=15, min_dist=0.1, spr
         target_weight=0.5,            # 标签信息的权重
         transform_seed=random_state,
         target_metric='categorical',  # 使用类别度量
-        target_n_neighbors=5          # 标签相似性考虑的邻居数
+        target_n_neighbors=5,         # 标签相似性考虑的邻居数
+        precomputed_knn=precomputed_knn
     )
     
     # 执行有监督降维，将类别标签作为监督信息
     coords = reducer.fit_transform(enhanced_vectors, y=dominant_emotions)
     
     # 标准化并调整分散程度
-    coords = (coords - coords.mean(axis=0)) / coords.std(axis=0)
+    mean, std = coords.mean(axis=0), coords.std(axis=0)
+    coords = (coords - mean) / std
     coords *= scale  # 缩放因子
     
+    if return_model:
+        return coords, {'reducer': reducer, 'mean': mean, 'std': std, 'scale': scale}
     return coords
 
+def place_new_poems(model, vectors):
+    """用已拟合的模型把新诗词投影到现有坐标系，返回 (主导情感标签, 坐标)"""
+    labels, enhanced_vectors = enhance_dominant_emotion(vectors)
+    coords = model['reducer'].transform(enhanced_vectors)
+    coords = (coords - model['mean']) / model['std'] * model['scale']
+    return labels, coords
+
+def save_emotion_model(model, params, df, vectors, run_id=None):
+    """保存拟合好的UMAP模型，连同UMAP参数、训练数据、训练数据指纹和结果所在的运行ID"""
+    poem_ids = df['poemId'].astype(str).to_numpy()
+    payload = dict(
+        model,
+        params=params,
+        run_id=run_id,
+        poem_ids=poem_ids,
+        vectors=np.asarray(vectors, dtype=np.float32),
+        placed_ids=[],  # 之后增量放置的诗词
+        fingerprint=umap_models.data_fingerprint(poem_ids, vectors),
+        fitted_at=time.time()
+    )
+    path = umap_models.save_model(EMOTION_MODEL_NAME, payload)
+    print(f"UMAP模型已保存到: {path}")
+
+def compare_with_model(model, poem_ids, vectors):
+    """对比当前数据与模型的训练数据
+
+    返回 (新增诗词的布尔掩码, 向量发生变化的训练诗词数, 已删除的训练诗词数)。
+    """
+    known_ids = set(model['poem_ids']).union(model['placed_ids'])
+    new_mask = ~pd.Series(poem_ids).isin(known_ids).to_numpy()
+    
+    columns = emotion_snapshot.VECTOR_COLUMNS
+    trained = pd.DataFrame(model['vectors'], columns=columns)
+    trained['poemId'] = model['poem_ids']
+    current = pd.DataFrame(np.asarray(vectors, dtype=np.float32), columns=columns)
+    current['poemId'] = poem_ids
+    merged = trained.drop_duplicates('poemId').merge(
+        current.drop_duplicates('poemId'), on='poemId', how='left', suffixes=('', '_now'), indicator=True
+    )
+    removed = int((merged['_merge'] == 'left_only').sum())
+    both = merged[merged['_merge'] == 'both']
+    changed = int((both[columns].to_numpy() != both[[f'{c}_now' for c in columns]].to_numpy()).any(axis=1).sum())
+    return new_mask, changed, removed
+
+def run_incremental(df, vectors, params, refit_threshold=DEFAULT_REFIT_THRESHOLD):
+    """增量模式：用保存的UMAP模型放置新增诗词，只把这些诗词写入数据库
+
+    没有可用模型、UMAP参数改变或数据变化超过refit_threshold时返回False，由调用方完整重新拟合。
+    """
+    model = umap_models.load_model(EMOTION_MODEL_NAME)
+    if model is None:
+        print("没有保存的UMAP模型，需要完整拟合")
+        return False
+    if model['params'] != params:
+        print(f"UMAP参数与保存的模型不同（模型参数: {model['params']}），需要完整拟合")
+        return False
+    if model.get('run_id') is None:
+        print("保存的模型没有对应的结果运行，需要完整拟合")
+        return False
+    if not check_active_run(model['run_id']):
+        print(f"模型对应的运行 {model['run_id']} 已不是当前运行或已被清理，需要完整拟合")
+        return False
+    
+    poem_ids = df['poemId'].astype(str).to_numpy()
+    if umap_models.data_fingerprint(poem_ids, vectors) == model['fingerprint']:
+        print("数据与模型的训练数据一致，无需更新")
+        return True
+    
+    new_mask, changed, removed = compare_with_model(model, poem_ids, vectors)
+    new_count = int(new_mask.sum())
+    placed_count = len(model['placed_ids'])
+    drift = (placed_count + new_count + changed + removed) / max(1, len(model['poem_ids']))
+    print(f"训练数据 {len(model['poem_ids'])} 首，已增量放置 {placed_count} 首，本次新增 {new_count} 首，"
+          f"向量变化 {changed} 首，删除 {removed} 首（变化比例 {drift:.1%}）")
+    if drift > refit_threshold:
+        print(f"变化比例超过阈值 {refit_threshold:.1%}，需要完整拟合")
+        return False
+    if not new_count:
+        print("没有新增诗词")
+        return True
+    if changed or removed:
+        print("注意：向量变化或删除的诗词在完整拟合前保持原有坐标")
+    
+    print(f"正在用保存的模型放置 {new_count} 首新诗词...")
+    labels, coords = place_new_poems(model, vectors[new_mask])
+    save_results_to_db(coords, labels, df['emotion'].values[new_mask], vectors[new_mask], df['poemId'].values[new_mask],
+                       run_id=model['run_id'])
+    
+    model['placed_ids'] = list(model['placed_ids']) + poem_ids[new_mask].tolist()
+    umap_models.save_model(EMOTION_MODEL_NAME, model)
+    return True
+
+def compute_knn_graph(vectors, n_neighbors, backend='exact', random_state=42):
+    """计算一次kNN图（每个点的第一个邻居是自身），供参数扫描中的所有UMAP复用
+
+    backend为exact时用球树精确搜索（情感向量只有5维，精确搜索足够快），
+    为nndescent时用pynndescent近似搜索。返回 (knn_indices, knn_dists)。
+    """
+    if backend == 'nndescent':
+        index = NNDescent(vectors, n_neighbors=n_neighbors, metric='euclidean',
+                          random_state=random_state, low_memory=False)
+        knn_indices, knn_dists = index.neighbor_graph
+    else:
+        nn = NearestNeighbors(n_neighbors=n_neighbors, algorithm='ball_tree').fit(vectors)
+        knn_dists, knn_indices = nn.kneighbors(vectors)
+    return knn_indices, knn_dists.astype(np.float32)
+
+# 参数扫描的工作进程共享的数据（由_init_sweep_worker设置）
+_sweep_data = {}
+
+def _init_sweep_worker(prepared, knn_indices, knn_dists, sample_index, scale, trust_neighbors):
+    _sweep_data.update(
+        prepared=prepared,
+        knn_indices=knn_indices,
+        knn_dists=knn_dists,
+        sample_index=sample_index,
+        scale=scale,
+        trust_neighbors=trust_neighbors
+    )
+    # 预计算的kNN图没有NNDescent索引，扫描中不需要transform
+    warnings.filterwarnings('ignore', message='precomputed_knn')
+
+def _run_sweep_config(config):
+    """在一组UMAP参数下降维，返回 (参数, 坐标, 抽样trustworthiness, 用时)"""
+    n_neighbors, min_dist, spread = config
+    start = time.perf_counter()
+    dominant_emotions, enhanced_vectors = _sweep_data['prepared']
+    precomputed_knn = (
+        np.ascontiguousarray(_sweep_data['knn_indices'][:, :n_neighbors]),
+        np.ascontiguousarray(_sweep_data['knn_dists'][:, :n_neighbors])
+    )
+    coords = reduce_dimensions(
+        enhanced_vectors,
+        n_neighbors=n_neighbors,
+        min_dist=min_dist,
+        spread=spread,
+        scale=_sweep_data['scale'],
+        prepared=_sweep_data['prepared'],
+        precomputed_knn=precomputed_knn
+    )
+    sample = _sweep_data['sample_index']
+    score = trustworthiness(enhanced_vectors[sample], coords[sample], n_neighbors=_sweep_data['trust_neighbors'])
+    return config, coords, score, time.perf_counter() - start
+
+def run_sweep(df, prepared, grid, sweep_dir, scale=1.5, workers=None, knn_backend='exact',
+              sample_size=DEFAULT_SWEEP_SAMPLE, trust_neighbors=DEFAULT_TRUST_NEIGHBORS, random_state=42):
+    """参数扫描：kNN图只计算一次，在进程池中对grid中每组 (n_neighbors, min_dist, spread) 降维
+
+    每组结果的坐标保存为sweep_dir下的.npy文件，评分汇总写入sweep_dir/results.csv，返回汇总DataFrame。
+    """
+    dominant_emotions, enhanced_vectors = prepared
+    max_neighbors = max(n_neighbors for n_neighbors, _, _ in grid)
+    
+    print(f"正在计算kNN图（{knn_backend}，k={max_neighbors}）...")
+    start = time.perf_counter()
+    knn_indices, knn_dists = compute_knn_graph(enhanced_vectors, max_neighbors, knn_backend, random_state)
+    print(f"kNN图计算完成，用时 {time.perf_counter() - start:.2f} 秒")
+    
+    # trustworthiness需要样本内的两两距离，只在固定的抽样上计算
+    rng = np.random.default_rng(random_state)
+    sample_index = np.sort(rng.choice(len(enhanced_vectors), min(sample_size, len(enhanced_vectors)), replace=False))
+    
+    os.makedirs(sweep_dir, exist_ok=True)
+    np.save(os.path.join(sweep_dir, 'poem_ids.npy'), df['poemId'].astype(str).to_numpy())
+    np.save(os.path.join(sweep_dir, 'labels.npy'), dominant_emotions)
+    
+    print(f"开始参数扫描：共 {len(grid)} 组参数")
+    results = []
+    # NNDescent在主进程中启动了numba线程池，之后fork出的子进程会导致退出时卡住，统一用spawn启动
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_sweep_worker,
+        initargs=(prepared, knn_indices, knn_dists, sample_index, scale, trust_neighbors),
+        mp_context=multiprocessing.get_context('spawn')
+    ) as executor:
+        for (n_neighbors, min_dist, spread), coords, score, seconds in executor.map(_run_sweep_config, grid):
+            file_name = f'coords_nn{n_neighbors}_md{min_dist:g}_sp{spread:g}.npy'
+            np.save(os.path.join(sweep_dir, file_name), coords.astype(np.float32))
+            print(f"n_neighbors={n_neighbors}, min_dist={min_dist:g}, spread={spread:g}: "
+                  f"trustworthiness={score:.4f}（{seconds:.1f} 秒）")
+            results.append({
+                'n_neighbors': n_neighbors,
+                'min_dist': min_dist,
+                'spread': spread,
+                'trustworthiness': score,
+                'seconds': seconds,
+                'file': file_name
+            })
+    
+    results = pd.DataFrame(results).sort_values('trustworthiness', ascending=False, ignore_index=True)
+    results.to_csv(os.path.join(sweep_dir, 'results.csv'), index=False, encoding='utf-8-sig')
+    best = results.iloc[0]
+    print(f"扫描结果已保存到 {sweep_dir}")
+    print(f"最佳参数: --n_neighbors {best['n_neighbors']} --min_dist {best['min_dist']:g} --spread {best['spread']:g}"
+          f"（trustworthiness={best['trustworthiness']:.4f}）")
+    return results
+
 def create_smooth_boundary(points, expand_factor=1.5, padding=1.2, smoothness=0.3):
     """创建平滑的边界曲线，参考topic_clustering.py的实现"""
     if len(points) < 4:
@@ -429,71 +694,199 @@ def create_interactive_plot(coords, labels, emotions, vectors, output_file='emot
     # 显示图形
     plt.show()
 
-def save_results_to_db(coords, labels, emotions, vectors, poem_ids=None):
-    """保存处理结果到数据库"""
+def ensure_visualization_tables(cursor):
+    """创建运行记录表、当前运行指针表、结果数据表和供读取方使用的视图
+
+    emotion_probability_visualization是只包含当前运行结果的视图；
+    旧版本中它是直接追加数据的表，首次运行时改名为*_legacy，并把其中的数据作为一次运行迁移过来。
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_RUNS_TABLE} (
+            run_id INT AUTO_INCREMENT PRIMARY KEY,
+            mode VARCHAR(20),
+            params TEXT,
+            status ENUM('loading', 'complete') NOT NULL DEFAULT 'loading',
+            row_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_ACTIVE_TABLE} (
+            id TINYINT PRIMARY KEY,
+            run_id INT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM {VIS_ACTIVE_TABLE} WHERE id = 1")
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"INSERT INTO {VIS_ACTIVE_TABLE} (id, run_id) VALUES (1, NULL)")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_DATA_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id INT NOT NULL,
+            poem_id INT,
+            original_emotion VARCHAR(255),
+            si_prob FLOAT,
+            le_prob FLOAT,
+            ai_prob FLOAT,
+            xi_prob FLOAT,
+            nu_hao_prob FLOAT,
+            umap_x FLOAT,
+            umap_y FLOAT,
+            cluster_label INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_run_id (run_id)
+        )
+    """)
+    
+    cursor.execute(
+        "SELECT TABLE_TYPE FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (VIS_TABLE,)
+    )
+    row = cursor.fetchone()
+    if row and row[0] == 'BASE TABLE':
+        legacy_table = f"{VIS_TABLE}_legacy"
+        print(f"迁移旧的结果表 {VIS_TABLE} -> {legacy_table}")
+        cursor.execute(f"RENAME TABLE {VIS_TABLE} TO {legacy_table}")
+        cursor.execute(f"INSERT INTO {VIS_RUNS_TABLE} (mode, status) VALUES ('legacy', 'loading')")
+        legacy_run = cursor.lastrowid
+        cursor.execute(f"""
+            INSERT INTO {VIS_DATA_TABLE} (run_id, {', '.join(VIS_COLUMNS)}, created_at)
+            SELECT %s, {', '.join(VIS_COLUMNS)}, created_at FROM {legacy_table}
+        """, (legacy_run,))
+        complete_run(cursor, legacy_run, cursor.rowcount)
+        cursor.execute(f"UPDATE {VIS_ACTIVE_TABLE} SET run_id = %s WHERE id = 1 AND run_id IS NULL", (legacy_run,))
+    
+    cursor.execute(f"""
+        CREATE OR REPLACE VIEW {VIS_TABLE} AS
+        SELECT d.id, d.run_id, {', '.join(f'd.{column}' for column in VIS_COLUMNS)}, d.created_at
+        FROM {VIS_DATA_TABLE} d
+        JOIN {VIS_ACTIVE_TABLE} a ON a.id = 1 AND d.run_id = a.run_id
+    """)
+
+def complete_run(cursor, run_id, row_count):
+    cursor.execute(f"""
+        UPDATE {VIS_RUNS_TABLE}
+        SET status = 'complete', row_count = row_count + %s, completed_at = CURRENT_TIMESTAMP
+        WHERE run_id = %s
+    """, (row_count, run_id))
+
+def is_active_run(cursor, run_id):
+    """run_id是否仍是当前运行且已完成；同时锁住当前运行指针，直到事务结束"""
+    cursor.execute(f"""
+        SELECT r.status FROM {VIS_ACTIVE_TABLE} a
+        JOIN {VIS_RUNS_TABLE} r ON r.run_id = a.run_id
+        WHERE a.id = 1 AND a.run_id = %s
+        FOR UPDATE
+    """, (run_id,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'complete'
+
+def check_active_run(run_id):
+    """增量模式追加前检查：模型对应的运行是否仍是当前运行（未被切换或清理）"""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            ensure_visualization_tables(cursor)
+            active = is_active_run(cursor, run_id)
+            conn.commit()
+        finally:
+            cursor.close()
+    return active
+
+def build_result_rows(run_id, coords, labels, emotions, vectors, poem_ids=None):
+    """按列转换为Python类型后拼成插入用的行（避免逐行逐项调用float()/int()）"""
+    count = len(emotions)
+    vectors = np.asarray(vectors, dtype=np.float64)
+    coords = np.asarray(coords, dtype=np.float64)
+    if poem_ids is None:
+        poem_id_column = [None] * count
+    else:
+        poem_id_column = [None if poem_id is None else int(poem_id) for poem_id in poem_ids]
+    columns = [
+        [run_id] * count,
+        poem_id_column,
+        list(emotions),
+        *(vectors[:, i].tolist() for i in range(5)),  # si, le, ai, xi, nu_hao
+        coords[:, 0].tolist(),
+        coords[:, 1].tolist(),
+        np.asarray(labels, dtype=np.int64).tolist()
+    ]
+    return list(zip(*columns))
+
+def prune_runs(cursor, keep_runs):
+    """删除较早的运行：保留最近keep_runs次完成的运行和当前运行（正在写入的运行不受影响）"""
+    cursor.execute(f"SELECT run_id FROM {VIS_ACTIVE_TABLE} WHERE id = 1")
+    active_run = cursor.fetchone()[0]
+    cursor.execute(f"SELECT run_id FROM {VIS_RUNS_TABLE} WHERE status = 'complete' ORDER BY run_id DESC")
+    complete_runs = [row[0] for row in cursor.fetchall()]
+    keep = set(complete_runs[:max(1, keep_runs)])
+    if active_run is not None:
+        keep.add(active_run)
+    stale = [run for run in complete_runs if run not in keep]
+    if not stale:
+        return
+    placeholders = ', '.join(['%s'] * len(stale))
+    cursor.execute(f"DELETE FROM {VIS_DATA_TABLE} WHERE run_id IN ({placeholders})", stale)
+    cursor.execute(f"DELETE FROM {VIS_RUNS_TABLE} WHERE run_id IN ({placeholders})", stale)
+    print(f"已清理 {len(stale)} 次旧运行: {stale}")
+
+def save_results_to_db(coords, labels, emotions, vectors, poem_ids=None, run_id=None, params=None,
+                       keep_runs=DEFAULT_KEEP_RUNS, batch_size=DEFAULT_WRITE_BATCH):
+    """保存处理结果到数据库，返回运行ID
+
+    run_id为None时新建一次运行：所有行在一个事务中写入，提交时同时把当前运行指针切换到该运行，
+    读取emotion_probability_visualization视图的一方只会看到完整的结果；之后按keep_runs清理旧运行。
+    传入run_id时把这些行追加到已有运行（增量模式），同样在一个事务中完成。
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = db_pool.acquire()
         cursor = conn.cursor()
         
-        # 创建新表来存储降维和聚类结果
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS emotion_probability_visualization (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                poem_id INT,
-                original_emotion VARCHAR(255),
-                si_prob FLOAT,
-                le_prob FLOAT,
-                ai_prob FLOAT,
-                xi_prob FLOAT,
-                nu_hao_prob FLOAT,
-                umap_x FLOAT,
-                umap_y FLOAT,
-                cluster_label INT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        # 表结构变更会隐式提交，放在写入事务之前
+        ensure_visualization_tables(cursor)
+        conn.commit()
+        
+        new_run = run_id is None
+        if new_run:
+            cursor.execute(
+                f"INSERT INTO {VIS_RUNS_TABLE} (mode, params) VALUES (%s, %s)",
+                ('full', json.dumps(params, ensure_ascii=False) if params is not None else None)
             )
-        """)
+            run_id = cursor.lastrowid
+            conn.commit()
+        rows = build_result_rows(run_id, coords, labels, emotions, vectors, poem_ids)
         
-        # 准备插入数据
-        insert_query = """
-            INSERT INTO emotion_probability_visualization 
-            (poem_id, original_emotion, si_prob, le_prob, ai_prob, xi_prob, nu_hao_prob, 
-             umap_x, umap_y, cluster_label)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        insert_query = f"""
+            INSERT INTO {VIS_DATA_TABLE}
+            (run_id, {', '.join(VIS_COLUMNS)})
+            VALUES ({', '.join(['%s'] * (len(VIS_COLUMNS) + 1))})
         """
-        
-        # 构建数据
-        data_to_insert = []
-        for i in range(len(emotions)):
-            poem_id = poem_ids[i] if poem_ids is not None else None
-            data_to_insert.append((
-                int(poem_id) if poem_id is not None else None,
-                emotions[i],
-                float(vectors[i][0]),  # si_prob
-                float(vectors[i][1]),  # le_prob
-                float(vectors[i][2]),  # ai_prob
-                float(vectors[i][3]),  # xi_prob
-                float(vectors[i][4]),  # nu_hao_prob
-                float(coords[i][0]),   # umap_x
-                float(coords[i][1]),   # umap_y
-                int(labels[i])         # cluster_label
-            ))
-        
-        # 分批插入数据，每批1000条
-        batch_size = 1000
-        total_batches = (len(data_to_insert) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(data_to_insert), batch_size):
-            batch = data_to_insert[i:i + batch_size]
-            try:
-                cursor.executemany(insert_query, batch)
+        try:
+            start = time.perf_counter()
+            if not new_run and not is_active_run(cursor, run_id):
+                raise RuntimeError(f"运行 {run_id} 已不是当前运行或已被清理，不能追加结果")
+            for i in range(0, len(rows), batch_size):
+                cursor.executemany(insert_query, rows[i:i + batch_size])
+            complete_run(cursor, run_id, len(rows))
+            if new_run:
+                cursor.execute(f"UPDATE {VIS_ACTIVE_TABLE} SET run_id = %s WHERE id = 1", (run_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if new_run:
+                cursor.execute(f"DELETE FROM {VIS_RUNS_TABLE} WHERE run_id = %s", (run_id,))
                 conn.commit()
-                print(f"已插入第 {i//batch_size + 1}/{total_batches} 批数据，共 {len(batch)} 条")
-            except Exception as e:
-                print(f"插入第 {i//batch_size + 1} 批数据时出错: {str(e)}")
-                conn.rollback()
-                raise e
+            raise
+        print(f"成功将{len(rows)}条处理结果保存到数据库（运行 {run_id}，用时 {time.perf_counter() - start:.2f} 秒）")
         
-        print(f"成功将{len(data_to_insert)}条处理结果保存到数据库。")
+        if new_run:
+            prune_runs(cursor, keep_runs)
+            conn.commit()
+        if mark_visualization_updated:
+            mark_visualization_updated('emotion_probability_visualization')
+        return run_id
         
     except Exception as e:
         print(f"数据库操作出错: {str(e)}")
@@ -502,7 +895,7 @@ def save_results_to_db(coords, labels, emotions, vectors, poem_ids=None):
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            db_pool.release(conn)
 
 def parse_args():
     """解析命令行参数"""
@@ -533,6 +926,28 @@ def parse_args():
     # 输出文件
     parser.add_argument('--output', type=str, default='emotion1/emotion_clusters.png', help='输出文件路径')
     
+    # 本地快照：auto 数据表未变化时读快照；offline 不检查数据库直接读快照；refresh 重建快照；off 不使用快照
+    parser.add_argument('--snapshot', choices=['auto', 'offline', 'refresh', 'off'], default='auto',
+                        help='情感概率数据的本地快照模式')
+    
+    # full 完整拟合UMAP并保存模型；incremental 用保存的模型只放置新增诗词
+    # sweep 对参数网格扫描，每组参数保存坐标和评分，不写数据库
+    parser.add_argument('--mode', choices=['full', 'incremental', 'sweep'], default='full', help='降维模式')
+    parser.add_argument('--refit_threshold', type=float, default=DEFAULT_REFIT_THRESHOLD,
+                        help='增量模式下数据变化比例超过该值时完整重新拟合')
+    parser.add_argument('--keep_runs', type=int, default=DEFAULT_KEEP_RUNS, help='数据库中保留的已完成运行次数')
+    
+    # 参数扫描
+    parser.add_argument('--sweep_n_neighbors', type=int, nargs='+', default=[5, 10, 15, 30], help='扫描的n_neighbors取值')
+    parser.add_argument('--sweep_min_dist', type=float, nargs='+', default=[0.1, 0.4, 0.8], help='扫描的min_dist取值')
+    parser.add_argument('--sweep_spread', type=float, nargs='+', default=[1.0, 3.0], help='扫描的spread取值')
+    parser.add_argument('--sweep_dir', type=str, default='emotion1/sweep', help='扫描结果的保存目录')
+    parser.add_argument('--workers', type=int, default=None, help='参数扫描的进程数，默认为CPU核数')
+    parser.add_argument('--knn_backend', choices=['exact', 'nndescent'], default='exact',
+                        help='kNN图的计算方式：exact 球树精确搜索；nndescent 近似搜索')
+    parser.add_argument('--sweep_sample', type=int, default=DEFAULT_SWEEP_SAMPLE,
+                        help='计算trustworthiness的抽样数量')
+    
     return parser.parse_args()
 
 def main():
@@ -540,26 +955,48 @@ def main():
     args = parse_args()
     
     print("正在从数据库获取数据...")
-    df = get_data_from_db()
+    df = get_data_from_db(args.snapshot)
     
     print("正在提取情感概率向量...")
     vectors = get_vectors_from_probabilities(df)
     
+    params = {
+        'n_neighbors': args.n_neighbors,
+        'min_dist': args.min_dist,
+        'spread': args.spread,
+        'scale': args.scale
+    }
+    if args.mode == 'incremental':
+        if run_incremental(df, vectors, params, args.refit_threshold):
+            return
+        print("改为完整拟合...")
+    
     print("根据主导情感进行分类...")
-    labels = classify_by_dominant_emotion(vectors)
+    prepared = enhance_dominant_emotion(vectors)
+    labels = classify_by_dominant_emotion(vectors, prepared[0])
+    
+    if args.mode == 'sweep':
+        grid = list(itertools.product(args.sweep_n_neighbors, args.sweep_min_dist, args.sweep_spread))
+        run_sweep(df, prepared, grid, args.sweep_dir, scale=args.scale, workers=args.workers,
+                  knn_backend=args.knn_backend, sample_size=args.sweep_sample)
+        return
     
     print("正在进行降维...")
-    coords = reduce_dimensions(
+    coords, model = reduce_dimensions(
         vectors, 
         n_neighbors=args.n_neighbors,
         min_dist=args.min_dist,
         spread=args.spread,
-        scale=args.scale
+        scale=args.scale,
+        prepared=prepared,
+        return_model=True
     )
     
-    # 保存结果到数据库
-    print("跳过保存结果到数据库...")
-    save_results_to_db(coords, labels, df['emotion'].values, vectors, df['poemId'].values)
+    # 保存结果到数据库（新的运行），模型记录结果所在的运行，增量模式追加到同一运行
+    print("正在保存结果到数据库...")
+    run_id = save_results_to_db(coords, labels, df['emotion'].values, vectors, df['poemId'].values,
+                                params=params, keep_runs=args.keep_runs)
+    save_emotion_model(model, params, df, vectors, run_id)
     
     print("正在生成交互式可视化...")
     create_interactive_plot(
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from db import read_table_version
+
+# 可选依赖：未安装pyarrow时直接查询数据库
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+# 本地快照：Arrow IPC文件（未压缩，可直接内存映射）+ 记录数据表指纹的元数据
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'emotion_snapshot')
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, 'emotion_probabilities.arrow')
+META_FILE = os.path.join(SNAPSHOT_DIR, 'emotion_probabilities.json')
+# 修改快照结构或指纹内容后递增，使旧快照失效
+SNAPSHOT_FORMAT = 2
+
+SOURCE_TABLE = 'emotion_probabilities'
+# 情感向量的列顺序（与get_vectors_from_probabilities一致）
+VECTOR_COLUMNS = ['si_prob', 'le_prob', 'ai_prob', 'xi_prob', 'nu_hao_prob']
+ALL_COLUMNS = ['id', 'poemId', 'emotion', 'le_prob', 'ai_prob', 'xi_prob', 'nu_hao_prob', 'si_prob']
+
+def snapshot_available():
+    return pa is not None
+
+def table_fingerprint(cursor):
+    """数据表的低成本指纹：行数、最大id和导入脚本维护的版本号（见db.versions），任一变化都说明快照已过期
+
+    不使用CHECKSUM TABLE（InnoDB上会读取整张表）；不经过导入脚本直接修改数据后需用--snapshot refresh。
+    """
+    cursor.execute(f"SELECT COUNT(*), MAX(id) FROM {SOURCE_TABLE}")
+    row_count, max_id = cursor.fetchone()
+    return {
+        'row_count': int(row_count),
+        'max_id': None if max_id is None else int(max_id),
+        'data_version': read_table_version(cursor, SOURCE_TABLE)
+    }
+
+def read_meta():
+    try:
+        with open(META_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def snapshot_matches(fingerprint):
+    meta = read_meta()
+    return (
+        meta is not None
+        and meta.get('format') == SNAPSHOT_FORMAT
+        and all(meta.get(key) == value for key, value in fingerprint.items())
+        and os.path.exists(SNAPSHOT_FILE)
+    )
+
+def write_snapshot(rows, fingerprint):
+    """把查询结果写成Arrow快照：情感向量存为float32定长列表列，读取时可零拷贝得到矩阵"""
+    df = pd.DataFrame(rows, columns=ALL_COLUMNS)
+    vectors = df[VECTOR_COLUMNS].to_numpy(dtype=np.float32)
+    if np.isnan(vectors).any():
+        print("警告：发现缺失值，使用0填充")
+        vectors = np.nan_to_num(vectors)
+    table = pa.table({
+        'id': pa.array(df['id'].to_numpy(dtype=np.int64)),
+        'poemId': pa.array(df['poemId'].astype(str).tolist(), pa.string()),
+        'emotion': pa.array(df['emotion'].tolist(), pa.string()),
+        'vector': pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), pa.float32()), len(VECTOR_COLUMNS))
+    })
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    # 先写临时文件再替换，避免其他进程读到未写完的快照
+    tmp_file = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_file, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            # 写成一个记录批次，读取时向量列是一块连续内存
+            writer.write_table(table, max_chunksize=max(1, table.num_rows))
+    os.replace(tmp_file, SNAPSHOT_FILE)
+
+    meta = dict(fingerprint, format=SNAPSHOT_FORMAT, created_at=time.time(), columns=VECTOR_COLUMNS)
+    tmp_meta = f"{META_FILE}.{os.getpid()}.tmp"
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, META_FILE)
+
+def read_snapshot():
+    """内存映射读取快照，返回DataFrame；df.attrs['vectors']为直接指向映射内存的float32矩阵"""
+    source = pa.memory_map(SNAPSHOT_FILE, 'r')
+    table = ipc.open_file(source).read_all()
+    vector_column = table.column('vector').combine_chunks()
+    vectors = vector_column.values.to_numpy(zero_copy_only=True).reshape(-1, len(VECTOR_COLUMNS))
+
+    df = table.drop_columns(['vector']).to_pandas()
+    for i, column in enumerate(VECTOR_COLUMNS):
+        df[column] = vectors[:, i]
+    df = df[ALL_COLUMNS]
+    df.attrs['vectors'] = vectors
+    return df
+
+def load_emotion_data(pool, mode='auto'):
+    """读取情感概率数据，优先使用本地快照
+
+    mode:
+        auto    比较数据表的行数、最大id和版本号，未变化时读快照，否则查询数据库并更新快照
+        offline 快照存在时直接读取，不访问数据库
+        refresh 总是查询数据库并重写快照
+    返回DataFrame，列与emotion_visualization.get_data_from_db一致；
+    从快照读取时df.attrs['vectors']为float32情感向量矩阵。
+    """
+    if mode == 'offline' and os.path.exists(SNAPSHOT_FILE):
+        print(f"使用本地快照（不检查数据库）: {SNAPSHOT_FILE}")
+        return read_snapshot()
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            fingerprint = table_fingerprint(cursor)
+            if mode != 'refresh' and snapshot_matches(fingerprint):
+                print(f"数据表未变化（{fingerprint['row_count']} 条），使用本地快照")
+                return read_snapshot()
+
+            print(f"快照不存在或已过期，正在从数据库读取 {fingerprint['row_count']} 条数据...")
+            cursor.execute(f"SELECT {', '.join(ALL_COLUMNS)} FROM {SOURCE_TABLE}")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+    write_snapshot(rows, fingerprint)
+    print(f"本地快照已更新: {SNAPSHOT_FILE}")
+    return read_snapshot()
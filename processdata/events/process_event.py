@@ -1,18 +1,50 @@
 import csv
-import pymysql
+import hashlib
 import os
+import sys
+import time
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import argparse
 from pymysql.cursors import DictCursor
 
-# 数据库配置
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'lunwen',
-    'charset': 'utf8mb4'
-}
+# 流式读取Excel（只读模式逐行读取，不把整个工作簿载入内存）
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+# 导入上级目录的数据库连接池模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_pool, bump_table_version, DRIVER_PYMYSQL
+
+# 数据库连接池（连接参数见db/config.py，可用环境变量覆盖）
+db_pool = get_pool(driver=DRIVER_PYMYSQL, cursorclass=DictCursor)
+# LOAD DATA LOCAL INFILE需要在连接上启用local_infile
+infile_pool = get_pool(driver=DRIVER_PYMYSQL, cursorclass=DictCursor, local_infile=True)
+
+# 批量导入时每批插入的行数
+DEFAULT_BATCH_SIZE = 5000
+# 重要事件每批插入的行数
+EVENTS_CHUNK_SIZE = 1000
+# 情感概率CSV中的概率列（按文件中的顺序）
+PROBABILITY_COLUMNS = ['le_prob', 'ai_prob', 'xi_prob', 'nu_hao_prob', 'si_prob']
+EMOTION_FIELDS = ['poemId', 'emotion'] + PROBABILITY_COLUMNS
+# 在数据库中校验poemId时使用的暂存表和被拒绝数据表
+STAGING_TABLE = 'emotion_probabilities_staging'
+REJECTS_TABLE = 'emotion_probabilities_rejects'
+# 增量同步时使用的新数据表、影子表和被替换下来的旧表
+INCOMING_TABLE = 'emotion_probabilities_incoming'
+SHADOW_TABLE = 'emotion_probabilities_shadow'
+RETIRED_TABLE = 'emotion_probabilities_retired'
+# 数据库字段对应的列数据
+FIELD_COLUMNS = {'row_no': 'rowNo', 'row_hash': 'rowHash'}
+# 被拒绝的原因
+REJECT_INCOMPLETE_ROW = 'incomplete_row'
+REJECT_INVALID_POEM_ID = 'invalid_poem_id'
+REJECT_POEM_NOT_FOUND = 'poem_not_found'
 
 # 文件路径
 EVENTS_FILE = r"D:\01\lunwen\processdata\events\重要事件.xlsx"
@@ -21,27 +53,42 @@ EMOTIONS_FILE = r"D:\01\lunwen\processdata\events\emotion-Prob-fixed-int.csv"
 def connect_to_db():
     """连接到数据库"""
     try:
-        connection = pymysql.connect(
-            host=DB_CONFIG['host'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            database=DB_CONFIG['database'],
-            charset=DB_CONFIG['charset'],
-            cursorclass=DictCursor
-        )
+        connection = db_pool.acquire()
         print("数据库连接成功")
         return connection
     except Exception as e:
         print(f"数据库连接失败: {e}")
         return None
 
-def create_tables(connection):
-    """创建必要的表（如果不存在）"""
+def add_poem_foreign_key(cursor):
+    """尝试为emotion_probabilities表添加外键约束"""
+    # 检查poems表是否存在
+    cursor.execute("SHOW TABLES LIKE 'poems'")
+    if cursor.fetchone():
+        try:
+            cursor.execute("""
+            ALTER TABLE emotion_probabilities
+            ADD CONSTRAINT fk_poem_id
+            FOREIGN KEY (poemId) REFERENCES poems(poemId);
+            """)
+            print("成功添加外键约束")
+        except Exception as e:
+            print(f"添加外键约束失败: {e}")
+            print("将继续使用没有外键约束的表")
+    else:
+        print("poems表不存在，无法添加外键约束")
+
+def create_tables(connection, recreate_emotions=True):
+    """创建必要的表（如果不存在）
+    
+    recreate_emotions为False时保留现有的emotion_probabilities表（增量同步时由同步过程维护）。
+    """
     try:
         with connection.cursor() as cursor:
-            # 先删除现有的emotion_probabilities表
-            cursor.execute("DROP TABLE IF EXISTS emotion_probabilities")
-            print("已删除旧的emotion_probabilities表")
+            if recreate_emotions:
+                # 先删除现有的emotion_probabilities表
+                cursor.execute("DROP TABLE IF EXISTS emotion_probabilities")
+                print("已删除旧的emotion_probabilities表")
             
             # 创建重要事件表
             cursor.execute("""
@@ -53,6 +100,11 @@ def create_tables(connection):
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """)
             
+            if not recreate_emotions:
+                connection.commit()
+                print("表创建成功")
+                return
+            
             # 创建情感概率表 - 使用poemId代替poem_id匹配poems表
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS emotion_probabilities (
@@ -69,22 +121,7 @@ def create_tables(connection):
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """)
             
-            # 检查poems表是否存在
-            cursor.execute("SHOW TABLES LIKE 'poems'")
-            if cursor.fetchone():
-                # 尝试为emotion_probabilities表添加外键约束
-                try:
-                    cursor.execute("""
-                    ALTER TABLE emotion_probabilities
-                    ADD CONSTRAINT fk_poem_id
-                    FOREIGN KEY (poemId) REFERENCES poems(poemId);
-                    """)
-                    print("成功添加外键约束")
-                except Exception as e:
-                    print(f"添加外键约束失败: {e}")
-                    print("将继续使用没有外键约束的表")
-            else:
-                print("poems表不存在，无法添加外键约束")
+            add_poem_foreign_key(cursor)
             
             connection.commit()
             print("表创建成功")
@@ -119,24 +156,7 @@ def import_important_events_xlsx(connection, excel_file):
             print(f"警告: Excel文件列数不足，需要至少2列（时间和事件内容）。实际列数: {len(df.columns)}")
             return
             
-        # 尝试确定哪些列包含时间和事件内容
-        time_col = None
-        event_col = None
-        
-        # 如果列名包含明确的提示词，自动识别列
-        for col in df.columns:
-            col_lower = str(col).lower()
-            if '时间' in col_lower or 'time' in col_lower or 'date' in col_lower:
-                time_col = col
-            elif '事件' in col_lower or '内容' in col_lower or 'event' in col_lower or 'content' in col_lower:
-                event_col = col
-        
-        # 如果无法自动识别，则使用前两列
-        if time_col is None or event_col is None:
-            print("无法自动识别时间和事件列，默认使用前两列")
-            time_col = df.columns[0]
-            event_col = df.columns[1]
-            
+        time_col, event_col = detect_event_columns(df.columns)
         print(f"使用列 '{time_col}' 作为时间，列 '{event_col}' 作为事件内容")
         
         # 插入数据
@@ -163,16 +183,145 @@ def import_important_events_xlsx(connection, excel_file):
     except Exception as e:
         print(f"导入Excel文件失败: {e}")
 
-def import_emotion_probabilities(connection, csv_file, force_import=False):
-    """导入情感概率数据
+def detect_event_columns(columns):
+    """根据列名确定时间列和事件内容列，无法识别时使用前两列"""
+    time_col = None
+    event_col = None
     
-    Args:
-        connection: 数据库连接
-        csv_file: CSV文件路径
-        force_import: 是否强制导入，即使poemId在poems表中不存在
+    # 如果列名包含明确的提示词，自动识别列
+    for col in columns:
+        col_lower = str(col).lower()
+        if '时间' in col_lower or 'time' in col_lower or 'date' in col_lower:
+            time_col = col
+        elif '事件' in col_lower or '内容' in col_lower or 'event' in col_lower or 'content' in col_lower:
+            event_col = col
+    
+    # 如果无法自动识别，则使用前两列
+    if time_col is None or event_col is None:
+        print("无法自动识别时间和事件列，默认使用前两列")
+        time_col = columns[0]
+        event_col = columns[1]
+    return time_col, event_col
+
+def list_event_sheets(paths, all_sheets=False):
+    """展开要导入的(文件, 工作表)列表；目录会展开为其中的所有xlsx文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith('.xlsx') and not name.startswith('~$')
+            ))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"找不到文件: {path}")
+    
+    sheets = []
+    for excel_file in files:
+        workbook = load_workbook(excel_file, read_only=True)
+        try:
+            names = workbook.sheetnames if all_sheets else workbook.sheetnames[:1]
+        finally:
+            workbook.close()
+        sheets.extend((excel_file, name) for name in names)
+    return sheets
+
+def iter_event_rows(excel_file, sheet_name):
+    """流式读取一个工作表，逐行返回(事件时间, 事件内容)；列只在读取表头时识别一次"""
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header or len(header) < 2:
+            print(f"警告: {excel_file} [{sheet_name}] 列数不足，需要至少2列（时间和事件内容）")
+            return
+        # 与pandas一致，空表头命名为 Unnamed: N
+        columns = [f'Unnamed: {i}' if value is None else str(value) for i, value in enumerate(header)]
+        time_col, event_col = detect_event_columns(columns)
+        time_index, event_index = columns.index(time_col), columns.index(event_col)
+        print(f"{os.path.basename(excel_file)} [{sheet_name}]: 使用列 '{time_col}' 作为时间，列 '{event_col}' 作为事件内容")
+        
+        for row in rows:
+            event_time = row[time_index] if time_index < len(row) else None
+            event_content = row[event_index] if event_index < len(row) else None
+            # 过滤掉空值
+            if event_time is None or event_content is None:
+                continue
+            event_time, event_content = str(event_time), str(event_content)
+            if event_time.lower() == 'nan' or event_content.lower() == 'nan':
+                continue
+            yield event_time, event_content
+    finally:
+        workbook.close()
+
+def import_event_sheet(excel_file, sheet_name, chunk_size=EVENTS_CHUNK_SIZE):
+    """导入一个工作表的重要事件，按chunk_size分批插入，返回导入的行数
+    
+    可在进程池中运行，每个进程使用自己的数据库连接。
     """
+    connection = db_pool.acquire()
+    inserted_count = 0
     try:
-        # 先检查表是否为空，如果不为空则清空
+        with connection.cursor() as cursor:
+            chunk = []
+            for row in iter_event_rows(excel_file, sheet_name):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    cursor.executemany(
+                        "INSERT INTO important_events (event_time, event_content) VALUES (%s, %s)", chunk)
+                    inserted_count += len(chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(
+                    "INSERT INTO important_events (event_time, event_content) VALUES (%s, %s)", chunk)
+                inserted_count += len(chunk)
+        connection.commit()
+        return inserted_count
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        db_pool.release(connection)
+
+def import_important_events_streaming(paths, all_sheets=False, workers=1, chunk_size=EVENTS_CHUNK_SIZE):
+    """流式导入多个Excel文件/工作表的重要事件，workers>1时并行导入"""
+    if load_workbook is None:
+        print("未安装openpyxl，无法流式导入Excel文件")
+        return
+    sheets = list_event_sheets(paths, all_sheets)
+    if not sheets:
+        return
+    
+    start_time = time.perf_counter()
+    total = 0
+    if workers <= 1 or len(sheets) == 1:
+        for excel_file, sheet_name in sheets:
+            try:
+                total += import_event_sheet(excel_file, sheet_name, chunk_size)
+            except Exception as e:
+                print(f"导入 {excel_file} [{sheet_name}] 失败: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheets))) as executor:
+            futures = {
+                executor.submit(import_event_sheet, excel_file, sheet_name, chunk_size): (excel_file, sheet_name)
+                for excel_file, sheet_name in sheets
+            }
+            for future in as_completed(futures):
+                excel_file, sheet_name = futures[future]
+                try:
+                    count = future.result()
+                    total += count
+                    print(f"已导入 {os.path.basename(excel_file)} [{sheet_name}]: {count} 条")
+                except Exception as e:
+                    print(f"导入 {excel_file} [{sheet_name}] 失败: {e}")
+    print(f"成功导入 {total} 条重要事件数据（{len(sheets)} 个工作表），用时 {time.perf_counter() - start_time:.2f} 秒")
+
+def prepare_emotion_import(connection, force_import, load_valid_ids=True, truncate=True):
+    """清空情感概率表（truncate为False时保留），并返回用于校验的有效poemId集合
+    （强制导入或load_valid_ids为False时为空集合）"""
+    # 先检查表是否为空，如果不为空则清空
+    if truncate:
         with connection.cursor() as cursor:
             cursor.execute("SELECT COUNT(*) as count FROM emotion_probabilities")
             result = cursor.fetchone()
@@ -180,19 +329,32 @@ def import_emotion_probabilities(connection, csv_file, force_import=False):
                 print("情感概率表已有数据，将先清空")
                 cursor.execute("TRUNCATE TABLE emotion_probabilities")
                 connection.commit()
-        
-        # 获取有效的poemId列表
-        valid_poem_ids = set()
-        if not force_import:
-            valid_poem_ids = get_valid_poem_ids(connection)
-            if valid_poem_ids:
-                print(f"从poems表中获取了 {len(valid_poem_ids)} 个有效的poemId")
-            else:
-                print("警告: 未能从poems表中获取有效的poemId，将不进行验证")
-                if not force_import:
-                    print("如需强制导入，请使用--force参数")
+    
+    # 获取有效的poemId列表
+    valid_poem_ids = set()
+    if force_import:
+        print("强制导入模式：将导入所有数据，不验证poemId是否存在")
+    elif not load_valid_ids:
+        print("将在数据库中通过暂存表校验poemId")
+    else:
+        valid_poem_ids = get_valid_poem_ids(connection)
+        if valid_poem_ids:
+            print(f"从poems表中获取了 {len(valid_poem_ids)} 个有效的poemId")
         else:
-            print("强制导入模式：将导入所有数据，不验证poemId是否存在")
+            print("警告: 未能从poems表中获取有效的poemId，将不进行验证")
+            print("如需强制导入，请使用--force参数")
+    return valid_poem_ids
+
+def import_emotion_probabilities(connection, csv_file, force_import=False):
+    """导入情感概率数据（逐行插入）
+    
+    Args:
+        connection: 数据库连接
+        csv_file: CSV文件路径
+        force_import: 是否强制导入，即使poemId在poems表中不存在
+    """
+    try:
+        valid_poem_ids = prepare_emotion_import(connection, force_import)
         
         # 使用已知可以工作的编码
         with open(csv_file, 'r', encoding='utf-8-sig') as file:
@@ -268,10 +430,444 @@ def import_emotion_probabilities(connection, csv_file, force_import=False):
     except Exception as e:
         print(f"导入情感概率数据失败: {e}")
 
+def parse_probability(value):
+    """概率字段：空值或非数值按0处理"""
+    try:
+        return float(value) if value.strip() else 0.0
+    except ValueError:
+        return 0.0
+
+def read_emotion_columns(csv_file, valid_poem_ids, rejects=None):
+    """一次读取情感概率CSV，解析为按列存储的类型化数组
+    
+    返回 (columns, stats)，columns包含rowNo(文件行号)、poemId(int64)、emotion(str)以及五个概率列(float64)。
+    传入rejects列表时，被跳过的行以(行号, poemId, emotion, 原因, 原始行)追加到其中。
+    """
+    row_numbers = array('q')
+    poem_ids = array('q')
+    emotions = []
+    probabilities = [array('d') for _ in PROBABILITY_COLUMNS]
+    stats = {'rows': 0, 'skipped': 0, 'invalid_poem_id': 0, 'invalid_samples': []}
+    
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader, None)
+        print(f"标题行: {header}")
+        
+        for row in csv_reader:
+            stats['rows'] += 1
+            if len(row) < 7:
+                stats['skipped'] += 1
+                if rejects is not None:
+                    rejects.append(make_reject(csv_reader.line_num, row, REJECT_INCOMPLETE_ROW))
+                continue
+            try:
+                poem_id = int(row[0].strip())
+            except ValueError:
+                stats['skipped'] += 1
+                if rejects is not None:
+                    rejects.append(make_reject(csv_reader.line_num, row, REJECT_INVALID_POEM_ID))
+                continue
+            if valid_poem_ids and poem_id not in valid_poem_ids:
+                stats['invalid_poem_id'] += 1
+                if len(stats['invalid_samples']) < 10:
+                    stats['invalid_samples'].append(poem_id)
+                if rejects is not None:
+                    rejects.append(make_reject(csv_reader.line_num, row, REJECT_POEM_NOT_FOUND))
+                continue
+            row_numbers.append(csv_reader.line_num)
+            poem_ids.append(poem_id)
+            emotions.append(row[1].strip())
+            for column, value in zip(probabilities, row[2:7]):
+                column.append(parse_probability(value))
+    
+    columns = {'rowNo': row_numbers, 'poemId': poem_ids, 'emotion': emotions}
+    columns.update(zip(PROBABILITY_COLUMNS, probabilities))
+    return columns, stats
+
+def make_reject(row_no, row, reason):
+    poem_id = row[0].strip() if row else ''
+    emotion = row[1].strip() if len(row) > 1 else ''
+    return row_no, poem_id, emotion, reason, ','.join(row)
+
+def iter_emotion_rows(columns, start=0, stop=None, fields=EMOTION_FIELDS):
+    """把列数据按行组合为插入参数，fields为要写入的数据库字段"""
+    stop = len(columns['poemId']) if stop is None else stop
+    values = []
+    for field in fields:
+        column = columns[FIELD_COLUMNS.get(field, field)][start:stop]
+        # 整数列以字符串写入（poemId在表中为VARCHAR）
+        values.append(map(str, column) if field in ('row_no', 'poemId') else column)
+    return zip(*values)
+
+def report_progress(loaded, total, start_time):
+    elapsed = time.perf_counter() - start_time
+    rate = loaded / elapsed if elapsed > 0 else 0
+    print(f"已导入 {loaded}/{total} 条 ({loaded / total * 100:.1f}%)，{rate:.0f} 条/秒")
+
+def load_with_executemany(connection, columns, batch_size, table='emotion_probabilities', fields=EMOTION_FIELDS):
+    """分批executemany插入（pymysql会把每批合并为一条多行INSERT）"""
+    total = len(columns['poemId'])
+    insert_query = (
+        f"INSERT INTO {table} ({', '.join(fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    start_time = time.perf_counter()
+    with connection.cursor() as cursor:
+        for start in range(0, total, batch_size):
+            stop = min(start + batch_size, total)
+            cursor.executemany(insert_query, list(iter_emotion_rows(columns, start, stop, fields)))
+            report_progress(stop, total, start_time)
+    connection.commit()
+
+def escape_infile_value(value):
+    """LOAD DATA默认的转义规则：反斜杠、制表符和换行需要转义"""
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def format_infile_value(field, value):
+    if field in PROBABILITY_COLUMNS:
+        return repr(value)
+    return escape_infile_value(value)
+
+def load_with_infile(columns, batch_size, table='emotion_probabilities', fields=EMOTION_FIELDS):
+    """写出临时文件，用LOAD DATA LOCAL INFILE分批导入"""
+    total = len(columns['poemId'])
+    start_time = time.perf_counter()
+    connection = infile_pool.acquire()
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, total, batch_size):
+                stop = min(start + batch_size, total)
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n',
+                                                 suffix='.tsv', delete=False) as tmp:
+                    for row in iter_emotion_rows(columns, start, stop, fields):
+                        tmp.write('\t'.join(format_infile_value(field, value) for field, value in zip(fields, row)))
+                        tmp.write('\n')
+                try:
+                    cursor.execute(
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                        "CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                        f"({', '.join(fields)})",
+                        (tmp.name.replace('\\', '/'),)
+                    )
+                finally:
+                    os.remove(tmp.name)
+                report_progress(stop, total, start_time)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        infile_pool.release(connection)
+
+def load_columns(connection, columns, batch_size, loader, table='emotion_probabilities', fields=EMOTION_FIELDS):
+    """按指定方式把列数据写入table"""
+    if loader == 'load-data':
+        try:
+            load_with_infile(columns, batch_size, table, fields)
+            return
+        except Exception as e:
+            # 服务器或驱动未开启local_infile时回退到executemany
+            print(f"LOAD DATA LOCAL INFILE 失败，改用executemany: {e}")
+            with connection.cursor() as cursor:
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            connection.commit()
+    load_with_executemany(connection, columns, batch_size, table, fields)
+
+def create_staging_tables(connection):
+    """创建暂存表（每次导入重建）和被拒绝数据表（每次导入清空）"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(f"""
+        CREATE TABLE {STAGING_TABLE} (
+            row_no INT PRIMARY KEY,
+            poemId BIGINT,
+            emotion VARCHAR(255),
+            le_prob FLOAT,
+            ai_prob FLOAT,
+            xi_prob FLOAT,
+            nu_hao_prob FLOAT,
+            si_prob FLOAT
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """)
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REJECTS_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            row_no INT,
+            poem_id VARCHAR(255),
+            emotion VARCHAR(255),
+            reason VARCHAR(64) NOT NULL,
+            raw_row TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_reason (reason)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """)
+        cursor.execute(f"TRUNCATE TABLE {REJECTS_TABLE}")
+    connection.commit()
+
+def validate_in_database(connection, parse_rejects):
+    """用一次反连接校验暂存表中的poemId：有效行写入情感概率表，其余写入被拒绝数据表
+    
+    返回写入情感概率表的行数。
+    """
+    with connection.cursor() as cursor:
+        if parse_rejects:
+            cursor.executemany(
+                f"INSERT INTO {REJECTS_TABLE} (row_no, poem_id, emotion, reason, raw_row) VALUES (%s, %s, %s, %s, %s)",
+                parse_rejects
+            )
+        cursor.execute(f"""
+        INSERT INTO emotion_probabilities ({', '.join(EMOTION_FIELDS)})
+        SELECT CAST(s.poemId AS CHAR), s.emotion, s.le_prob, s.ai_prob, s.xi_prob, s.nu_hao_prob, s.si_prob
+        FROM {STAGING_TABLE} s
+        WHERE EXISTS (SELECT 1 FROM poems p WHERE p.poemId = s.poemId)
+        ORDER BY s.row_no
+        """)
+        inserted = cursor.rowcount
+        cursor.execute(f"""
+        INSERT INTO {REJECTS_TABLE} (row_no, poem_id, emotion, reason)
+        SELECT s.row_no, CAST(s.poemId AS CHAR), s.emotion, %s
+        FROM {STAGING_TABLE} s
+        WHERE NOT EXISTS (SELECT 1 FROM poems p WHERE p.poemId = s.poemId)
+        """, (REJECT_POEM_NOT_FOUND,))
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    connection.commit()
+    return inserted
+
+def fetch_rejects(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT row_no, poem_id, emotion, reason, raw_row FROM {REJECTS_TABLE} ORDER BY row_no")
+        return [(r['row_no'], r['poem_id'], r['emotion'], r['reason'], r['raw_row']) for r in cursor.fetchall()]
+
+def write_rejects_file(rejects, rejects_file):
+    with open(rejects_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row_no', 'poemId', 'emotion', 'reason', 'raw_row'])
+        writer.writerows(rejects)
+    print(f"被拒绝的数据已写入: {rejects_file}")
+
+def print_reject_summary(rejects):
+    counts = {}
+    for reject in rejects:
+        counts[reject[3]] = counts.get(reject[3], 0) + 1
+    for reason, count in sorted(counts.items()):
+        print(f"  被拒绝 {count} 条，原因: {reason}")
+
+def row_hash(columns, i):
+    """一行情感概率数据的内容哈希（基于文件中的值，不受FLOAT精度影响）"""
+    text = '|'.join([str(columns['poemId'][i]), columns['emotion'][i]] +
+                    [repr(columns[name][i]) for name in PROBABILITY_COLUMNS])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def dedupe_by_poem_id(columns):
+    """按poemId去重（同一poemId保留文件中最后一行），返回(新的列数据, 重复行数)"""
+    last_index = {}
+    for i, poem_id in enumerate(columns['poemId']):
+        last_index[poem_id] = i
+    keep = sorted(last_index.values())
+    if len(keep) == len(columns['poemId']):
+        return columns, 0
+    deduped = {}
+    for key, column in columns.items():
+        if isinstance(column, array):
+            deduped[key] = array(column.typecode, (column[i] for i in keep))
+        else:
+            deduped[key] = [column[i] for i in keep]
+    return deduped, len(columns['poemId']) - len(keep)
+
+def table_columns(cursor, table):
+    """表中已有的字段名；表不存在时返回空集合"""
+    cursor.execute(
+        "SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    return {row['name'] for row in cursor.fetchall()}
+
+def emotion_table_ddl(table):
+    """增量导入使用的表结构：poemId唯一，row_hash记录每行内容的哈希"""
+    return f"""
+    CREATE TABLE {table} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        poemId VARCHAR(255),
+        emotion VARCHAR(255),
+        le_prob FLOAT,
+        ai_prob FLOAT,
+        xi_prob FLOAT,
+        nu_hao_prob FLOAT,
+        si_prob FLOAT,
+        row_hash CHAR(40),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL DEFAULT NULL,
+        UNIQUE KEY uk_poem_id (poemId)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+
+def sync_emotion_probabilities(connection, columns, batch_size=DEFAULT_BATCH_SIZE, loader='executemany'):
+    """增量同步情感概率表，读取方始终能看到完整的数据
+    
+    1. 新数据（含每行的内容哈希）写入incoming表
+    2. 影子表复制当前表的数据，再与incoming按poemId比较：只更新哈希不同的行，
+       插入新增的poemId，删除文件中已没有的poemId
+    3. RENAME TABLE原子地交换影子表和当前表
+    
+    重复执行同一文件时不会修改任何行。返回各类变更的行数。
+    """
+    columns, duplicates = dedupe_by_poem_id(columns)
+    if duplicates:
+        print(f"文件中有 {duplicates} 行poemId重复，按最后出现的一行导入")
+    columns['rowHash'] = [row_hash(columns, i) for i in range(len(columns['poemId']))]
+    
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {INCOMING_TABLE}")
+        cursor.execute(f"""
+        CREATE TABLE {INCOMING_TABLE} (
+            poemId VARCHAR(255) PRIMARY KEY,
+            emotion VARCHAR(255),
+            le_prob FLOAT,
+            ai_prob FLOAT,
+            xi_prob FLOAT,
+            nu_hao_prob FLOAT,
+            si_prob FLOAT,
+            row_hash CHAR(40)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+        """)
+    connection.commit()
+    load_columns(connection, columns, batch_size, loader, INCOMING_TABLE, EMOTION_FIELDS + ['row_hash'])
+    
+    fields = ', '.join(EMOTION_FIELDS)
+    with connection.cursor() as cursor:
+        # 影子表：复制当前数据，保留每行的updated_at（旧结构的表没有row_hash，复制后视为已变化，会被重新写入）
+        live_columns = table_columns(cursor, 'emotion_probabilities')
+        cursor.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+        cursor.execute(emotion_table_ddl(SHADOW_TABLE))
+        if live_columns:
+            copied = ['id', 'created_at'] + EMOTION_FIELDS + [
+                column for column in ('row_hash', 'updated_at') if column in live_columns
+            ]
+            cursor.execute(f"""
+            INSERT IGNORE INTO {SHADOW_TABLE} ({', '.join(copied)})
+            SELECT {', '.join(copied)} FROM emotion_probabilities ORDER BY id
+            """)
+        
+        # 只更新内容有变化的行
+        cursor.execute(f"""
+        UPDATE {SHADOW_TABLE} s
+        JOIN {INCOMING_TABLE} n ON n.poemId = s.poemId
+        SET s.emotion = n.emotion, s.le_prob = n.le_prob, s.ai_prob = n.ai_prob, s.xi_prob = n.xi_prob,
+            s.nu_hao_prob = n.nu_hao_prob, s.si_prob = n.si_prob, s.row_hash = n.row_hash,
+            s.updated_at = CURRENT_TIMESTAMP
+        WHERE NOT (s.row_hash <=> n.row_hash)
+        """)
+        updated = cursor.rowcount
+        cursor.execute(f"""
+        INSERT INTO {SHADOW_TABLE} ({fields}, row_hash)
+        SELECT n.poemId, n.emotion, n.le_prob, n.ai_prob, n.xi_prob, n.nu_hao_prob, n.si_prob, n.row_hash
+        FROM {INCOMING_TABLE} n
+        WHERE NOT EXISTS (SELECT 1 FROM {SHADOW_TABLE} s WHERE s.poemId = n.poemId)
+        """)
+        inserted = cursor.rowcount
+        cursor.execute(f"""
+        DELETE s FROM {SHADOW_TABLE} s
+        LEFT JOIN {INCOMING_TABLE} n ON n.poemId = s.poemId
+        WHERE n.poemId IS NULL
+        """)
+        deleted = cursor.rowcount
+        connection.commit()
+        
+        # 原子交换：读取方要么看到旧表，要么看到新表
+        if live_columns:
+            cursor.execute(f"DROP TABLE IF EXISTS {RETIRED_TABLE}")
+            cursor.execute(f"RENAME TABLE emotion_probabilities TO {RETIRED_TABLE}, {SHADOW_TABLE} TO emotion_probabilities")
+            cursor.execute(f"DROP TABLE {RETIRED_TABLE}")
+        else:
+            cursor.execute(f"RENAME TABLE {SHADOW_TABLE} TO emotion_probabilities")
+        cursor.execute(f"DROP TABLE IF EXISTS {INCOMING_TABLE}")
+        add_poem_foreign_key(cursor)
+    connection.commit()
+    
+    changes = {'updated': updated, 'inserted': inserted, 'deleted': deleted,
+               'unchanged': len(columns['poemId']) - updated - inserted}
+    print(f"增量同步完成: 更新 {updated} 条, 新增 {inserted} 条, 删除 {deleted} 条, 未变化 {changes['unchanged']} 条")
+    return changes
+
+def import_emotion_probabilities_bulk(connection, csv_file, force_import=False,
+                                      batch_size=DEFAULT_BATCH_SIZE, loader='executemany',
+                                      validate='python', rejects_file=None, sync=False):
+    """批量导入情感概率数据：一次解析为列数组，再分批写入
+    
+    Args:
+        connection: 数据库连接
+        csv_file: CSV文件路径
+        force_import: 是否强制导入，即使poemId在poems表中不存在
+        batch_size: 每批写入的行数
+        loader: 'executemany' 或 'load-data'（LOAD DATA LOCAL INFILE，需要服务器开启local_infile）
+        validate: 'python' 读取poems表的poemId在内存中校验；
+                  'sql' 先写入暂存表，再在数据库中与poems表做反连接，被拒绝的行写入emotion_probabilities_rejects
+        rejects_file: 被拒绝的行另存为CSV文件（可选）
+        sync: 增量同步（影子表+RENAME TABLE交换），不清空现有数据；此时poemId在内存中校验
+    """
+    if sync and validate == 'sql':
+        print("增量同步模式在内存中校验poemId")
+    in_database = validate == 'sql' and not force_import and not sync
+    try:
+        valid_poem_ids = prepare_emotion_import(connection, force_import, load_valid_ids=not in_database,
+                                                truncate=not sync)
+        
+        parse_start = time.perf_counter()
+        rejects = []
+        columns, stats = read_emotion_columns(csv_file, valid_poem_ids, rejects)
+        total = len(columns['poemId'])
+        print(f"解析 {stats['rows']} 行用时 {time.perf_counter() - parse_start:.2f} 秒，"
+              f"有效 {total} 条，跳过 {stats['skipped']} 条无效数据")
+        if stats['invalid_poem_id'] > 0:
+            print(f"有 {stats['invalid_poem_id']} 条数据的poemId在poems表中不存在，例如: {stats['invalid_samples']}")
+        
+        load_start = time.perf_counter()
+        if sync:
+            if total == 0:
+                # 避免用空文件把现有数据全部删除
+                print("没有可导入的数据，跳过增量同步")
+                return
+            sync_emotion_probabilities(connection, columns, batch_size, loader)
+        elif in_database:
+            create_staging_tables(connection)
+            if total > 0:
+                load_columns(connection, columns, batch_size, loader, STAGING_TABLE, ['row_no'] + EMOTION_FIELDS)
+            total = validate_in_database(connection, rejects)
+            rejects = fetch_rejects(connection)
+            print(f"数据库校验完成，被拒绝的数据见表 {REJECTS_TABLE}")
+        elif total > 0:
+            load_columns(connection, columns, batch_size, loader)
+        
+        elapsed = time.perf_counter() - load_start
+        print(f"成功导入 {total} 条情感概率数据，写入用时 {elapsed:.2f} 秒"
+              f"（{total / elapsed if elapsed > 0 else 0:.0f} 条/秒）")
+        print_reject_summary(rejects)
+        if rejects_file and rejects:
+            write_rejects_file(rejects, rejects_file)
+    except Exception as e:
+        connection.rollback()
+        print(f"导入情感概率数据失败: {e}")
+
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='导入重要事件和情感概率数据到数据库')
     parser.add_argument('--force', action='store_true', help='强制导入情感数据，即使poemId不存在于poems表')
+    parser.add_argument('--mode', choices=['bulk', 'row', 'sync'], default='bulk',
+                        help='情感概率导入方式：bulk批量导入（默认），row逐行插入，'
+                             'sync增量同步（只更新有变化的行，通过影子表交换，导入期间表始终可读）')
+    parser.add_argument('--loader', choices=['executemany', 'load-data'], default='executemany',
+                        help='批量导入时的写入方式')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='批量导入时每批的行数')
+    parser.add_argument('--validate', choices=['python', 'sql'], default='python',
+                        help='批量导入时poemId的校验方式：python在内存中校验，sql通过暂存表在数据库中校验')
+    parser.add_argument('--rejects-file', help='把被拒绝的情感概率数据及原因另存为CSV文件')
+    parser.add_argument('--events-files', nargs='+', default=[EVENTS_FILE],
+                        help='重要事件Excel文件或目录（目录会导入其中所有xlsx文件）')
+    parser.add_argument('--all-sheets', action='store_true', help='导入每个文件的所有工作表（默认只导入第一个）')
+    parser.add_argument('--events-workers', type=int, default=1, help='并行导入重要事件的进程数')
+    parser.add_argument('--events-chunk-size', type=int, default=EVENTS_CHUNK_SIZE, help='重要事件每批插入的行数')
+    parser.add_argument('--events-mode', choices=['stream', 'pandas'], default='stream',
+                        help='重要事件导入方式：stream流式分批导入（默认），pandas整表读取后逐行插入')
     return parser.parse_args()
 
 def main():
@@ -285,25 +881,43 @@ def main():
     
     try:
         # 创建表
-        create_tables(connection)
+        create_tables(connection, recreate_emotions=args.mode != 'sync')
         
         # 导入重要事件数据（Excel格式）
-        if os.path.exists(EVENTS_FILE):
-            import_important_events_xlsx(connection, EVENTS_FILE)
+        if args.events_mode == 'stream':
+            import_important_events_streaming(args.events_files, args.all_sheets,
+                                              args.events_workers, max(1, args.events_chunk_size))
         else:
-            print(f"找不到文件: {EVENTS_FILE}")
+            for events_file in args.events_files:
+                if os.path.exists(events_file):
+                    import_important_events_xlsx(connection, events_file)
+                else:
+                    print(f"找不到文件: {events_file}")
         
         # 导入情感概率数据
         if os.path.exists(EMOTIONS_FILE):
-            import_emotion_probabilities(connection, EMOTIONS_FILE, force_import)
+            if args.mode == 'row':
+                import_emotion_probabilities(connection, EMOTIONS_FILE, force_import)
+            else:
+                import_emotion_probabilities_bulk(connection, EMOTIONS_FILE, force_import,
+                                                  batch_size=max(1, args.batch_size), loader=args.loader,
+                                                  validate=args.validate, rejects_file=args.rejects_file,
+                                                  sync=args.mode == 'sync')
+            # 导入失败时表也可能已被清空或部分写入，同样更新版本号，让读取方（如情感快照）重新读取
+            try:
+                with connection.cursor() as cursor:
+                    bump_table_version(cursor, 'emotion_probabilities')
+                connection.commit()
+            except Exception as e:
+                print(f"更新emotion_probabilities的版本号失败: {e}")
         else:
             print(f"找不到文件: {EMOTIONS_FILE}")
             
     except Exception as e:
         print(f"发生错误: {e}")
     finally:
-        connection.close()
-        print("数据库连接已关闭")
+        db_pool.release(connection)
+        print("数据库连接已归还连接池")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 from sklearn.manifold import TSNE
 from sklearn.decomposition import PCA
 from sklearn.cluster import KMeans
+from sklearn.neighbors import NearestNeighbors
+from sklearn.metrics import silhouette_score
 import hdbscan
 from scipy.spatial import ConvexHull
 import umap
@@ -14,26 +16,77 @@ import matplotlib.cm as cm
 import matplotlib.colors as mcolors
 import seaborn as sns
 from scipy.interpolate import splprep, splev
-import mysql.connector
 import argparse
 from matplotlib.widgets import Button, CheckButtons
 import json
+import sys
+import os
+import time
+import hashlib
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 导入上级目录的公共模块：数据库连接池、可视化缓存（写入新结果后通知websocket服务器刷新缓存）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_pool, DRIVER_MYSQL_CONNECTOR
+import umap_models
+try:
+    from visualization_cache import mark_visualization_updated
+except ImportError:
+    mark_visualization_updated = None
 
 # 设置中文字体显示
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
 plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 # python processdata/lda_visualization/topic_clustering.py --input="D:/01/lunwen/processdata/lda02_topics_with_probabilities.csv" --output="lda02_hdbscan.png" --min_cluster_size 80 --min_samples 10 --cluster_selection_epsilon 0.5 --point_size 15 --point_alpha 0.7
 # 数据库配置
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'lunwen',
-    'charset': 'utf8mb4',
+# 连接参数（主机、用户、数据库等）见db/config.py，可用环境变量覆盖
+DB_OPTIONS = {
     'connect_timeout': 600,  # 连接超时时间设为10分钟
     'raise_on_warnings': True,  # 显示警告信息
     'use_pure': True  # 使用纯Python实现，避免C扩展可能的问题
 }
+db_pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR, **DB_OPTIONS)
+
+# LDA主题数量
+NUM_TOPICS = 4
+
+# 降维和聚类结果的本地缓存：键由概率矩阵内容和相关参数计算，只改绘图参数时直接复用
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'topic_embeddings')
+# 修改降维或聚类算法后递增，使旧缓存失效
+EMBEDDING_CACHE_VERSION = 1
+# 影响降维坐标的参数，和额外影响聚类标签的参数
+EMBEDDING_PARAMS = ('n_neighbors', 'min_dist', 'spread', 'scale', 'seed')
+CLUSTER_PARAMS = ('use_kmeans', 'n_clusters', 'min_cluster_size', 'min_samples', 'cluster_selection_epsilon')
+# 缓存和按键保存的模型只保留最近使用的若干个键，其余的在运行结束时删除
+DEFAULT_KEEP_CACHE = 20
+CACHE_KEY_PATTERN = re.compile(r'([0-9a-f]{40})')
+
+# 保存的降维和聚类模型名称（见umap_models.py），增量模式用它放置新诗词；
+# 每次完整写入topic_visualization时用本次结果对应的模型刷新
+TOPIC_MODEL_NAME = 'topic_umap'
+# 增量模式下新增、变化、删除的诗词超过训练数据的该比例时完整重新拟合
+DEFAULT_REFIT_THRESHOLD = 0.1
+# 增量模式下HDBSCAN标签由新诗词在降维空间中最近的若干首训练诗词投票决定
+PLACEMENT_NEIGHBORS = 15
+
+# 聚类参数网格搜索：评分抽样数量，以及保存最佳参数的文件（按降维参数区分，不含数据内容，
+# 新增少量诗词后仍能使用之前搜索得到的参数）
+DEFAULT_GRID_SAMPLE = 5000
+BEST_CLUSTER_CONFIG_FILE = os.path.join(EMBEDDING_CACHE_DIR, 'best_cluster_config.json')
+
+# 降维和聚类结果按运行（run）保存：数据表保存所有运行的结果，指针表记录当前运行，
+# 读取方使用的topic_visualization是只包含当前运行的视图
+VIS_TABLE = 'topic_visualization'
+VIS_DATA_TABLE = 'topic_visualization_data'
+VIS_RUNS_TABLE = 'topic_visualization_runs'
+VIS_ACTIVE_TABLE = 'topic_visualization_active'
+VIS_COLUMNS = ['poem_id', 'original_topics', 'topic_words', 'vector_json', 'umap_x', 'umap_y', 'cluster_label']
+# 保留最近几次完成的运行（当前运行始终保留）
+DEFAULT_KEEP_RUNS = 3
+# 每次executemany写入的行数（都在同一个事务中）
+DEFAULT_WRITE_BATCH = 10000
 
 # 读取topics_probabilities.csv文件
 def read_topic_csv(file_path):
@@ -74,22 +127,74 @@ def convert_to_vector(all_probabilities_str, num_topics=4):
         # 如果解析失败，返回零向量
         return [0] * num_topics
 
+def parse_probability_matrix(prob_series, num_topics=NUM_TOPICS):
+    """把allProbabilities列一次解析为连续的float32矩阵 (n, num_topics)
+
+    与逐行调用convert_to_vector结果一致：缺失值、无法解析的行为零向量，
+    不足num_topics个概率补0，多余的截断。
+    """
+    prob_series = pd.Series(prob_series).reset_index(drop=True)
+    matrix = np.zeros((len(prob_series), num_topics), dtype=np.float32)
+    present = prob_series.notna().to_numpy()
+    if not present.any():
+        return matrix
+    
+    # 所有字符串拼接后一次拆分为概率值，再按每行的个数还原到所在的行和位置
+    texts = prob_series[present].astype(str)
+    lengths = texts.str.count(',').to_numpy() + 1
+    tokens = ','.join(texts.tolist()).split(',')
+    try:
+        values = np.array(tokens, dtype=np.float64)
+    except ValueError:
+        values = pd.to_numeric(pd.Series(tokens), errors='coerce').to_numpy(dtype=np.float64)
+    rows = np.repeat(np.flatnonzero(present), lengths)
+    positions = np.arange(len(tokens)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    
+    keep = positions < num_topics
+    matrix[rows[keep], positions[keep]] = values[keep]
+    # 任一概率无法解析时整行视为解析失败
+    failed_rows = np.unique(rows[np.isnan(values)])
+    if len(failed_rows):
+        matrix[failed_rows] = 0
+        print(f"警告：{len(failed_rows)} 条主题概率无法解析，使用零向量")
+    return matrix
+
+def get_topic_matrix(df, num_topics=NUM_TOPICS):
+    """返回DataFrame对应的主题概率矩阵；首次调用时解析并缓存在df.attrs中，之后直接复用"""
+    matrix = df.attrs.get('topic_vectors')
+    if matrix is None or matrix.shape != (len(df), num_topics):
+        matrix = parse_probability_matrix(df['allProbabilities'], num_topics)
+        df.attrs['topic_vectors'] = matrix
+    return matrix
+
+def vector_to_json(vector):
+    """向量转为JSON字符串，float32按最短十进制表示输出（如0.8862而不是0.8862000107765198）"""
+    return json.dumps([float(str(value)) for value in vector])
+
+def enhance_dominant_topic(vectors, rng, noise_scale=0.01, boost=1.5):
+    """加微小噪声后增强主导主题并按行重新归一化（行和不大于0的向量不归一化）
+
+    噪声来自传入的np.random.Generator，同一种子得到完全相同的结果。
+    """
+    # 添加微小的噪声以增加数据的可分性
+    enhanced_vectors = vectors + rng.normal(0, noise_scale, vectors.shape)
+    
+    # 增强主导主题（加噪声后每行的最大值）的权重，再重新归一化
+    dominant_topics = np.argmax(enhanced_vectors, axis=1)
+    enhanced_vectors[np.arange(len(enhanced_vectors)), dominant_topics] *= boost
+    row_sums = enhanced_vectors.sum(axis=1, keepdims=True)
+    np.divide(enhanced_vectors, row_sums, out=enhanced_vectors, where=row_sums > 0)
+    return enhanced_vectors
+
 # 使用多种降维方法并结合它们的结果
-def reduce_dimensions(vectors, n_components=2, perplexity=30, random_state=42, n_neighbors=20, min_dist=0.5, spread=1.2, scale=1.0):
-    # 添加微小的噪声以增加数据的可分性，但减少噪声量
-    noise = np.random.normal(0, 0.01, vectors.shape)  # 减少噪声
-    vectors_with_noise = vectors + noise
+def reduce_dimensions(vectors, n_components=2, perplexity=30, random_state=42, n_neighbors=20, min_dist=0.5, spread=1.2, scale=1.0,
+                      return_model=False):
+    """return_model为True时返回 (坐标, model)，model包含PCA、UMAP和坐标标准化参数，可用place_new_poems放置新诗词"""
+    # 噪声和抖动都来自以random_state为种子的随机数生成器，相同输入和参数得到相同的坐标
+    rng = np.random.default_rng(random_state)
     
     # 应用主题权重增强，让主导主题更显著
-    enhanced_vectors = vectors_with_noise.copy()
-    for i in range(len(enhanced_vectors)):
-        # 找出每行的最大值（主导主题）
-        max_idx = np.argmax(enhanced_vectors[i])
-        # 增强主导主题的权重
-        enhanced_vectors[i, max_idx] *= 1.5
-        # 重新归一化
-        if np.sum(enhanced_vectors[i]) > 0:
-            enhanced_vectors[i] = enhanced_vectors[i] / np.sum(enhanced_vectors[i])
+    enhanced_vectors = enhance_dominant_topic(vectors, rng)
     
     # 首先用PCA进行初始降维，减少噪声影响
     pca = PCA(n_components=min(vectors.shape[1], 4))
@@ -109,18 +214,111 @@ def reduce_dimensions(vectors, n_components=2, perplexity=30, random_state=42, n
     umap_result = reducer.fit_transform(pca_result)
     
     # 标准化UMAP结果
-    umap_result = (umap_result - umap_result.mean(axis=0)) / umap_result.std(axis=0)
+    mean, std = umap_result.mean(axis=0), umap_result.std(axis=0)
+    umap_result = (umap_result - mean) / std
     umap_result *= scale
     
     # 添加更小的随机抖动，保持聚类结构但减少重叠
-    final_jitter = np.random.normal(0, 0.02, umap_result.shape)
+    final_jitter = rng.normal(0, 0.02, umap_result.shape)
     umap_result += final_jitter
     
+    if return_model:
+        return umap_result, {'pca': pca, 'reducer': reducer, 'mean': mean, 'std': std, 'scale': scale}
     return umap_result
 
+def embedding_cache_key(vectors, params):
+    """由概率矩阵内容和参数计算缓存键"""
+    h = hashlib.sha1()
+    h.update(json.dumps(dict(params, cache_version=EMBEDDING_CACHE_VERSION), sort_keys=True).encode('utf-8'))
+    h.update(str(vectors.shape).encode('utf-8'))
+    h.update(np.ascontiguousarray(vectors).tobytes())
+    return h.hexdigest()
+
+def best_config_key(embedding_params):
+    """最佳聚类参数的键：只由降维参数计算"""
+    payload = json.dumps(dict(embedding_params, cache_version=EMBEDDING_CACHE_VERSION), sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def load_cached_arrays(key):
+    """读取缓存的数组（字典），不存在或无法读取时返回None"""
+    path = os.path.join(EMBEDDING_CACHE_DIR, f'{key}.npz')
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+    except Exception as e:
+        print(f"读取缓存 {path} 失败: {e}")
+        return None
+    touch_cache_file(path)
+    return arrays
+
+def touch_cache_file(path):
+    """更新文件的修改时间，清理缓存时按修改时间判断最近是否使用过"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def prune_topic_caches(keep=DEFAULT_KEEP_CACHE):
+    """清理降维/聚类缓存（.npz/.json、网格搜索的坐标和结果）以及按键保存的模型：
+    只保留最近使用的keep个缓存键，keep为0时不清理。增量模式使用的模型和最佳参数文件不受影响。
+    """
+    if keep <= 0:
+        return
+    files_by_key = {}
+    for directory, prefixes in ((EMBEDDING_CACHE_DIR, ('',)),
+                                (umap_models.MODEL_DIR, (f'{TOPIC_MODEL_NAME}_', 'topic_clusterer_'))):
+        if not os.path.isdir(directory):
+            continue
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.tmp'):
+                continue
+            for prefix in prefixes:
+                match = CACHE_KEY_PATTERN.match(file_name, len(prefix)) if file_name.startswith(prefix) else None
+                if match:
+                    files_by_key.setdefault(match.group(1), []).append(os.path.join(directory, file_name))
+                    break
+    
+    def last_used(key):
+        return max(os.path.getmtime(path) for path in files_by_key[key])
+    stale = sorted(files_by_key, key=last_used, reverse=True)[keep:]
+    for key in stale:
+        for path in files_by_key[key]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"删除缓存文件 {path} 失败: {e}")
+    if stale:
+        print(f"已清理 {len(stale)} 个不常用的缓存键（保留最近使用的 {keep} 个）")
+
+def save_cached_arrays(key, arrays, params):
+    """保存数组到.npz，参数等元数据写入同名.json；先写临时文件再替换"""
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    path = os.path.join(EMBEDDING_CACHE_DIR, f'{key}.npz')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    
+    meta = {
+        'params': params,
+        'arrays': {name: list(array.shape) for name, array in arrays.items()},
+        'cache_version': EMBEDDING_CACHE_VERSION,
+        'created_at': time.time()
+    }
+    meta_path = os.path.join(EMBEDDING_CACHE_DIR, f'{key}.json')
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_meta, meta_path)
+
 # 使用HDBSCAN进行聚类，更能发现自然形状的聚类
-def cluster_points(points, min_cluster_size=50, min_samples=10, cluster_selection_epsilon=0.5):
-    """使用HDBSCAN进行聚类，更好地发现自然结构"""
+def cluster_points(points, min_cluster_size=50, min_samples=10, cluster_selection_epsilon=0.5, retry_noisy=True):
+    """使用HDBSCAN进行聚类，更好地发现自然结构
+
+    retry_noisy为False时噪声点过多也不调整参数重新聚类（网格搜索及其最佳参数使用，保证评分和应用的是同一结果）。
+    """
     print(f"使用HDBSCAN聚类，参数: min_cluster_size={min_cluster_size}, min_samples={min_samples}, epsilon={cluster_selection_epsilon}")
     
     try:
@@ -140,7 +338,7 @@ def cluster_points(points, min_cluster_size=50, min_samples=10, cluster_selectio
         print(f"HDBSCAN聚类结果: 发现 {n_clusters} 个聚类, {n_noise} 个噪声点 ({n_noise/len(points)*100:.2f}%)")
         
         # 如果噪声点太多，尝试调整参数
-        if n_noise / len(points) > 0.3:  # 如果噪声点超过30%
+        if retry_noisy and n_noise / len(points) > 0.3:  # 如果噪声点超过30%
             print("警告: 噪声点比例过高，尝试调整HDBSCAN参数")
             
             # 调整参数重新聚类
@@ -171,7 +369,243 @@ def cluster_points(points, min_cluster_size=50, min_samples=10, cluster_selectio
         # 如果HDBSCAN失败，回退到K-means
         kmeans = KMeans(n_clusters=6, random_state=42)
         cluster_labels = kmeans.fit_predict(points)
-        return cluster_labels, None
+        return cluster_labels, kmeans
+
+def place_new_poems(model, vectors, random_state=42):
+    """用已拟合的PCA、UMAP和聚类模型放置新诗词，返回 (坐标, 聚类标签)
+
+    预处理与reduce_dimensions相同（噪声、主导主题增强、标准化、抖动）。
+    K-means取最近的质心；HDBSCAN取降维空间中最近的PLACEMENT_NEIGHBORS首训练诗词的多数标签
+    （hdbscan.approximate_predict在设置cluster_selection_epsilon时与拟合得到的标签不一致）。
+    """
+    rng = np.random.default_rng(random_state)
+    enhanced_vectors = enhance_dominant_topic(vectors, rng)
+    coords = model['reducer'].transform(model['pca'].transform(enhanced_vectors))
+    coords = (coords - model['mean']) / model['std'] * model['scale']
+    coords += rng.normal(0, 0.02, coords.shape)
+    
+    clusterer = model['clusterer']
+    if isinstance(clusterer, KMeans):
+        labels = clusterer.predict(coords)
+    else:
+        train_labels = model['train_labels']
+        n_neighbors = min(PLACEMENT_NEIGHBORS, len(train_labels))
+        nn = NearestNeighbors(n_neighbors=n_neighbors).fit(model['train_coords'])
+        _, neighbour_index = nn.kneighbors(coords)
+        neighbour_labels = train_labels[neighbour_index]
+        unique_labels = np.unique(train_labels)
+        votes = np.stack([(neighbour_labels == label).sum(axis=1) for label in unique_labels], axis=1)
+        labels = unique_labels[np.argmax(votes, axis=1)]
+    return coords, labels
+
+def reduction_model_name(embedding_key):
+    """按降维缓存键保存的PCA和UMAP模型，降维缓存命中时用它刷新增量模式的模型"""
+    return f"{TOPIC_MODEL_NAME}_{embedding_key}"
+
+def clusterer_model_name(cluster_key):
+    """按聚类缓存键保存的聚类模型"""
+    return f"topic_clusterer_{cluster_key}"
+
+def save_topic_model(model, clusterer, params, cluster_key, poem_ids, vectors, coords, labels, run_id=None):
+    """保存拟合好的PCA、UMAP、聚类模型，连同参数、结果的cluster_key和所在的运行ID、训练数据及其坐标和标签"""
+    payload = dict(
+        model,
+        clusterer=clusterer,
+        cluster_key=cluster_key,
+        run_id=run_id,
+        train_coords=np.asarray(coords, dtype=np.float32),
+        train_labels=np.asarray(labels),
+        params=params,
+        poem_ids=poem_ids,
+        vectors=np.asarray(vectors, dtype=np.float32),
+        placed_ids=[],  # 之后增量放置的诗词
+        fingerprint=umap_models.data_fingerprint(poem_ids, vectors),
+        fitted_at=time.time()
+    )
+    path = umap_models.save_model(TOPIC_MODEL_NAME, payload)
+    print(f"降维和聚类模型已保存到: {path}")
+
+def compare_with_model(model, poem_ids, vectors):
+    """对比当前数据与模型的训练数据
+
+    返回 (新增诗词的布尔掩码, 概率发生变化的训练诗词数, 已删除的训练诗词数)。
+    """
+    known_ids = set(model['poem_ids']).union(model['placed_ids'])
+    new_mask = ~pd.Series(poem_ids).isin(known_ids).to_numpy()
+    
+    columns = [f'topic_{i}' for i in range(vectors.shape[1])]
+    trained = pd.DataFrame(model['vectors'], columns=columns)
+    trained['poemId'] = model['poem_ids']
+    current = pd.DataFrame(np.asarray(vectors, dtype=np.float32), columns=columns)
+    current['poemId'] = poem_ids
+    merged = trained.drop_duplicates('poemId').merge(
+        current.drop_duplicates('poemId'), on='poemId', how='left', suffixes=('', '_now'), indicator=True
+    )
+    removed = int((merged['_merge'] == 'left_only').sum())
+    both = merged[merged['_merge'] == 'both']
+    changed = int((both[columns].to_numpy() != both[[f'{c}_now' for c in columns]].to_numpy()).any(axis=1).sum())
+    return new_mask, changed, removed
+
+def run_incremental(topic_df, vectors, params, refit_threshold=DEFAULT_REFIT_THRESHOLD):
+    """增量模式：用保存的模型放置新增诗词，只把这些诗词追加到topic_visualization
+
+    没有可用模型、参数改变或数据变化超过refit_threshold时返回False，由调用方完整重新拟合。
+    """
+    model = umap_models.load_model(TOPIC_MODEL_NAME)
+    if model is None:
+        print("没有保存的降维和聚类模型，需要完整拟合")
+        return False
+    if model['params'] != params:
+        print(f"参数与保存的模型不同（模型参数: {model['params']}），需要完整拟合")
+        return False
+    if model.get('run_id') is None:
+        print("保存的模型没有对应的结果运行，需要完整拟合")
+        return False
+    if not check_active_run(model['run_id']):
+        print(f"模型对应的运行 {model['run_id']} 已不是当前运行或已被清理，需要完整拟合")
+        return False
+    
+    poem_ids = topic_df['poemId'].astype(str).to_numpy()
+    if umap_models.data_fingerprint(poem_ids, vectors) == model['fingerprint']:
+        print("数据与模型的训练数据一致，无需更新")
+        return True
+    
+    new_mask, changed, removed = compare_with_model(model, poem_ids, vectors)
+    new_count = int(new_mask.sum())
+    placed_count = len(model['placed_ids'])
+    drift = (placed_count + new_count + changed + removed) / max(1, len(model['poem_ids']))
+    print(f"训练数据 {len(model['poem_ids'])} 首，已增量放置 {placed_count} 首，本次新增 {new_count} 首，"
+          f"概率变化 {changed} 首，删除 {removed} 首（变化比例 {drift:.1%}）")
+    if drift > refit_threshold:
+        print(f"变化比例超过阈值 {refit_threshold:.1%}，需要完整拟合")
+        return False
+    if not new_count:
+        print("没有新增诗词")
+        return True
+    if changed or removed:
+        print("注意：概率变化或删除的诗词在完整拟合前保持原有坐标")
+    
+    print(f"正在用保存的模型放置 {new_count} 首新诗词...")
+    coords, labels = place_new_poems(model, vectors[new_mask], params['seed'])
+    save_results_to_db(coords, labels, topic_df[new_mask].reset_index(drop=True), vectors[new_mask],
+                       run_id=model['run_id'])
+    
+    model['placed_ids'] = list(model['placed_ids']) + poem_ids[new_mask].tolist()
+    umap_models.save_model(TOPIC_MODEL_NAME, model)
+    return True
+
+def build_cluster_grid(n_clusters_values, min_cluster_size_values, min_samples_values, epsilon_values):
+    """生成网格搜索的参数组合：每组为 {'use_kmeans': ..., 聚类参数...}"""
+    grid = [{'use_kmeans': True, 'n_clusters': n_clusters} for n_clusters in n_clusters_values]
+    for min_cluster_size in min_cluster_size_values:
+        for min_samples in min_samples_values:
+            for epsilon in epsilon_values:
+                grid.append({
+                    'use_kmeans': False,
+                    'min_cluster_size': min_cluster_size,
+                    'min_samples': min_samples,
+                    'cluster_selection_epsilon': epsilon
+                })
+    return grid
+
+# 网格搜索的工作进程共享的数据（由_init_grid_worker设置）
+_grid_data = {}
+
+def _init_grid_worker(embedding_path, sample_index, seed):
+    # 以只读内存映射打开降维结果，各进程共享同一份页缓存，不复制数据
+    _grid_data.update(
+        points=np.load(embedding_path, mmap_mode='r'),
+        sample_index=sample_index,
+        seed=seed
+    )
+
+def _run_grid_config(config):
+    """用一组参数聚类并在抽样上评分；聚类方式与main中应用最佳参数时相同
+
+    评分为抽样中非噪声点的silhouette乘以非噪声比例（避免把大部分点判为噪声的参数得高分），
+    聚类数少于2时无法计算silhouette，评分为-1。
+    """
+    start = time.perf_counter()
+    points = np.asarray(_grid_data['points'])
+    if config['use_kmeans']:
+        labels = KMeans(n_clusters=config['n_clusters'], random_state=_grid_data['seed'], n_init=20).fit_predict(points)
+    else:
+        labels, _ = cluster_points(
+            points,
+            min_cluster_size=config['min_cluster_size'],
+            min_samples=config['min_samples'],
+            cluster_selection_epsilon=config['cluster_selection_epsilon'],
+            retry_noisy=False
+        )
+    
+    sample = _grid_data['sample_index']
+    sample_labels = labels[sample]
+    clustered = sample_labels != -1
+    n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
+    noise_ratio = float(np.mean(labels == -1))
+    if len(set(sample_labels[clustered])) >= 2:
+        silhouette = float(silhouette_score(points[sample][clustered], sample_labels[clustered]))
+        score = silhouette * (1 - noise_ratio)
+    else:
+        silhouette = float('nan')
+        score = -1.0
+    return dict(config, n_found=n_clusters, noise_ratio=noise_ratio, silhouette=silhouette, score=score,
+                seconds=time.perf_counter() - start)
+
+def run_grid_search(points, grid, embedding_key, embedding_params, workers=None, sample_size=DEFAULT_GRID_SAMPLE, seed=42):
+    """在进程池中对降维结果做聚类参数网格搜索，保存全部结果和最佳参数，返回结果DataFrame"""
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    embedding_path = os.path.join(EMBEDDING_CACHE_DIR, f'{embedding_key}_coords.npy')
+    if not os.path.exists(embedding_path):
+        tmp_path = f"{embedding_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(points))
+        os.replace(tmp_path, embedding_path)
+    
+    # 所有参数组合在同一个固定抽样上评分
+    rng = np.random.default_rng(seed)
+    sample_index = np.sort(rng.choice(len(points), min(sample_size, len(points)), replace=False))
+    
+    print(f"开始聚类参数网格搜索：共 {len(grid)} 组参数")
+    results = []
+    # 主进程已运行过UMAP（numba线程池），fork出的子进程会导致退出时卡住，统一用spawn启动
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_grid_worker,
+                             initargs=(embedding_path, sample_index, seed),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        for result in executor.map(_run_grid_config, grid):
+            method = 'K-means' if result['use_kmeans'] else 'HDBSCAN'
+            params = {k: v for k, v in result.items() if k in CLUSTER_PARAMS and k != 'use_kmeans'}
+            print(f"{method} {params}: {result['n_found']} 个聚类，噪声 {result['noise_ratio']:.1%}，"
+                  f"silhouette={result['silhouette']:.4f}，评分={result['score']:.4f}（{result['seconds']:.1f} 秒）")
+            results.append(result)
+    
+    best_result = max(results, key=lambda result: result['score'])
+    best = {name: best_result[name] for name in CLUSTER_PARAMS if name in best_result}
+    results = pd.DataFrame(results).sort_values('score', ascending=False, ignore_index=True)
+    results.to_csv(os.path.join(EMBEDDING_CACHE_DIR, f'{embedding_key}_grid.csv'), index=False, encoding='utf-8-sig')
+    
+    saved = read_best_cluster_configs()
+    saved[best_config_key(embedding_params)] = {
+        'embedding_params': embedding_params,
+        'embedding_key': embedding_key,  # 搜索时使用的降维结果
+        'n_poems': len(points),
+        'config': best,
+        'score': best_result['score'],
+        'created_at': time.time()
+    }
+    tmp_path = f"{BEST_CLUSTER_CONFIG_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, BEST_CLUSTER_CONFIG_FILE)
+    print(f"最佳聚类参数: {best}（评分 {best_result['score']:.4f}），已保存到 {BEST_CLUSTER_CONFIG_FILE}")
+    return results
+
+def read_best_cluster_configs():
+    try:
+        with open(BEST_CLUSTER_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
 # 创建平滑的边界曲线
 def create_smooth_boundary(points, expand_factor=0.4, padding=0.2, smoothness=0.6):
@@ -236,70 +670,195 @@ def get_topic_color(probabilities, topic_color_map):
     
     return color
 
-def save_results_to_db(coords, labels, poems_data, vectors):
-    """保存处理结果到数据库"""
+def ensure_visualization_tables(cursor):
+    """创建运行记录表、当前运行指针表、结果数据表和供读取方使用的视图
+
+    topic_visualization是只包含当前运行结果的视图；
+    旧版本中它是直接追加数据的表，首次运行时改名为*_legacy，并把其中的数据作为一次运行迁移过来。
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_RUNS_TABLE} (
+            run_id INT AUTO_INCREMENT PRIMARY KEY,
+            mode VARCHAR(20),
+            params TEXT,
+            status ENUM('loading', 'complete') NOT NULL DEFAULT 'loading',
+            row_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP NULL
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_ACTIVE_TABLE} (
+            id TINYINT PRIMARY KEY,
+            run_id INT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM {VIS_ACTIVE_TABLE} WHERE id = 1")
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"INSERT INTO {VIS_ACTIVE_TABLE} (id, run_id) VALUES (1, NULL)")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIS_DATA_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            run_id INT NOT NULL,
+            poem_id INT,
+            original_topics TEXT,
+            topic_words TEXT,
+            vector_json TEXT,
+            umap_x FLOAT,
+            umap_y FLOAT,
+            cluster_label INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_run_id (run_id)
+        )
+    """)
+    
+    cursor.execute(
+        "SELECT TABLE_TYPE FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (VIS_TABLE,)
+    )
+    row = cursor.fetchone()
+    if row and row[0] == 'BASE TABLE':
+        legacy_table = f"{VIS_TABLE}_legacy"
+        print(f"迁移旧的结果表 {VIS_TABLE} -> {legacy_table}")
+        cursor.execute(f"RENAME TABLE {VIS_TABLE} TO {legacy_table}")
+        cursor.execute(f"INSERT INTO {VIS_RUNS_TABLE} (mode, status) VALUES ('legacy', 'loading')")
+        legacy_run = cursor.lastrowid
+        cursor.execute(f"""
+            INSERT INTO {VIS_DATA_TABLE} (run_id, {', '.join(VIS_COLUMNS)}, created_at)
+            SELECT %s, {', '.join(VIS_COLUMNS)}, created_at FROM {legacy_table}
+        """, (legacy_run,))
+        complete_run(cursor, legacy_run, cursor.rowcount)
+        cursor.execute(f"UPDATE {VIS_ACTIVE_TABLE} SET run_id = %s WHERE id = 1 AND run_id IS NULL", (legacy_run,))
+    
+    cursor.execute(f"""
+        CREATE OR REPLACE VIEW {VIS_TABLE} AS
+        SELECT d.id, d.run_id, {', '.join(f'd.{column}' for column in VIS_COLUMNS)}, d.created_at
+        FROM {VIS_DATA_TABLE} d
+        JOIN {VIS_ACTIVE_TABLE} a ON a.id = 1 AND d.run_id = a.run_id
+    """)
+
+def complete_run(cursor, run_id, row_count):
+    cursor.execute(f"""
+        UPDATE {VIS_RUNS_TABLE}
+        SET status = 'complete', row_count = row_count + %s, completed_at = CURRENT_TIMESTAMP
+        WHERE run_id = %s
+    """, (row_count, run_id))
+
+def is_active_run(cursor, run_id):
+    """run_id是否仍是当前运行且已完成；同时锁住当前运行指针，直到事务结束"""
+    cursor.execute(f"""
+        SELECT r.status FROM {VIS_ACTIVE_TABLE} a
+        JOIN {VIS_RUNS_TABLE} r ON r.run_id = a.run_id
+        WHERE a.id = 1 AND a.run_id = %s
+        FOR UPDATE
+    """, (run_id,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'complete'
+
+def check_active_run(run_id):
+    """增量模式追加前检查：模型对应的运行是否仍是当前运行（未被切换或清理）"""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            ensure_visualization_tables(cursor)
+            active = is_active_run(cursor, run_id)
+            conn.commit()
+        finally:
+            cursor.close()
+    return active
+
+def build_result_rows(run_id, coords, labels, poems_data, vectors):
+    """拼成插入用的行：poemId缺失时写0，主题和主题词缺失时写空字符串"""
+    def text_or_empty(value):
+        return "" if pd.isna(value) else str(value)
+    
+    coords = np.asarray(coords, dtype=np.float64)
+    poem_ids = poems_data['poemId'].fillna(0).astype(np.int64).tolist()
+    columns = [
+        [run_id] * len(poem_ids),
+        poem_ids,
+        [text_or_empty(value) for value in poems_data['allTopics']],
+        [text_or_empty(value) for value in poems_data['topicWords']],
+        [vector_to_json(vector) for vector in vectors],
+        coords[:, 0].tolist(),
+        coords[:, 1].tolist(),
+        np.asarray(labels, dtype=np.int64).tolist()
+    ]
+    return list(zip(*columns))
+
+def prune_runs(cursor, keep_runs):
+    """删除较早的运行：保留最近keep_runs次完成的运行和当前运行（正在写入的运行不受影响）"""
+    cursor.execute(f"SELECT run_id FROM {VIS_ACTIVE_TABLE} WHERE id = 1")
+    active_run = cursor.fetchone()[0]
+    cursor.execute(f"SELECT run_id FROM {VIS_RUNS_TABLE} WHERE status = 'complete' ORDER BY run_id DESC")
+    complete_runs = [row[0] for row in cursor.fetchall()]
+    keep = set(complete_runs[:max(1, keep_runs)])
+    if active_run is not None:
+        keep.add(active_run)
+    stale = [run for run in complete_runs if run not in keep]
+    if not stale:
+        return
+    placeholders = ', '.join(['%s'] * len(stale))
+    cursor.execute(f"DELETE FROM {VIS_DATA_TABLE} WHERE run_id IN ({placeholders})", stale)
+    cursor.execute(f"DELETE FROM {VIS_RUNS_TABLE} WHERE run_id IN ({placeholders})", stale)
+    print(f"已清理 {len(stale)} 次旧运行: {stale}")
+
+def save_results_to_db(coords, labels, poems_data, vectors, run_id=None, params=None,
+                       keep_runs=DEFAULT_KEEP_RUNS, batch_size=DEFAULT_WRITE_BATCH):
+    """保存处理结果到数据库，返回运行ID
+
+    run_id为None时新建一次运行：所有行在一个事务中写入，提交时同时把当前运行指针切换到该运行，
+    读取topic_visualization视图的一方只会看到完整的结果；之后按keep_runs清理旧运行。
+    传入run_id时把这些行追加到已有运行（增量模式），同样在一个事务中完成。
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = db_pool.acquire()
         cursor = conn.cursor()
         
-        # 创建新表来存储降维和聚类结果
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS topic_visualization (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                poem_id INT,
-                original_topics TEXT,
-                topic_words TEXT,
-                vector_json TEXT,
-                umap_x FLOAT,
-                umap_y FLOAT,
-                cluster_label INT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        # 表结构变更会隐式提交，放在写入事务之前
+        ensure_visualization_tables(cursor)
+        conn.commit()
+        
+        new_run = run_id is None
+        if new_run:
+            cursor.execute(
+                f"INSERT INTO {VIS_RUNS_TABLE} (mode, params) VALUES (%s, %s)",
+                ('full', json.dumps(params, ensure_ascii=False) if params is not None else None)
             )
-        """)
+            run_id = cursor.lastrowid
+            conn.commit()
+        rows = build_result_rows(run_id, coords, labels, poems_data, vectors)
         
-        # 准备插入数据
-        insert_query = """
-            INSERT INTO topic_visualization 
-            (poem_id, original_topics, topic_words, vector_json, umap_x, umap_y, cluster_label)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        insert_query = f"""
+            INSERT INTO {VIS_DATA_TABLE}
+            (run_id, {', '.join(VIS_COLUMNS)})
+            VALUES ({', '.join(['%s'] * (len(VIS_COLUMNS) + 1))})
         """
-        
-        # 构建数据
-        data_to_insert = []
-        for i in range(len(poems_data['poemId'])):
-            # 将向量转换为JSON字符串
-            vector_json = json.dumps(vectors[i].tolist())
-            
-            poem_id = poems_data['poemId'].iloc[i] if not pd.isna(poems_data['poemId'].iloc[i]) else 0
-            original_topics = str(poems_data['allTopics'].iloc[i]) if not pd.isna(poems_data['allTopics'].iloc[i]) else ""
-            topic_words = str(poems_data['topicWords'].iloc[i]) if not pd.isna(poems_data['topicWords'].iloc[i]) else ""
-            
-            data_to_insert.append((
-                int(poem_id),
-                original_topics,
-                topic_words,
-                vector_json,
-                float(coords[i][0]),
-                float(coords[i][1]),
-                int(labels[i])
-            ))
-        
-        # 分批插入数据，每批1000条
-        batch_size = 1000
-        total_batches = (len(data_to_insert) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(data_to_insert), batch_size):
-            batch = data_to_insert[i:i + batch_size]
-            try:
-                cursor.executemany(insert_query, batch)
+        try:
+            start = time.perf_counter()
+            if not new_run and not is_active_run(cursor, run_id):
+                raise RuntimeError(f"运行 {run_id} 已不是当前运行或已被清理，不能追加结果")
+            for i in range(0, len(rows), batch_size):
+                cursor.executemany(insert_query, rows[i:i + batch_size])
+            complete_run(cursor, run_id, len(rows))
+            if new_run:
+                cursor.execute(f"UPDATE {VIS_ACTIVE_TABLE} SET run_id = %s WHERE id = 1", (run_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if new_run:
+                cursor.execute(f"DELETE FROM {VIS_RUNS_TABLE} WHERE run_id = %s", (run_id,))
                 conn.commit()
-                print(f"已插入第 {i//batch_size + 1}/{total_batches} 批数据，共 {len(batch)} 条")
-            except Exception as e:
-                print(f"插入第 {i//batch_size + 1} 批数据时出错: {str(e)}")
-                conn.rollback()
-                raise e
+            raise
+        print(f"成功将{len(rows)}条处理结果保存到数据库（运行 {run_id}，用时 {time.perf_counter() - start:.2f} 秒）")
         
-        print(f"成功将{len(data_to_insert)}条处理结果保存到数据库。")
+        if new_run:
+            prune_runs(cursor, keep_runs)
+            conn.commit()
+        if mark_visualization_updated:
+            mark_visualization_updated(VIS_TABLE)
+        return run_id
         
     except Exception as e:
         print(f"数据库操作出错: {str(e)}")
@@ -308,7 +867,7 @@ def save_results_to_db(coords, labels, poems_data, vectors):
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            db_pool.release(conn)
 
 def create_interactive_plot(coords, labels, df, vectors, output_file='topic_clusters_interactive.png',
                           point_size=15, point_alpha=0.7, jitter=0.01, boundary_alpha=0.04, 
@@ -415,24 +974,19 @@ def create_interactive_plot(coords, labels, df, vectors, output_file='topic_clus
         for i, label in enumerate(unique_labels):
             mask = labels == label
             cluster_points = coords[mask]
-            cluster_df = df.iloc[mask]
             
             # 为每个点添加随机偏移以减少重叠
             jittered_points = cluster_points + np.random.normal(0, jitter*2, cluster_points.shape)
             
-            # 计算不透明度（基于最主要主题的概率）
-            alphas = []
-            for j in range(len(cluster_df)):
-                try:
-                    if pd.isna(cluster_df['allProbabilities'].iloc[j]):
-                        alphas.append(point_alpha)  # 默认透明度
-                    else:
-                        # 解析概率字符串
-                        probs = [float(p) for p in cluster_df['allProbabilities'].iloc[j].split(',')]
-                        # 使用最大概率值作为透明度，但限制在一定范围内
-                        alphas.append(min(0.9, max(point_alpha - 0.2, max(probs))))
-                except:
-                    alphas.append(point_alpha)  # 解析失败时使用默认透明度
+            # 计算不透明度（基于最主要主题的概率），使用已解析的概率矩阵
+            cluster_vectors = vectors[mask]
+            max_probs = cluster_vectors.max(axis=1)
+            # 使用最大概率值作为透明度，但限制在一定范围内；缺失或解析失败（零向量）时使用默认透明度
+            alphas = np.where(
+                cluster_vectors.any(axis=1),
+                np.minimum(0.9, np.maximum(point_alpha - 0.2, max_probs)),
+                point_alpha
+            )
             
             # 绘制散点
             scatter = ax.scatter(
@@ -606,15 +1160,14 @@ def create_interactive_plot(coords, labels, df, vectors, output_file='topic_clus
                 # 获取向量
                 vector = vectors[closest_idx]
                 
-                # 尝试解析概率
-                try:
-                    probs = [float(p) for p in row['allProbabilities'].split(',')]
-                    probs_formatted = ", ".join([f"{p:.3f}" for p in probs])
+                # 概率取自已解析的概率矩阵，零向量表示缺失或解析失败
+                if vector.any():
+                    probs_formatted = ", ".join([f"{p:.3f}" for p in vector])
                     
                     # 找出最显著的主题
-                    dominant_topic = np.argmax(probs)
-                    dominant_prob = probs[dominant_topic]
-                except:
+                    dominant_topic = np.argmax(vector)
+                    dominant_prob = vector[dominant_topic]
+                else:
                     probs_formatted = "解析失败"
                     dominant_topic = -1
                     dominant_prob = 0
@@ -675,7 +1228,9 @@ def parse_args():
     
     # 传统聚类参数
     parser.add_argument('--n_clusters', type=int, default=4, help='聚类数量(当使用K-means时)')
-    parser.add_argument('--use_kmeans', action='store_true', help='使用K-means而不是HDBSCAN')
+    parser.add_argument('--cluster_method', choices=['kmeans', 'hdbscan'], default='kmeans', help='聚类方法，默认K-means')
+    parser.add_argument('--use_kmeans', dest='cluster_method', action='store_const', const='kmeans',
+                        help='使用K-means（等同于 --cluster_method kmeans）')
     
     # 点的参数
     parser.add_argument('--point_size', type=float, default=15, help='点的大小') 
@@ -696,6 +1251,29 @@ def parse_args():
     # 颜色表示方法 - 默认使用K-means
     parser.add_argument('--use_cluster_colors', action='store_true', help='使用聚类标签而不是主题概率来确定颜色')
     
+    # 随机种子（降维的噪声、抖动和UMAP，以及K-means）
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，相同种子和输入得到相同的结果')
+    # 降维和聚类结果缓存（见EMBEDDING_CACHE_DIR）
+    parser.add_argument('--no_cache', action='store_true', help='不使用缓存，重新降维和聚类')
+    parser.add_argument('--keep_cache', type=int, default=DEFAULT_KEEP_CACHE,
+                        help='保留最近使用的缓存键数量（降维/聚类缓存及对应模型），0表示不清理')
+    parser.add_argument('--keep_runs', type=int, default=DEFAULT_KEEP_RUNS, help='数据库中保留的已完成运行次数')
+    
+    # full 完整降维和聚类；incremental 用保存的模型只放置新增诗词并追加到数据库
+    # grid 对聚类参数做网格搜索并保存最佳参数，不写数据库
+    parser.add_argument('--mode', choices=['full', 'incremental', 'grid'], default='full', help='运行模式')
+    parser.add_argument('--refit_threshold', type=float, default=DEFAULT_REFIT_THRESHOLD,
+                        help='增量模式下数据变化比例超过该值时完整重新拟合')
+    
+    # 聚类参数网格搜索（--grid_n_clusters不给值时只搜索HDBSCAN，HDBSCAN的任一参数不给值时只搜索K-means）
+    parser.add_argument('--grid_n_clusters', type=int, nargs='*', default=[3, 4, 5, 6, 8], help='搜索的K-means聚类数量')
+    parser.add_argument('--grid_min_cluster_size', type=int, nargs='*', default=[15, 30, 50, 80], help='搜索的HDBSCAN最小聚类大小')
+    parser.add_argument('--grid_min_samples', type=int, nargs='*', default=[5, 10], help='搜索的HDBSCAN最小样本数')
+    parser.add_argument('--grid_epsilon', type=float, nargs='*', default=[0.0, 0.25, 0.5], help='搜索的HDBSCAN聚类选择epsilon')
+    parser.add_argument('--grid_sample', type=int, default=DEFAULT_GRID_SAMPLE, help='计算silhouette的抽样数量')
+    parser.add_argument('--workers', type=int, default=None, help='网格搜索的进程数，默认为CPU核数')
+    parser.add_argument('--use_best_config', action='store_true', help='使用网格搜索保存的最佳聚类参数')
+    
     # 输入文件
     parser.add_argument('--input', type=str, default='lda02_topics_with_probabilities.csv', help='输入CSV文件路径')
     
@@ -703,13 +1281,18 @@ def parse_args():
     parser.add_argument('--output', type=str, default='lda02_topic_scatter.png', help='输出文件路径')
     
     args = parser.parse_args()
-    # 默认使用K-means聚类方法
-    args.use_kmeans = True
+    args.use_kmeans = args.cluster_method == 'kmeans'
     return args
 
 def main():
     # 解析命令行参数
     args = parse_args()
+    if args.mode == 'grid':
+        grid = build_cluster_grid(args.grid_n_clusters, args.grid_min_cluster_size,
+                                  args.grid_min_samples, args.grid_epsilon)
+        if not grid:
+            print("错误: 聚类参数网格为空，请为--grid_n_clusters或全部HDBSCAN网格参数提供取值")
+            return
     
     # 读取主题概率数据
     print(f"正在读取主题概率数据: {args.input}")
@@ -752,14 +1335,9 @@ def main():
                 print("可以使用 --input 参数指定文件路径，例如: --input=D:/01/lunwen/processdata/lda02_topics_with_probabilities.csv")
                 return
     
-    # 将主题概率转换为向量 - 使用4个主题
+    # 将主题概率转换为向量 - 使用4个主题，解析结果缓存在topic_df中供后续步骤复用
     print("正在转换主题概率数据为向量...")
-    vectors = []
-    for prob_str in topic_df['allProbabilities']:
-        vector = convert_to_vector(prob_str, num_topics=4)  # 明确指定为4个主题
-        vectors.append(vector)
-    
-    vectors = np.array(vectors)
+    vectors = get_topic_matrix(topic_df, num_topics=NUM_TOPICS)
     
     # 输出向量形状和前几个样本作为参考
     print(f"生成的向量数组形状: {vectors.shape}")
@@ -768,35 +1346,104 @@ def main():
         for i in range(min(3, len(vectors))):
             print(f"  向量 {i+1}: {vectors[i]}")
     
+    # 缓存键：降维坐标只取决于概率矩阵和降维参数，聚类标签还取决于聚类参数
+    embedding_params = {name: getattr(args, name) for name in EMBEDDING_PARAMS}
+    embedding_key = embedding_cache_key(vectors, embedding_params)
+    
+    # 使用网格搜索为相同降维参数找到的最佳聚类参数（搜索时的数据可以与当前略有不同）
+    retry_noisy = True
+    if args.use_best_config and args.mode != 'grid':
+        best = read_best_cluster_configs().get(best_config_key(embedding_params))
+        if best:
+            print(f"使用网格搜索得到的最佳聚类参数: {best['config']}（搜索时共 {best.get('n_poems', '?')} 首诗词）")
+            for name, value in best['config'].items():
+                setattr(args, name, value)
+            # 网格搜索评分时没有重新聚类，这里也不重新聚类
+            retry_noisy = False
+        else:
+            print("当前降维参数没有网格搜索结果，使用命令行中的聚类参数")
+    cluster_params = dict(embedding_params, **{name: getattr(args, name) for name in CLUSTER_PARAMS})
+    if not retry_noisy:
+        cluster_params['retry_noisy'] = False
+    
+    if args.mode == 'incremental':
+        if run_incremental(topic_df, vectors, cluster_params, args.refit_threshold):
+            return
+        print("改为完整拟合...")
+    
+    cluster_key = embedding_cache_key(vectors, cluster_params)
+    cached_embedding = None if args.no_cache else load_cached_arrays(embedding_key)
+    cached_clusters = None if args.no_cache else load_cached_arrays(cluster_key)
+    
+    # 写入数据库时需要与结果对应的模型（供增量模式使用），缓存命中但没有对应模型时重新拟合
+    model = clusterer = None
+    if args.mode != 'grid':
+        if cached_embedding is not None:
+            model = umap_models.load_model(reduction_model_name(embedding_key))
+            if model is None:
+                cached_embedding = None
+            else:
+                touch_cache_file(umap_models.model_path(reduction_model_name(embedding_key)))
+        if cached_clusters is not None and cached_embedding is not None:
+            saved = umap_models.load_model(clusterer_model_name(cluster_key))
+            clusterer = saved['clusterer'] if saved else None
+            if clusterer is not None:
+                touch_cache_file(umap_models.model_path(clusterer_model_name(cluster_key)))
+        if clusterer is None:
+            cached_clusters = None
+    
     # 降维
-    print("正在进行降维...")
-    umap_result = reduce_dimensions(
-        vectors,
-        n_neighbors=args.n_neighbors,
-        min_dist=args.min_dist,
-        spread=args.spread,
-        scale=args.scale,
-        random_state=42  # 固定随机种子以获得稳定结果
-    )
+    if cached_embedding is not None:
+        print(f"使用缓存的降维结果（{embedding_key[:12]}）")
+        umap_result = cached_embedding['coords']
+    else:
+        print("正在进行降维...")
+        umap_result, model = reduce_dimensions(
+            vectors,
+            n_neighbors=args.n_neighbors,
+            min_dist=args.min_dist,
+            spread=args.spread,
+            scale=args.scale,
+            random_state=args.seed,  # 固定随机种子以获得稳定结果
+            return_model=True
+        )
+        save_cached_arrays(embedding_key, {'coords': umap_result}, embedding_params)
+        umap_models.save_model(reduction_model_name(embedding_key), model)
+    
+    if args.mode == 'grid':
+        run_grid_search(umap_result, grid, embedding_key, embedding_params,
+                        workers=args.workers, sample_size=args.grid_sample, seed=args.seed)
+        prune_topic_caches(args.keep_cache)
+        return
     
     # 聚类
-    if args.use_kmeans:
-        print(f"正在使用K-means进行聚类 (n_clusters={args.n_clusters})...")
-        kmeans = KMeans(n_clusters=args.n_clusters, random_state=42, n_init=20)  # 增加初始化次数
-        cluster_labels = kmeans.fit_predict(umap_result)
-        clusterer = None
+    if cached_clusters is not None:
+        print(f"使用缓存的聚类结果（{cluster_key[:12]}）")
+        cluster_labels = cached_clusters['labels']
     else:
-        print("正在使用HDBSCAN进行聚类...")
-        cluster_labels, clusterer = cluster_points(
-            umap_result,
-            min_cluster_size=args.min_cluster_size,
-            min_samples=args.min_samples,
-            cluster_selection_epsilon=args.cluster_selection_epsilon
-        )
+        if args.use_kmeans:
+            print(f"正在使用K-means进行聚类 (n_clusters={args.n_clusters})...")
+            kmeans = KMeans(n_clusters=args.n_clusters, random_state=args.seed, n_init=20)  # 增加初始化次数
+            cluster_labels = kmeans.fit_predict(umap_result)
+            clusterer = kmeans
+        else:
+            print("正在使用HDBSCAN进行聚类...")
+            cluster_labels, clusterer = cluster_points(
+                umap_result,
+                min_cluster_size=args.min_cluster_size,
+                min_samples=args.min_samples,
+                cluster_selection_epsilon=args.cluster_selection_epsilon,
+                retry_noisy=retry_noisy
+            )
+        save_cached_arrays(cluster_key, {'labels': cluster_labels}, cluster_params)
+        umap_models.save_model(clusterer_model_name(cluster_key), {'clusterer': clusterer})
     
-    # 保存结果到数据库
-    print("跳过数据库保存操作...")
-    save_results_to_db(umap_result, cluster_labels, topic_df, vectors)
+    # 保存结果到数据库（新的一次运行），再用本次结果对应的模型刷新增量模式的模型
+    run_id = save_results_to_db(umap_result, cluster_labels, topic_df, vectors,
+                                params=cluster_params, keep_runs=args.keep_runs)
+    save_topic_model(model, clusterer, cluster_params, cluster_key, topic_df['poemId'].astype(str).to_numpy(), vectors,
+                     umap_result, cluster_labels, run_id)
+    prune_topic_caches(args.keep_cache)
     
     # 创建交互式可视化
     print("正在生成交互式可视化...")
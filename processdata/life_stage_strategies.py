@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db import get_pool, DRIVER_MYSQL_CONNECTOR, DRIVER_PYMYSQL
+from poet_distribution import (
+    LIFE_STAGES,
+    STAGE_MIN_PERCENTAGES,
+    LONGEVITY_STAGE_WEIGHTS,
+    calculate_life_stage_distribution_vectorized,
+    get_data_from_db,
+    save_to_database,
+    summarize_distribution,
+    years_to_int
+)
+
+# 各策略的结果写入 poet_life_stage_distribution_<策略名>_v<版本> 表
+BASE_TABLE = 'poet_life_stage_distribution'
+VARIANTS_TABLE = 'poet_life_stage_distribution_variants'
+TIMELINE_DATABASE = 'poet_timeline_db'
+
+# 较宽松的最低比例，减少“保底”对分布形状的影响
+LOW_MIN_PERCENTAGES = {
+    '少年期(5-15岁)': 0.01,
+    '青年期(16-25岁)': 0.05,
+    '壮年期(26-40岁)': 0.10,
+    '中年期(41-60岁)': 0.05,
+    '晚年期(61岁以上)': 0.01
+}
+
+class AllocationStrategy:
+    """生命阶段分配策略
+
+    子类实现allocate，返回与calculate_life_stage_distribution相同格式的DataFrame
+    （poetName, poetID, startYear, endYear, lifeStage, poemCount, totalPoems, percentage）。
+    """
+    # 需要的额外数据（如'timelines'），由run_strategies统一加载一次
+    requires = ()
+
+    def __init__(self, name):
+        if not re.fullmatch(r'[a-z0-9_]+', name):
+            raise ValueError(f"策略名只能包含小写字母、数字和下划线: {name}")
+        self.name = name
+
+    def params(self):
+        """写入版本记录的策略参数"""
+        return {}
+
+    def allocate(self, poet_df, poems_df, data):
+        raise NotImplementedError
+
+class LongevityWeightStrategy(AllocationStrategy):
+    """按寿命分档的权重 + 各阶段最低比例（poet_distribution中的默认模型）"""
+
+    def __init__(self, name, min_percentages=None, longevity_weights=None):
+        super().__init__(name)
+        self.min_percentages = STAGE_MIN_PERCENTAGES if min_percentages is None else min_percentages
+        self.longevity_weights = LONGEVITY_STAGE_WEIGHTS if longevity_weights is None else longevity_weights
+
+    def params(self):
+        return {
+            'min_percentages': self.min_percentages,
+            'longevity_weights': self.longevity_weights
+        }
+
+    def allocate(self, poet_df, poems_df, data):
+        return calculate_life_stage_distribution_vectorized(
+            poet_df, poems_df,
+            min_percentages=self.min_percentages,
+            longevity_weights=self.longevity_weights
+        )
+
+def parse_poem_ids(poem_id_range):
+    """解析poet_timelines.poem_id_range，如"12-30, 45、50~52"，返回[(起始ID, 结束ID)]"""
+    if poem_id_range is None or (isinstance(poem_id_range, float) and np.isnan(poem_id_range)):
+        return []
+    ranges = []
+    for part in re.split(r'[,，、;；\s]+', str(poem_id_range).strip()):
+        match = re.fullmatch(r'(\d+)(?:\s*[-–—~～至]\s*(\d+))?', part)
+        if not match:
+            continue
+        low = int(match.group(1))
+        high = int(match.group(2)) if match.group(2) else low
+        ranges.append((min(low, high), max(low, high)))
+    return ranges
+
+def stage_for_age(ages):
+    """年龄所在的生命阶段序号；小于5岁归入少年期，超过100岁归入晚年期"""
+    stage_mins = np.array([stage[0] for stage in LIFE_STAGES])
+    return np.clip(np.searchsorted(stage_mins, ages, side='right') - 1, 0, len(LIFE_STAGES) - 1)
+
+class TimelineAnchoredStrategy(AllocationStrategy):
+    """时间线锚定：poem_id_range覆盖的诗词按所在时期的年龄直接归入对应阶段，
+    其余诗词交给fallback策略分配"""
+    requires = ('timelines',)
+
+    def __init__(self, name, fallback):
+        super().__init__(name)
+        self.fallback = fallback
+
+    def params(self):
+        return {'fallback': self.fallback.name, 'fallback_params': self.fallback.params()}
+
+    def anchor_poems(self, poet_df, poems_df, timelines):
+        """返回被时间线锚定的诗词：poems_df的索引 -> 生命阶段序号"""
+        if timelines is None or timelines.empty:
+            return pd.Series(dtype=np.int64)
+        intervals = []
+        for row in timelines.itertuples(index=False):
+            if pd.isna(row.start_year):
+                continue
+            end_year = row.start_year if pd.isna(row.end_year) else row.end_year
+            middle_year = (int(row.start_year) + int(end_year)) // 2
+            for low, high in parse_poem_ids(row.poem_id_range):
+                intervals.append((row.poet_name, low, high, middle_year))
+        if not intervals:
+            return pd.Series(dtype=np.int64)
+        intervals = pd.DataFrame(intervals, columns=['poetName', 'low', 'high', 'middleYear'])
+
+        # 出生年份取poet表中的StartYear，与其他策略一致
+        birth_years, valid = years_to_int(poet_df['StartYear'])
+        births = pd.DataFrame({'poetName': poet_df['NameHZ'].to_numpy()[valid], 'birthYear': birth_years[valid]})
+        births = births.drop_duplicates('poetName')
+        intervals = intervals.merge(births, on='poetName')
+
+        poems = poems_df[['poetName', 'poemId']].reset_index()
+        matched = poems.merge(intervals, on='poetName')
+        matched = matched[(matched['poemId'] >= matched['low']) & (matched['poemId'] <= matched['high'])]
+        # 一首诗落在多个时期时取第一个
+        matched = matched.drop_duplicates('index')
+        stages = stage_for_age((matched['middleYear'] - matched['birthYear']).to_numpy())
+        return pd.Series(stages, index=matched['index'].to_numpy())
+
+    def allocate(self, poet_df, poems_df, data):
+        anchored = self.anchor_poems(poet_df, poems_df, data.get('timelines'))
+        rest = self.fallback.allocate(poet_df, poems_df.drop(index=anchored.index), data)
+        if anchored.empty:
+            return rest
+
+        stage_names = [stage[2] for stage in LIFE_STAGES]
+        anchored_counts = pd.DataFrame({
+            'poetName': poems_df.loc[anchored.index, 'poetName'].to_numpy(),
+            'lifeStage': np.array(stage_names, dtype=object)[anchored.to_numpy()]
+        }).value_counts().rename('poemCount').reset_index()
+
+        # 锚定的诗词按与fallback相同的规则匹配诗人（需要有完整的生卒年）
+        start_years, start_valid = years_to_int(poet_df['StartYear'])
+        end_years, end_valid = years_to_int(poet_df['EndYear'])
+        keep = start_valid & end_valid
+        poets = pd.DataFrame({
+            'poetName': poet_df['NameHZ'].to_numpy()[keep],
+            'poetID': poet_df['poetID'].to_numpy()[keep],
+            'startYear': start_years[keep],
+            'endYear': end_years[keep]
+        })
+        anchored_rows = poets.merge(anchored_counts, on='poetName')
+
+        combined = pd.concat([rest.drop(columns=['totalPoems', 'percentage'], errors='ignore'), anchored_rows])
+        combined = combined.groupby(
+            ['poetID', 'poetName', 'startYear', 'endYear', 'lifeStage'], sort=False, as_index=False
+        )['poemCount'].sum()
+        combined['totalPoems'] = combined.groupby('poetID')['poemCount'].transform('sum')
+        combined['percentage'] = combined['poemCount'] / combined['totalPoems'] * 100
+
+        # 按poet表顺序、生命阶段顺序排列
+        poet_order = {poet_id: i for i, poet_id in enumerate(poet_df['poetID'])}
+        combined['_poet'] = combined['poetID'].map(poet_order)
+        combined['_stage'] = combined['lifeStage'].map({name: i for i, name in enumerate(stage_names)})
+        combined = combined.sort_values(['_poet', '_stage']).drop(columns=['_poet', '_stage'])
+        return combined[['poetName', 'poetID', 'startYear', 'endYear', 'lifeStage',
+                         'poemCount', 'totalPoems', 'percentage']].reset_index(drop=True)
+
+def build_strategies():
+    """已注册的策略，按名称索引"""
+    longevity = LongevityWeightStrategy('longevity')
+    strategies = [
+        longevity,
+        LongevityWeightStrategy('longevity_low_min', min_percentages=LOW_MIN_PERCENTAGES),
+        TimelineAnchoredStrategy('timeline', fallback=longevity)
+    ]
+    return {strategy.name: strategy for strategy in strategies}
+
+def load_timelines():
+    """从poet_timeline_db读取时间线及对应的诗人姓名"""
+    pool = get_pool(database=TIMELINE_DATABASE, driver=DRIVER_PYMYSQL)
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT p.name, t.start_year, t.end_year, t.poem_id_range
+            FROM poet_timelines t
+            JOIN poets p ON p.id = t.poet_id
+            ORDER BY t.poet_id, t.start_year, t.id
+            """)
+            rows = cursor.fetchall()
+    return pd.DataFrame(list(rows), columns=['poet_name', 'start_year', 'end_year', 'poem_id_range'])
+
+# 工作进程中的共享数据，由进程池的initializer设置一次
+_worker_data = {}
+
+def _init_worker(data):
+    _worker_data.update(data)
+
+def _run_strategy(strategy):
+    start_time = time.perf_counter()
+    result = strategy.allocate(_worker_data['poet_df'], _worker_data['poems_df'], _worker_data)
+    return strategy.name, result, time.perf_counter() - start_time
+
+def run_strategies(strategies, data, workers=None):
+    """在进程池中计算各策略的分布；数据只传给每个工作进程一次"""
+    workers = workers or min(len(strategies), os.cpu_count() or 1)
+    results = {}
+    if workers <= 1:
+        _init_worker(data)
+        for strategy in strategies:
+            name, result, elapsed = _run_strategy(strategy)
+            results[name] = (result, elapsed)
+        return results
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as executor:
+        for name, result, elapsed in executor.map(_run_strategy, strategies):
+            results[name] = (result, elapsed)
+    return results
+
+def ensure_variants_table(cursor):
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {VARIANTS_TABLE} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        strategy VARCHAR(64) NOT NULL,
+        version INT NOT NULL,
+        table_name VARCHAR(128) NOT NULL,
+        params JSON,
+        row_count INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uk_strategy_version (strategy, version)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+def next_variant(strategy):
+    """策略的下一个版本号及写入结果的表名（此时还未登记）"""
+    pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            ensure_variants_table(cursor)
+            cursor.execute(f"SELECT COALESCE(MAX(version), 0) + 1 FROM {VARIANTS_TABLE} WHERE strategy = %s",
+                           (strategy.name,))
+            version = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+    return version, f"{BASE_TABLE}_{strategy.name}_v{version}"
+
+def register_variant(strategy, version, table_name, row_count):
+    """结果表写入成功后，在版本记录表中登记该版本"""
+    pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"INSERT INTO {VARIANTS_TABLE} (strategy, version, table_name, params, row_count) VALUES (%s, %s, %s, %s, %s)",
+                (strategy.name, version, table_name, json.dumps(strategy.params(), ensure_ascii=False), row_count)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+
+def main():
+    available = build_strategies()
+    parser = argparse.ArgumentParser(description='并行评估多种生命阶段分配策略，结果写入带版本号的分布表')
+    parser.add_argument('--strategies', nargs='+', choices=sorted(available), default=sorted(available),
+                        help='要计算的策略（默认全部）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认取策略数与CPU核数的较小值')
+    parser.add_argument('--dry-run', action='store_true', help='只计算并打印汇总，不写入数据库')
+    args = parser.parse_args()
+
+    strategies = [available[name] for name in args.strategies]
+
+    # 只读取一次数据，所有策略共用
+    poet_df, poems_df = get_data_from_db()
+    data = {'poet_df': poet_df, 'poems_df': poems_df}
+    if any('timelines' in strategy.requires for strategy in strategies):
+        try:
+            data['timelines'] = load_timelines()
+            print(f"读取了 {len(data['timelines'])} 条诗人时间线记录")
+        except Exception as e:
+            print(f"读取时间线数据时出错，时间线策略将只使用后备分配: {e}")
+            data['timelines'] = None
+
+    results = run_strategies(strategies, data, args.workers)
+
+    for strategy in strategies:
+        distribution_df, elapsed = results[strategy.name]
+        totals = distribution_df.groupby('lifeStage')['poemCount'].sum() if not distribution_df.empty else {}
+        print(f"策略 {strategy.name}: {distribution_df['poetName'].nunique() if not distribution_df.empty else 0} 位诗人，用时 {elapsed:.2f} 秒")
+        for _, _, stage_name in LIFE_STAGES:
+            print(f"  {stage_name}: {int(totals.get(stage_name, 0))}")
+        if args.dry_run or distribution_df.empty:
+            continue
+        summary_df = summarize_distribution(distribution_df)
+        version, table_name = next_variant(strategy)
+        # 先写结果表，写入失败时直接抛出，不登记指向空表的版本
+        save_to_database(summary_df, table_name, raise_errors=True)
+        register_variant(strategy, version, table_name, len(summary_df))
+
+if __name__ == "__main__":
+    main()
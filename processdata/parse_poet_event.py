@@ -3,21 +3,17 @@ import re
 import sys
 import pymysql
 import pymysql.cursors
+from db import get_pool, DRIVER_PYMYSQL
 
-# 数据库配置
-TIMELINE_DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',
-    'database': 'poet_timeline_db',
-    'charset': 'utf8mb4'
-}
+# 时间线数据库的连接池（主机、用户等连接参数见db/config.py，可用环境变量覆盖）
+TIMELINE_DB_NAME = 'poet_timeline_db'
+timeline_pool = get_pool(database=TIMELINE_DB_NAME, driver=DRIVER_PYMYSQL)
 
 def connect_to_db():
     """连接到数据库"""
     try:
         print("正在连接到数据库...")
-        connection = pymysql.connect(**TIMELINE_DB_CONFIG)
+        connection = timeline_pool.acquire()
         print("数据库连接成功")
         return connection
     except pymysql.Error as e:
@@ -208,8 +204,8 @@ def main():
     finally:
         # 关闭数据库连接
         if connection:
-            connection.close()
-            print("数据库连接已关闭")
+            timeline_pool.release(connection)
+            print("数据库连接已归还连接池")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,130 @@
+import datetime
+import decimal
+import json
+
+import numpy as np
+
+# 可选依赖：未安装时对应的编码/压缩方式不可用
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ENCODING_JSON = 'json'
+ENCODING_MSGPACK = 'msgpack'
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZSTD = 'zstd'
+
+ZSTD_LEVEL = 3
+
+def available_codecs():
+    """当前服务器支持的编码和压缩方式"""
+    encodings = [ENCODING_JSON]
+    if msgpack is not None:
+        encodings.append(ENCODING_MSGPACK)
+    compressions = [COMPRESSION_NONE]
+    if zstandard is not None:
+        compressions.append(COMPRESSION_ZSTD)
+    # permessage-deflate 由websockets在握手时自动协商，对所有消息生效
+    return {'encodings': encodings, 'compressions': compressions}
+
+def _msgpack_default(obj):
+    """msgpack无法直接处理的类型"""
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+def _pack_column(values):
+    """把一列数值打包成小端float32/int32字节串，非数值列原样保留
+
+    浮点列中的None用NaN表示；整数列（如诗词、诗人ID）保持整数类型，
+    其中的None填0并另附nulls掩码（每行一个字节，1表示空值），避免转成float32后丢失精度。
+    """
+    has_float = False
+    has_null = False
+    for value in values:
+        if value is None:
+            has_null = True
+        elif isinstance(value, bool) or not isinstance(value, (int, float, decimal.Decimal, np.number)):
+            return {'dtype': 'list', 'data': list(values)}
+        elif not isinstance(value, (int, np.integer)):
+            has_float = True
+    if has_float:
+        array = np.array([np.nan if v is None else float(v) for v in values], dtype='<f4')
+        return {'dtype': 'float32', 'data': array.tobytes()}
+    array = np.array([0 if v is None else v for v in values], dtype=np.int64)
+    if len(array) == 0 or (array.min() >= np.iinfo(np.int32).min and array.max() <= np.iinfo(np.int32).max):
+        column = {'dtype': 'int32', 'data': array.astype('<i4').tobytes()}
+    else:
+        column = {'dtype': 'int64', 'data': array.astype('<i8').tobytes()}
+    if has_null:
+        column['nulls'] = np.array([v is None for v in values], dtype=np.uint8).tobytes()
+    return column
+
+def to_columnar(result):
+    """把结果中的data记录列表转换为按列存储，数值列打包为二进制数组"""
+    if not isinstance(result, dict):
+        return result
+    records = result.get('data')
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return result
+    names = list(records[0].keys())
+    for record in records[1:]:
+        for name in record:
+            if name not in names:
+                names.append(name)
+    columnar = {k: v for k, v in result.items() if k != 'data'}
+    columnar['format'] = 'columnar'
+    columnar['length'] = len(records)
+    columnar['columns'] = {name: _pack_column([r.get(name) for r in records]) for name in names}
+    return columnar
+
+class PayloadCodec:
+    """每个客户端协商得到的响应编码方式"""
+
+    def __init__(self, encoding=ENCODING_JSON, compression=COMPRESSION_NONE):
+        self.encoding = encoding
+        self.compression = compression
+        self._compressor = None
+
+    @property
+    def name(self):
+        return f"{self.encoding}+{self.compression}"
+
+    @property
+    def is_binary(self):
+        return self.encoding != ENCODING_JSON or self.compression != COMPRESSION_NONE
+
+    def negotiate(self, encoding=None, compression=None):
+        """根据客户端请求选择编码，不支持的方式回退到json/none"""
+        available = available_codecs()
+        self.encoding = encoding if encoding in available['encodings'] else ENCODING_JSON
+        self.compression = compression if compression in available['compressions'] else COMPRESSION_NONE
+        self._compressor = None
+        return {'encoding': self.encoding, 'compression': self.compression, 'available': available}
+
+    def encode(self, result, json_serializer=None):
+        """编码响应：json模式返回字符串（文本帧），其余返回bytes（二进制帧）"""
+        if self.encoding == ENCODING_MSGPACK:
+            payload = msgpack.packb(to_columnar(result), default=_msgpack_default, use_bin_type=True)
+        elif json_serializer:
+            payload = json_serializer(result)
+        else:
+            payload = json.dumps(result, default=str)
+
+        if self.compression == COMPRESSION_ZSTD:
+            if isinstance(payload, str):
+                payload = payload.encode('utf-8')
+            if self._compressor is None:
+                self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            payload = self._compressor.compress(payload)
+        return payload
@@ -1,36 +1,80 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import mysql.connector
 import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.font_manager import FontProperties
 import random
+import argparse
+import hashlib
+import os
+import time
+from db import get_pool, DRIVER_MYSQL_CONNECTOR
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
 plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 
-# 连接数据库
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '123456',  # 替换为你的密码
-    'database': 'lunwen'
+# 数据库连接池（连接参数见db/config.py，可用环境变量覆盖）
+db_pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR)
+
+# 生命阶段区间
+LIFE_STAGES = [
+    (5, 15, '少年期(5-15岁)'),
+    (16, 25, '青年期(16-25岁)'),
+    (26, 40, '壮年期(26-40岁)'),
+    (41, 60, '中年期(41-60岁)'),
+    (61, 100, '晚年期(61岁以上)')
+]
+
+# 各个生命阶段的最低比例
+STAGE_MIN_PERCENTAGES = {
+    '少年期(5-15岁)': 0.03,   # 至少3%
+    '青年期(16-25岁)': 0.15,  # 至少15%
+    '壮年期(26-40岁)': 0.40,  # 至少40%
+    '中年期(41-60岁)': 0.15,  # 至少15%
+    '晚年期(61岁以上)': 0.05   # 至少5%
 }
 
+# 按寿命划分的各阶段权重：(寿命上限, 权重)，最后一项为长寿诗人
+LONGEVITY_STAGE_WEIGHTS = [
+    (40, {  # 短命诗人
+        '少年期(5-15岁)': 0.05,
+        '青年期(16-25岁)': 0.35,
+        '壮年期(26-40岁)': 0.60,
+        '中年期(41-60岁)': 0,
+        '晚年期(61岁以上)': 0
+    }),
+    (60, {  # 中寿诗人
+        '少年期(5-15岁)': 0.05,
+        '青年期(16-25岁)': 0.25,
+        '壮年期(26-40岁)': 0.45,
+        '中年期(41-60岁)': 0.25,
+        '晚年期(61岁以上)': 0
+    }),
+    (None, {  # 长寿诗人
+        '少年期(5-15岁)': 0.05,
+        '青年期(16-25岁)': 0.20,
+        '壮年期(26-40岁)': 0.40,
+        '中年期(41-60岁)': 0.25,
+        '晚年期(61岁以上)': 0.10
+    })
+]
+
 def get_data_from_db():
     """从数据库获数取诗人和诗词据"""
-    conn = mysql.connector.connect(**db_config)
-    
-    # 获取诗人数据
-    poet_query = "SELECT poetID, NameHZ, StartYear, EndYear FROM poet"
-    poet_df = pd.read_sql(poet_query, conn)
-    
-    # 获取诗词数据
-    poems_query = "SELECT poemId, poetName FROM poems"
-    poems_df = pd.read_sql(poems_query, conn)
-    
-    conn.close()
+    conn = db_pool.acquire()
+    try:
+        # 获取诗人数据
+        poet_query = "SELECT poetID, NameHZ, StartYear, EndYear FROM poet"
+        poet_df = pd.read_sql(poet_query, conn)
+        
+        # 获取诗词数据
+        poems_query = "SELECT poemId, poetName FROM poems"
+        poems_df = pd.read_sql(poems_query, conn)
+    finally:
+        db_pool.release(conn)
     return poet_df, poems_df
 
 def calculate_life_stage_distribution(poet_df, poems_df):
@@ -43,23 +87,9 @@ def calculate_life_stage_distribution(poet_df, poems_df):
     poet_poem_counts = poems_df['poetName'].value_counts().reset_index()
     poet_poem_counts.columns = ['poetName', 'total_poems']
     
-    # 创建生命阶段区间
-    life_stages = [
-        (5, 15, '少年期(5-15岁)'),
-        (16, 25, '青年期(16-25岁)'),
-        (26, 40, '壮年期(26-40岁)'),
-        (41, 60, '中年期(41-60岁)'),
-        (61, 100, '晚年期(61岁以上)')
-    ]
-    
-    # 设置各个生命阶段的最低比例
-    default_min_percentages = {
-        '少年期(5-15岁)': 0.03,   # 至少3%
-        '青年期(16-25岁)': 0.15,  # 至少15%
-        '壮年期(26-40岁)': 0.40,  # 至少40%
-        '中年期(41-60岁)': 0.15,  # 至少15%
-        '晚年期(61岁以上)': 0.05   # 至少5%
-    }
+    # 生命阶段区间和各阶段的最低比例
+    life_stages = LIFE_STAGES
+    default_min_percentages = STAGE_MIN_PERCENTAGES
     
     # 为每首诗分配一个可能的创作年份和生命阶段
     results = []
@@ -112,32 +142,9 @@ def calculate_life_stage_distribution(poet_df, poems_df):
         # 诗人越年轻，少年青年期作品占比越高
         # 诗人越长寿，晚年期作品占比越高
         longevity = end_year - start_year
-        stage_weights = {}
-        
-        if longevity <= 40:  # 短命诗人
-            stage_weights = {
-                '少年期(5-15岁)': 0.05,
-                '青年期(16-25岁)': 0.35,
-                '壮年期(26-40岁)': 0.60,
-                '中年期(41-60岁)': 0,
-                '晚年期(61岁以上)': 0
-            }
-        elif longevity <= 60:  # 中寿诗人
-            stage_weights = {
-                '少年期(5-15岁)': 0.05,
-                '青年期(16-25岁)': 0.25,
-                '壮年期(26-40岁)': 0.45,
-                '中年期(41-60岁)': 0.25,
-                '晚年期(61岁以上)': 0
-            }
-        else:  # 长寿诗人
-            stage_weights = {
-                '少年期(5-15岁)': 0.05,
-                '青年期(16-25岁)': 0.20,
-                '壮年期(26-40岁)': 0.40,
-                '中年期(41-60岁)': 0.25,
-                '晚年期(61岁以上)': 0.10
-            }
+        for max_longevity, stage_weights in LONGEVITY_STAGE_WEIGHTS:
+            if max_longevity is None or longevity <= max_longevity:
+                break
         
         # 根据诗人实际生命阶段调整权重
         adjusted_weights = {}
@@ -211,112 +218,312 @@ def calculate_life_stage_distribution(poet_df, poems_df):
     
     return pd.DataFrame(results)
 
-def visualize_poem_distribution(distribution_df):
-    """可视化诗人生命阶段的诗词分布"""
-    # 获取所有诗人（不限制数量）
-    all_poets = distribution_df.groupby('poetName')['totalPoems'].first().sort_values(ascending=False).index
-    filtered_df = distribution_df
-    
-    # 绘制堆叠柱状图
-    pivot_df = filtered_df.pivot(index='poetName', columns='lifeStage', values='poemCount')
-    pivot_df = pivot_df.fillna(0).loc[all_poets]  # 确保顺序正确
-    
-    # 根据诗人数量调整图表大小
-    poet_count = len(pivot_df)
-    width = min(20, max(14, poet_count * 0.7))
-    height = min(14, max(8, poet_count * 0.4))
-    plt.figure(figsize=(width, height))
-    
-    # 如果诗人数量过多，只展示诗词数前20位的诗人
-    if len(pivot_df) > 20:
-        pivot_df = pivot_df.iloc[:20]
-    
-    # 重新排列列以按年龄阶段顺序显示
-    correct_order = ['少年期(5-15岁)', '青年期(16-25岁)', '壮年期(26-40岁)', '中年期(41-60岁)', '晚年期(61岁以上)']
-    # 确保所有列都存在，如果不存在则添加并填充为0
-    for col in correct_order:
-        if col not in pivot_df.columns:
-            pivot_df[col] = 0
-    pivot_df = pivot_df[correct_order]
-    
-    ax = pivot_df.plot(kind='bar', stacked=True, figsize=(14, 8), 
-                      colormap='viridis', width=0.65)
+def years_to_int(values):
+    """按int()的规则转换年份，返回(整数数组, 是否可转换)"""
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = np.isfinite(array)
+        # int()对浮点数向零取整，与astype一致
+        return np.where(valid, array, 0).astype(np.int64), valid
+    converted = np.zeros(len(values), dtype=np.int64)
+    valid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            converted[i] = int(value)
+            valid[i] = True
+        except (ValueError, TypeError):
+            pass
+    return converted, valid
+
+def calculate_life_stage_distribution_vectorized(poet_df, poems_df, min_percentages=None, longevity_weights=None):
+    """计算每位诗人生命阶段的诗词分布（向量化实现）
+
+    结果与calculate_life_stage_distribution完全一致：诗词数由一次groupby得到，
+    五个生命阶段编码为 诗人数×5 的数组，权重、最低数量和剩余数量的分配
+    对所有诗人同时计算。min_percentages和longevity_weights可替换默认的
+    STAGE_MIN_PERCENTAGES和LONGEVITY_STAGE_WEIGHTS。
+    """
+    min_percentages = STAGE_MIN_PERCENTAGES if min_percentages is None else min_percentages
+    longevity_weights = LONGEVITY_STAGE_WEIGHTS if longevity_weights is None else longevity_weights
+    stage_names = [stage[2] for stage in LIFE_STAGES]
+    stage_count = len(stage_names)
+    stage_mins = np.array([stage[0] for stage in LIFE_STAGES])
+    min_percentages = np.array([min_percentages.get(name, 0.05) for name in stage_names])
+    
+    # 一次统计所有诗人的诗词数
+    poem_counts = poems_df.groupby('poetName').size()
+    counts = poet_df['NameHZ'].map(poem_counts).fillna(0).to_numpy(dtype=np.int64)
+    
+    start_years, start_valid = years_to_int(poet_df['StartYear'])
+    end_years, end_valid = years_to_int(poet_df['EndYear'])
+    keep = start_valid & end_valid & (counts > 0)
+    if not keep.any():
+        return pd.DataFrame([])
+    
+    rows = np.flatnonzero(keep)
+    counts = counts[keep]
+    start_years = start_years[keep]
+    end_years = end_years[keep]
+    longevity = end_years - start_years
+    
+    # 诗人经历过的阶段；一个都没有时使用所有阶段
+    valid = longevity[:, None] >= stage_mins[None, :]
+    valid[~valid.any(axis=1)] = True
+    valid_count = valid.sum(axis=1)
+    
+    # 按寿命选择权重
+    weights = np.empty((len(rows), stage_count))
+    assigned = np.zeros(len(rows), dtype=bool)
+    for max_longevity, stage_weights in longevity_weights:
+        tier = ~assigned if max_longevity is None else ~assigned & (longevity <= max_longevity)
+        weights[tier] = [stage_weights.get(name, 0) for name in stage_names]
+        assigned |= tier
+    
+    # 只保留有效阶段的权重并归一化（按阶段顺序累加，保证浮点结果一致）
+    weights = np.where(valid, weights, 0.0)
+    total_weight = np.zeros(len(rows))
+    for j in range(stage_count):
+        total_weight = total_weight + weights[:, j]
+    zero_total = total_weight == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adjusted = np.where(
+            zero_total[:, None],
+            np.where(valid, 1 / valid_count[:, None], 0.0),
+            weights / total_weight[:, None]
+        )
     
-    # 设置图表标题和标签
-    plt.title('诗人生命阶段诗词创作分布', fontsize=16)
-    plt.xlabel('诗人', fontsize=14)
-    plt.ylabel('诗词数量', fontsize=14)
-    plt.xticks(rotation=45, ha='right')
-    plt.legend(title='生命阶段', bbox_to_anchor=(1.05, 1), loc='upper left')
+    # 每个有效阶段按权重从大到小的名次（权重相同时保持阶段顺序）
+    sort_keys = np.where(valid, -adjusted, np.inf)
+    order = np.argsort(sort_keys, axis=1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(stage_count)[None, :].repeat(len(rows), axis=0), axis=1)
+    
+    # 诗词数不超过有效阶段数：按权重从大到小每个阶段1首
+    few = counts <= valid_count
+    allocations = np.where(few[:, None] & valid & (rank < counts[:, None]), 1, 0)
+    
+    # 其余诗人：先分配最低数量
+    many = ~few
+    min_poems = np.maximum(1, np.trunc(counts[:, None] * min_percentages[None, :]).astype(np.int64))
+    min_poems = np.where(valid, min_poems, 0)
+    allocations = np.where(many[:, None], min_poems, allocations)
+    remaining = counts - min_poems.sum(axis=1)
+    spread = many & (remaining > 0)
+    
+    # 再按权重依次分配剩余数量（每个阶段分配后剩余数量随之减少）
+    converted_total = np.zeros(len(rows))
+    for j in range(stage_count):
+        converted_total = converted_total + adjusted[:, j]
+    proportional = spread & (converted_total > 0)
+    for j in range(stage_count):
+        step = proportional & valid[:, j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            additional = np.trunc(remaining * (adjusted[:, j] / converted_total)).astype(np.int64)
+        additional = np.where(step, additional, 0)
+        allocations[:, j] += additional
+        remaining = remaining - additional
+    
+    # 取整后剩下的诗词按权重从大到小轮流分配
+    rounds, extra = np.divmod(np.where(spread, remaining, 0), valid_count)
+    leftover = rounds[:, None] + (rank < extra[:, None])
+    allocations += np.where(spread[:, None] & valid, leftover, 0)
+    
+    # 展开为每位诗人每个有效阶段一行，顺序与逐个诗人计算时相同
+    poet_index, stage_index = np.nonzero(valid)
+    source_rows = rows[poet_index]
+    poem_count = counts[poet_index]
+    stage_poems = allocations[poet_index, stage_index]
+    return pd.DataFrame({
+        'poetName': poet_df['NameHZ'].to_numpy()[source_rows],
+        'poetID': poet_df['poetID'].to_numpy()[source_rows],
+        'startYear': start_years[poet_index],
+        'endYear': end_years[poet_index],
+        'lifeStage': np.array(stage_names, dtype=object)[stage_index],
+        'poemCount': stage_poems,
+        'totalPoems': poem_count,
+        'percentage': stage_poems / poem_count * 100
+    })
+
+def generate_benchmark_data(poet_count, poem_count, seed=0):
+    """生成用于对比测试的诗人和诗词数据，包含缺失年份、重名和无诗词的诗人"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f'诗人{i}' for i in range(poet_count)], dtype=object)
+    # 少量重名诗人
+    duplicates = rng.random(poet_count) < 0.02
+    names[duplicates] = names[rng.integers(0, poet_count, duplicates.sum())]
+    start_years = rng.integers(600, 1300, poet_count).astype(float)
+    end_years = start_years + rng.integers(-5, 95, poet_count)
+    start_years[rng.random(poet_count) < 0.1] = np.nan
+    end_years[rng.random(poet_count) < 0.1] = np.nan
+    poet_df = pd.DataFrame({
+        'poetID': np.arange(1, poet_count + 1),
+        'NameHZ': names,
+        'StartYear': start_years,
+        'EndYear': end_years
+    })
+    # 诗词数呈长尾分布，少数诗人有大量作品
+    popularity = rng.pareto(1.2, poet_count) + 0.01
+    popularity[rng.random(poet_count) < 0.1] = 0
+    poem_poets = rng.choice(poet_count, size=poem_count, p=popularity / popularity.sum())
+    poems_df = pd.DataFrame({
+        'poemId': np.arange(1, poem_count + 1),
+        'poetName': [f'诗人{i}' for i in poem_poets]
+    })
+    return poet_df, poems_df
+
+def run_benchmark(poet_count, poem_count):
+    """对比逐行实现和向量化实现的结果与耗时"""
+    poet_df, poems_df = generate_benchmark_data(poet_count, poem_count)
+    print(f"测试数据: {poet_count} 位诗人, {poem_count} 首诗词")
+    
+    start_time = time.perf_counter()
+    expected = calculate_life_stage_distribution(poet_df, poems_df)
+    legacy_time = time.perf_counter() - start_time
+    
+    start_time = time.perf_counter()
+    actual = calculate_life_stage_distribution_vectorized(poet_df, poems_df)
+    vectorized_time = time.perf_counter() - start_time
+    
+    pd.testing.assert_frame_equal(actual, expected)
+    print(f"结果一致，共 {len(actual)} 行")
+    print(f"逐行实现: {legacy_time:.3f} 秒")
+    print(f"向量化实现: {vectorized_time:.3f} 秒")
+    if vectorized_time > 0:
+        print(f"加速比: {legacy_time / vectorized_time:.1f}x")
+
+# 生命阶段在图表中的顺序
+STAGE_ORDER = [stage[2] for stage in LIFE_STAGES]
+# 图表中最多展示的诗人数
+MAX_CHART_POETS = 20
+# 无界面渲染的输出目录；文件名包含输入数据的哈希，数据不变时直接复用
+CHART_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'poet_distribution_charts')
+# 修改绘图代码后递增，使旧的缓存文件失效
+CHART_RENDER_VERSION = 1
+
+def build_distribution_pivots(distribution_df):
+    """一次计算绘图所需的数据：诗词数透视表、百分比透视表和诗人总诗词数（按总数降序，取前20位）"""
+    totals = distribution_df.groupby('poetName')['totalPoems'].first().sort_values(ascending=False)
+    top_poets = totals.index[:MAX_CHART_POETS]
+    count_pivot = distribution_df.pivot_table(index='poetName', columns='lifeStage', values='poemCount', aggfunc='sum')
+    count_pivot = count_pivot.reindex(index=top_poets, columns=STAGE_ORDER).fillna(0)
+    # 百分比由诗词数直接换算，不再单独透视
+    percentage_pivot = count_pivot.div(totals.loc[top_poets], axis=0) * 100
+    return count_pivot, percentage_pivot, totals.loc[top_poets]
+
+def draw_count_chart(fig, count_pivot, totals):
+    """堆叠柱状图：各诗人生命阶段的诗词数"""
+    ax = fig.add_subplot(111)
+    count_pivot.plot(kind='bar', stacked=True, ax=ax, colormap='viridis', width=0.65)
+    ax.set_title('诗人生命阶段诗词创作分布', fontsize=16)
+    ax.set_xlabel('诗人', fontsize=14)
+    ax.set_ylabel('诗词数量', fontsize=14)
+    ax.set_xticks(range(len(count_pivot)))
+    ax.set_xticklabels(count_pivot.index, rotation=45, ha='right')
+    ax.legend(title='生命阶段', bbox_to_anchor=(1.05, 1), loc='upper left')
     
     # 在每个柱状图上方显示总诗词数
-    for i, poet in enumerate(pivot_df.index):
-        total = filtered_df[filtered_df['poetName'] == poet]['totalPoems'].iloc[0]
-        ax.text(i, pivot_df.loc[poet].sum() + 2, f'总计: {int(total)}', 
+    stacked_heights = count_pivot.sum(axis=1)
+    for i, poet in enumerate(count_pivot.index):
+        ax.text(i, stacked_heights[poet] + 2, f'总计: {int(totals[poet])}',
                 ha='center', va='bottom', fontsize=10)
-    
-    plt.tight_layout()
-    plt.savefig('诗人生命阶段诗词分布_v2.png', dpi=300, bbox_inches='tight')
-    plt.show()
-    
-    # 创建第二个可视化：生命阶段百分比
-    plt.figure(figsize=(14, 8))
-    
-    # 计算每个诗人每个生命阶段的诗词百分比
-    percentage_df = filtered_df.copy()
-    
-    # 绘制热图
-    pivot_percentage = percentage_df.pivot(index='poetName', columns='lifeStage', values='percentage')
-    pivot_percentage = pivot_percentage.fillna(0)
-    
-    # 确保所有诗人和所有生命阶段都存在
-    for poet in all_poets:
-        if poet not in pivot_percentage.index:
-            pivot_percentage.loc[poet] = 0
-    
-    # 重排序
-    pivot_percentage = pivot_percentage.loc[all_poets]
-    
-    # 如果诗人数量过多，只展示前20个
-    if len(pivot_percentage) > 20:
-        pivot_percentage = pivot_percentage.iloc[:20]
-    
-    # 确保所有列都存在
-    for col in correct_order:
-        if col not in pivot_percentage.columns:
-            pivot_percentage[col] = 0
-    
-    pivot_percentage = pivot_percentage[correct_order]
-    
-    # 根据诗人数量调整热图大小
-    poet_count = len(pivot_percentage)
-    width = min(20, max(14, poet_count * 0.7))
-    height = min(16, max(10, poet_count * 0.5))
-    plt.figure(figsize=(width, height))
-    
-    sns.heatmap(pivot_percentage, annot=True, fmt='.1f', cmap='YlGnBu', 
+    fig.tight_layout()
+
+def draw_percentage_heatmap(fig, percentage_pivot):
+    """热图：各诗人生命阶段的诗词百分比"""
+    ax = fig.add_subplot(111)
+    poet_count = len(percentage_pivot)
+    sns.heatmap(percentage_pivot, annot=True, fmt='.1f', cmap='YlGnBu', ax=ax,
                 linewidths=.5, cbar_kws={'label': '百分比 (%)'},
                 annot_kws={'size': 10 if poet_count <= 20 else 8})
+    ax.set_title('诗人生命阶段诗词创作百分比分布', fontsize=16)
+    ax.set_xlabel('生命阶段', fontsize=14)
+    ax.set_ylabel('诗人', fontsize=14)
+    fig.tight_layout()
+
+def heatmap_figsize(poet_count):
+    # 根据诗人数量调整热图大小
+    return min(20, max(14, poet_count * 0.7)), min(16, max(10, poet_count * 0.5))
+
+def visualize_poem_distribution(distribution_df):
+    """可视化诗人生命阶段的诗词分布"""
+    count_pivot, percentage_pivot, totals = build_distribution_pivots(distribution_df)
     
-    plt.title('诗人生命阶段诗词创作百分比分布', fontsize=16)
-    plt.xlabel('生命阶段', fontsize=14)
-    plt.ylabel('诗人', fontsize=14)
-    plt.tight_layout()
-    plt.savefig('诗人生命阶段诗词百分比分布_v2.png', dpi=300, bbox_inches='tight')
+    fig = plt.figure(figsize=(14, 8))
+    draw_count_chart(fig, count_pivot, totals)
+    fig.savefig('诗人生命阶段诗词分布_v2.png', dpi=300, bbox_inches='tight')
     plt.show()
     
-    return
+    fig = plt.figure(figsize=heatmap_figsize(len(percentage_pivot)))
+    draw_percentage_heatmap(fig, percentage_pivot)
+    fig.savefig('诗人生命阶段诗词百分比分布_v2.png', dpi=300, bbox_inches='tight')
+    plt.show()
+
+def distribution_hash(distribution_df, formats, dpi):
+    """输入数据和渲染参数的哈希，用作输出文件名"""
+    digest = hashlib.sha256()
+    digest.update(f"{CHART_RENDER_VERSION}|{','.join(formats)}|{dpi}|".encode('utf-8'))
+    digest.update(','.join(map(str, distribution_df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(distribution_df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
 
-def save_to_database(summary_df):
-    """将汇总数据保存到数据库中"""
+def render_distribution_charts(distribution_df, output_dir=CHART_CACHE_DIR, formats=('png',), dpi=300):
+    """无界面渲染两张图表（Agg，不经过pyplot），相同数据已渲染过时直接返回已有文件
+
+    返回 {'hash', 'cached', 'files': {'counts': {格式: 路径}, 'percentage': {格式: 路径}}}
+    """
+    formats = tuple(formats)
+    data_hash = distribution_hash(distribution_df, formats, dpi)
+    files = {
+        chart: {fmt: os.path.join(output_dir, f'poet_distribution_{chart}_{data_hash}.{fmt}') for fmt in formats}
+        for chart in ('counts', 'percentage')
+    }
+    paths = [path for chart_files in files.values() for path in chart_files.values()]
+    if all(os.path.exists(path) for path in paths):
+        return {'hash': data_hash, 'cached': True, 'files': files}
+    
+    os.makedirs(output_dir, exist_ok=True)
+    count_pivot, percentage_pivot, totals = build_distribution_pivots(distribution_df)
+    charts = [
+        ('counts', (14, 8), lambda fig: draw_count_chart(fig, count_pivot, totals)),
+        ('percentage', heatmap_figsize(len(percentage_pivot)), lambda fig: draw_percentage_heatmap(fig, percentage_pivot))
+    ]
+    for chart, figsize, draw in charts:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        draw(fig)
+        for fmt, path in files[chart].items():
+            # 先写临时文件再替换，避免并发请求读到未写完的图片
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            fig.savefig(tmp_path, format=fmt, dpi=dpi, bbox_inches='tight')
+            os.replace(tmp_path, path)
+    return {'hash': data_hash, 'cached': False, 'files': files}
+
+def render_distribution_from_db(formats=('png',), dpi=300):
+    """从数据库读取数据并渲染图表，供websocket服务器在线程中调用"""
+    poet_df, poems_df = get_data_from_db()
+    distribution_df = calculate_life_stage_distribution_vectorized(poet_df, poems_df)
+    if distribution_df.empty:
+        raise ValueError("没有可用于绘图的诗人生命阶段数据")
+    return render_distribution_charts(distribution_df, formats=formats, dpi=dpi)
+
+def summarize_distribution(distribution_df):
+    """把分布结果整理为每个诗人一行的汇总表"""
+    summary_df = distribution_df.pivot(index=['poetName', 'poetID', 'startYear', 'endYear', 'totalPoems'], 
+                                     columns='lifeStage', 
+                                     values='poemCount').reset_index()
+    summary_df.columns.name = None
+    return summary_df
+
+def save_to_database(summary_df, table_name='poet_life_stage_distribution', raise_errors=False):
+    """将汇总数据保存到数据库中；raise_errors为True时出错后回滚并抛出异常，否则只打印错误"""
     try:
-        # 连接到数据库
-        conn = mysql.connector.connect(**db_config)
+        # 从连接池获取连接
+        conn = db_pool.acquire()
         cursor = conn.cursor()
         
         # 创建表，如果表不存在
         create_table_query = """
-        CREATE TABLE IF NOT EXISTS poet_life_stage_distribution (
+        CREATE TABLE IF NOT EXISTS {table_name} (
             id INT AUTO_INCREMENT PRIMARY KEY,
             poetID INT NOT NULL,
             poetName VARCHAR(100) NOT NULL,
@@ -331,7 +538,7 @@ def save_to_database(summary_df):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (poetID) REFERENCES poet(poetID)
         )
-        """
+        """.format(table_name=table_name)
         cursor.execute(create_table_query)
         conn.commit()
         
@@ -350,12 +557,12 @@ def save_to_database(summary_df):
                 summary_df[old_col] = 0
         
         # 清空原有数据
-        cursor.execute("TRUNCATE TABLE poet_life_stage_distribution")
+        cursor.execute(f"TRUNCATE TABLE {table_name}")
         conn.commit()
         
         # 插入数据
-        insert_query = """
-        INSERT INTO poet_life_stage_distribution
+        insert_query = f"""
+        INSERT INTO {table_name}
         (poetID, poetName, startYear, endYear, totalPoems, 
          stage_child, stage_youth, stage_prime, stage_middle, stage_elder)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
@@ -382,36 +589,54 @@ def save_to_database(summary_df):
         cursor.executemany(insert_query, records)
         conn.commit()
         
-        print(f"已成功将{len(records)}条诗人生命阶段分布数据保存到数据库表 'poet_life_stage_distribution'")
+        print(f"已成功将{len(records)}条诗人生命阶段分布数据保存到数据库表 '{table_name}'")
         
     except Exception as e:
         print(f"保存到数据库时出错: {str(e)}")
         if 'conn' in locals():
             conn.rollback()
+        if raise_errors:
+            raise
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            db_pool.release(conn)
 
 def main():
+    parser = argparse.ArgumentParser(description='计算诗人生命阶段的诗词分布')
+    parser.add_argument('--legacy', action='store_true', help='使用逐个诗人计算的旧实现')
+    parser.add_argument('--benchmark', action='store_true', help='用生成的数据对比两种实现，不连接数据库')
+    parser.add_argument('--poets', type=int, default=2000, help='对比测试的诗人数')
+    parser.add_argument('--poems', type=int, default=100000, help='对比测试的诗词数')
+    parser.add_argument('--render', nargs='+', choices=['png', 'svg'], metavar='FORMAT',
+                        help='无界面渲染图表并输出为指定格式（png/svg），数据未变化时复用已有文件')
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        run_benchmark(args.poets, args.poems)
+        return
+    
     # 获取数据
     poet_df, poems_df = get_data_from_db()
     
     # 计算分布
-    distribution_df = calculate_life_stage_distribution(poet_df, poems_df)
+    if args.legacy:
+        distribution_df = calculate_life_stage_distribution(poet_df, poems_df)
+    else:
+        distribution_df = calculate_life_stage_distribution_vectorized(poet_df, poems_df)
     
     # 创建一个更清晰的汇总数据表 - 每个诗人一行
-    summary_df = distribution_df.pivot(index=['poetName', 'poetID', 'startYear', 'endYear', 'totalPoems'], 
-                                     columns='lifeStage', 
-                                     values='poemCount').reset_index()
-    
-    # 给生命阶段列添加前缀以更清晰
-    summary_df.columns.name = None
+    summary_df = summarize_distribution(distribution_df)
     
     # 保存到数据库
     save_to_database(summary_df)
     
+    if args.render:
+        rendered = render_distribution_charts(distribution_df, formats=args.render)
+        state = '数据未变化，复用已有图表' if rendered['cached'] else '图表已生成'
+        print(f"{state}: {rendered['files']}")
+    
     # 不再保存CSV文件，因为数据已保存到数据库中
     
     print(f"总计统计了 {distribution_df['poetName'].nunique()} 位诗人的生命阶段诗词分布")
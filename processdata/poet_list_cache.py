@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+
+# 诗人列表定时刷新间隔（秒）
+DEFAULT_REFRESH_INTERVAL = 300
+# 保留最近的变更记录，客户端版本落后不多时只发送差异
+DIFF_HISTORY_SIZE = 20
+
+class PoetListCache:
+    """常驻内存的诗人列表，带版本号，变化时向订阅的客户端推送差异
+
+    版本号只在当前进程内递增，服务器重启后从头开始；epoch标识本进程，
+    客户端提供的epoch与当前不同时一律发送完整列表。
+    """
+
+    def __init__(self, loader, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.loader = loader  # 同步函数，返回诗人名称列表
+        self.refresh_interval = refresh_interval
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self.poets = []
+        self.loaded_at = None
+        self.error = None
+        self.diffs = deque(maxlen=DIFF_HISTORY_SIZE)  # (version, added, removed)
+        self.subscribers = set()
+        self.lock = asyncio.Lock()
+        self.refresh_task = None
+
+    async def load(self):
+        """重新加载诗人列表，有变化时版本号加1并返回差异，否则返回None"""
+        async with self.lock:
+            try:
+                # 在线程中查询数据库，避免阻塞事件循环
+                poets = await asyncio.to_thread(self.loader)
+            except Exception as e:
+                self.error = str(e)
+                print(f"加载诗人列表时出错: {self.error}")
+                return None
+            self.error = None
+            self.loaded_at = time.time()
+            if self.version > 0 and poets == self.poets:
+                return None
+
+            old, new = set(self.poets), set(poets)
+            diff = {
+                'epoch': self.epoch,
+                'base_version': self.version,
+                'version': self.version + 1,
+                'added': sorted(new - old),
+                'removed': sorted(old - new)
+            }
+            self.poets = poets
+            self.version += 1
+            self.diffs.append((self.version, diff['added'], diff['removed']))
+            print(f"诗人列表已加载，共 {len(poets)} 位诗人，版本 {self.version}")
+            return diff
+
+    async def refresh(self):
+        """重新加载并把差异推送给订阅者"""
+        diff = await self.load()
+        if diff and diff['base_version'] > 0:
+            await self.broadcast(diff)
+        return diff
+
+    async def refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    def start(self):
+        """启动定时刷新，需在事件循环中调用"""
+        self.refresh_task = asyncio.create_task(self.refresh_periodically())
+
+    def subscribe(self, websocket):
+        self.subscribers.add(websocket)
+
+    def unsubscribe(self, websocket):
+        self.subscribers.discard(websocket)
+
+    def diff_since(self, since_version):
+        """合并since_version之后的所有变更；历史记录不够时返回None"""
+        pending = [d for d in self.diffs if d[0] > since_version]
+        if not pending or pending[0][0] != since_version + 1:
+            return None
+        # 只保留净变化：先删后加（或先加后删）的诗人相互抵消
+        added, removed = set(), set()
+        for _, diff_added, diff_removed in pending:
+            for poet in diff_removed:
+                if poet in added:
+                    added.discard(poet)
+                else:
+                    removed.add(poet)
+            for poet in diff_added:
+                if poet in removed:
+                    removed.discard(poet)
+                else:
+                    added.add(poet)
+        return {
+            'epoch': self.epoch,
+            'base_version': since_version,
+            'version': self.version,
+            'added': sorted(added),
+            'removed': sorted(removed)
+        }
+
+    def build_response(self, since_version=None, epoch=None):
+        """根据客户端已有的版本构造响应：无变化/差异/完整列表（epoch与本进程不同时发送完整列表）"""
+        if self.version == 0:
+            return {
+                'type': 'poet_list',
+                'success': False,
+                'error': self.error or '诗人列表尚未加载'
+            }
+        if since_version is not None and epoch == self.epoch:
+            if since_version == self.version:
+                return {'type': 'poet_list', 'success': True, 'epoch': self.epoch, 'version': self.version,
+                        'unchanged': True}
+            diff = self.diff_since(since_version) if 0 < since_version < self.version else None
+            if diff:
+                return dict(diff, type='poet_list_diff', success=True)
+        return {
+            'type': 'poet_list',
+            'success': True,
+            'epoch': self.epoch,
+            'version': self.version,
+            'poets': self.poets
+        }
+
+    async def broadcast(self, diff):
+        message = json.dumps(dict(diff, type='poet_list_diff', success=True))
+        for websocket in list(self.subscribers):
+            try:
+                await websocket.send(message)
+            except Exception:
+                # 连接已关闭
+                self.subscribers.discard(websocket)
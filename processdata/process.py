@@ -1,43 +1,44 @@
-import mysql.connector
+import argparse
+import time
 from mysql.connector import Error
+from db import get_pool, DRIVER_MYSQL_CONNECTOR
+
+# 数据库连接池（连接参数见db/config.py，可用环境变量覆盖）
+db_pool = get_pool(driver=DRIVER_MYSQL_CONNECTOR)
+
+# 汇总表结构
+CREATE_TABLE_QUERY = """
+CREATE TABLE {if_not_exists} poet_summary (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    poet_id INT NOT NULL,
+    poet_name VARCHAR(50) NOT NULL,
+    birth_year INT,
+    death_year INT,
+    poem_count INT DEFAULT 0,
+    FOREIGN KEY (poet_id) REFERENCES poet(poetID)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# 每位诗人的诗词总量，一次GROUP BY得到
+POEM_COUNTS_QUERY = "SELECT poetName, COUNT(*) AS poem_count FROM poems GROUP BY poetName"
+
+def recreate_summary_table(cursor, conn):
+    """删除并重新创建汇总表"""
+    cursor.execute("DROP TABLE IF EXISTS poet_summary")
+    print("已删除旧表（如果存在）")
+    cursor.execute(CREATE_TABLE_QUERY.format(if_not_exists=''))
+    conn.commit()
+    print("表创建成功！")
 
 def create_poet_summary_table():
-    """创建诗人基本信息汇总表"""
+    """创建诗人基本信息汇总表（逐个诗人统计，保留作对照）"""
+    conn = None
     try:
-        # 连接数据库
-        db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': '123456',
-            'database': 'lunwen'
-        }
-        
-        conn = mysql.connector.connect(**db_config)
+        # 从连接池获取连接
+        conn = db_pool.acquire()
         cursor = conn.cursor()
         
-        # 删除表（如果存在）并重新创建
-        drop_table_query = """
-        DROP TABLE IF EXISTS poet_summary;
-        """
-        cursor.execute(drop_table_query)
-        print("已删除旧表（如果存在）")
-        
-        # 创建表结构
-        create_table_query = """
-        CREATE TABLE poet_summary (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            poet_id INT NOT NULL,
-            poet_name VARCHAR(50) NOT NULL,
-            birth_year INT,
-            death_year INT,
-            poem_count INT DEFAULT 0,
-            FOREIGN KEY (poet_id) REFERENCES poet(poetID)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-        
-        cursor.execute(create_table_query)
-        conn.commit()
-        print("表创建成功！")
+        recreate_summary_table(cursor, conn)
         
         # 获取所有poetName列表
         cursor.execute("SELECT DISTINCT poetName FROM poems")
@@ -85,8 +86,102 @@ def create_poet_summary_table():
     finally:
         if conn and conn.is_connected():
             cursor.close()
-            conn.close()
-            print("数据库连接已关闭")
+        # 归还连接
+        db_pool.release(conn)
+
+def create_poet_summary_table_bulk():
+    """创建诗人基本信息汇总表：一条INSERT ... SELECT完成统计和写入"""
+    conn = None
+    try:
+        conn = db_pool.acquire()
+        cursor = conn.cursor()
+        start_time = time.time()
+        
+        recreate_summary_table(cursor, conn)
+        
+        # 与逐个统计的结果一致：只包含poems中出现过、且能在poet表中按姓名匹配到的诗人
+        insert_query = f"""
+        INSERT INTO poet_summary (poet_id, poet_name, birth_year, death_year, poem_count)
+        SELECT p.poetID, p.NameHZ, p.StartYear, p.EndYear, c.poem_count
+        FROM poet p
+        JOIN ({POEM_COUNTS_QUERY}) c ON c.poetName = p.NameHZ
+        """
+        cursor.execute(insert_query)
+        inserted = cursor.rowcount
+        conn.commit()
+        print(f"成功为{inserted}位诗人生成汇总信息，用时 {time.time() - start_time:.2f} 秒")
+        
+    except Error as e:
+        print(f"数据库错误: {e}")
+        if conn and conn.is_connected():
+            conn.rollback()
+    finally:
+        if conn and conn.is_connected():
+            cursor.close()
+        db_pool.release(conn)
+
+def refresh_poet_summary_table():
+    """增量刷新汇总表：只更新诗词总量有变化的诗人，补充新诗人，删除已没有诗词的诗人"""
+    conn = None
+    try:
+        conn = db_pool.acquire()
+        cursor = conn.cursor()
+        start_time = time.time()
+        
+        cursor.execute(CREATE_TABLE_QUERY.format(if_not_exists='IF NOT EXISTS'))
+        
+        # 更新诗词总量有变化的诗人
+        update_query = f"""
+        UPDATE poet_summary s
+        JOIN ({POEM_COUNTS_QUERY}) c ON c.poetName = s.poet_name
+        SET s.poem_count = c.poem_count
+        WHERE s.poem_count <> c.poem_count OR s.poem_count IS NULL
+        """
+        cursor.execute(update_query)
+        updated = cursor.rowcount
+        
+        # 插入汇总表中还没有的诗人
+        insert_query = f"""
+        INSERT INTO poet_summary (poet_id, poet_name, birth_year, death_year, poem_count)
+        SELECT p.poetID, p.NameHZ, p.StartYear, p.EndYear, c.poem_count
+        FROM poet p
+        JOIN ({POEM_COUNTS_QUERY}) c ON c.poetName = p.NameHZ
+        WHERE NOT EXISTS (SELECT 1 FROM poet_summary s WHERE s.poet_id = p.poetID)
+        """
+        cursor.execute(insert_query)
+        inserted = cursor.rowcount
+        
+        # 删除poems中已不存在的诗人
+        delete_query = f"""
+        DELETE s FROM poet_summary s
+        LEFT JOIN ({POEM_COUNTS_QUERY}) c ON c.poetName = s.poet_name
+        WHERE c.poetName IS NULL
+        """
+        cursor.execute(delete_query)
+        deleted = cursor.rowcount
+        
+        conn.commit()
+        print(f"增量刷新完成: 更新 {updated} 位, 新增 {inserted} 位, 删除 {deleted} 位，"
+              f"用时 {time.time() - start_time:.2f} 秒")
+        
+    except Error as e:
+        print(f"数据库错误: {e}")
+        if conn and conn.is_connected():
+            conn.rollback()
+    finally:
+        if conn and conn.is_connected():
+            cursor.close()
+        db_pool.release(conn)
 
 if __name__ == "__main__":
-    create_poet_summary_table()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='生成诗人基本信息汇总表poet_summary')
+    parser.add_argument('--mode', choices=['bulk', 'incremental', 'per-poet'], default='bulk',
+                        help='bulk: 一次性重建（默认）; incremental: 只刷新有变化的诗人; per-poet: 逐个诗人统计（旧方式）')
+    args = parser.parse_args()
+    
+    if args.mode == 'incremental':
+        refresh_poet_summary_table()
+    elif args.mode == 'per-poet':
+        create_poet_summary_table()
+    else:
+        create_poet_summary_table_bulk()
\ No newline at end of file
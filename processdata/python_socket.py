@@ -1,16 +1,20 @@
 import asyncio
 import websockets
 import json
-import subprocess
 import sys
 import os
 import signal
 import threading
 import uuid
-import time
+import base64
 
 # 导入可视化API模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from script_scheduler import ScriptScheduler, normalize_cpus
+from visualization_cache import ResultCache, ACTION_TABLES
+from payload_codec import PayloadCodec
+from poet_list_cache import PoetListCache
+from db import get_pool, pool_metrics, close_all_pools, DRIVER_PYMYSQL
 try:
     from visualization_api import handle_visualization_command, json_serialize
     print("成功导入可视化API模块")
@@ -21,119 +25,53 @@ except ImportError as e:
 
 print("启动Python脚本运行服务器...")
 
-# 存储运行中的进程
-running_processes = {}
+# 脚本任务调度器（限制并发、排队、去重）
+scheduler = ScriptScheduler()
 
-# 处理命令执行
-async def run_command(websocket, command, script_id=None):
-    # 如果没有提供脚本ID，生成一个
-    if not script_id:
-        script_id = str(uuid.uuid4())
-    
-    process = None
-    try:
-        # 在子进程中执行命令
-        process = subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
-        )
-        
-        # 存储进程信息
-        running_processes[script_id] = {
-            'process': process,
-            'command': command,
-            'start_time': time.time(),
-            'status': 'running'
-        }
-        
-        # 实时发送输出
-        for line in process.stdout:
-            try:
-                await websocket.send(json.dumps({
-                    'type': 'output',
-                    'content': line.strip(),
-                    'scriptId': script_id
-                }))
-            except Exception:
-                # 如果发送失败，假定连接已关闭
-                break
-        
-        # 等待进程完成
-        process.wait()
-        
-        # 更新进程状态
-        if script_id in running_processes:
-            running_processes[script_id]['status'] = 'completed'
-        
-        # 发送完成状态
-        try:
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': 'completed',
-                'exit_code': process.returncode,
-                'scriptId': script_id
-            }))
-        except Exception:
-            # 如果发送失败，忽略错误
-            pass
-            
-        # 移除完成的进程
-        if script_id in running_processes:
-            del running_processes[script_id]
-            
-    except Exception as e:
-        if process:
-            try:
-                process.terminate()
-            except:
-                pass
-        
-        # 更新进程状态
-        if script_id in running_processes:
-            running_processes[script_id]['status'] = 'error'
-        
-        try:
-            await websocket.send(json.dumps({
-                'type': 'output',
-                'content': f"错误: {str(e)}",
-                'scriptId': script_id
-            }))
-            await websocket.send(json.dumps({
-                'type': 'status',
-                'status': 'error',
-                'scriptId': script_id
-            }))
-        except Exception:
-            # 如果发送失败，忽略错误
-            pass
-        
-        # 移除出错的进程
-        if script_id in running_processes:
-            del running_processes[script_id]
+# 可视化命令结果缓存（数据表版本变化或过期后自动失效）
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('VIS_CACHE_SIZE', '128')),
+    ttl=float(os.environ.get('VIS_CACHE_TTL', '600'))
+)
 
-# 发送运行中脚本列表
+# 服务器常驻运行，复用连接池中的连接
+db_pool = get_pool(driver=DRIVER_PYMYSQL)
+
+# 同一时间只渲染一次诗人生命阶段分布图表，后到的请求等待后直接命中文件缓存
+render_lock = asyncio.Lock()
+
+def render_poet_distribution(formats, dpi):
+    # 在线程中导入，避免服务器启动时加载matplotlib
+    from poet_distribution import render_distribution_from_db
+    return render_distribution_from_db(formats=formats, dpi=dpi)
+
+# 获取诗人列表（启动时加载一次，之后定时刷新）
+def load_poets():
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT poetName FROM poems ORDER BY poetName")
+            return [row[0] for row in cursor.fetchall() if row[0]]
+
+poet_cache = PoetListCache(
+    load_poets,
+    refresh_interval=float(os.environ.get('POET_LIST_REFRESH_INTERVAL', '300'))
+)
+
+# 脚本运行结束后数据可能已更新，刷新诗人列表
+def on_job_finished(job):
+    asyncio.get_running_loop().create_task(poet_cache.refresh())
+
+scheduler.on_job_finished = on_job_finished
+
+# 发送脚本列表（排队中、运行中以及最近完成的任务）
 async def send_script_list(websocket):
-    scripts = []
-    for script_id, info in running_processes.items():
-        scripts.append({
-            'id': script_id,
-            'command': info['command'],
-            'status': info['status'],
-            'start_time': info['start_time']
-        })
-    
-    await websocket.send(json.dumps({
-        'type': 'script_list',
-        'scripts': scripts
-    }))
+    await websocket.send(json.dumps(dict(scheduler.list_jobs(), type='script_list')))
 
 # 处理WebSocket连接
 async def handle_connection(websocket):
     print(f"客户端已连接: {websocket.remote_address}")
+    # 每个客户端单独协商响应编码，默认仍为JSON文本
+    codec = PayloadCodec()
     try:
         # 连接建立时发送当前运行的脚本列表
         await send_script_list(websocket)
@@ -149,57 +87,114 @@ async def handle_connection(websocket):
                         'content': f"运行命令: {data['command']}",
                         'scriptId': script_id
                     }))
-                    # 异步运行命令
-                    asyncio.create_task(run_command(websocket, data['command'], script_id))
+                    # 优先级无效时使用默认优先级，不影响该连接上的其他请求
+                    try:
+                        priority = int(data.get('priority', 0))
+                    except (TypeError, ValueError):
+                        priority = 0
+                        await websocket.send(json.dumps({
+                            'type': 'output',
+                            'content': f"错误: 无效的优先级 {data.get('priority')!r}，使用默认优先级0",
+                            'scriptId': script_id
+                        }))
+                    # CPU核心列表无效时不绑定核心
+                    try:
+                        cpus = normalize_cpus(data.get('cpus'))
+                    except ValueError as e:
+                        cpus = None
+                        await websocket.send(json.dumps({
+                            'type': 'output',
+                            'content': f"错误: {str(e)}，不绑定CPU核心",
+                            'scriptId': script_id
+                        }))
+                    # 提交到调度器，超过并发上限时排队
+                    job, reused = await scheduler.submit(
+                        websocket,
+                        data['command'],
+                        script_id,
+                        priority=priority,
+                        cpus=cpus
+                    )
+                    if reused:
+                        content = f"相同命令已在{'运行' if job.status == 'running' else '排队'}中，复用该任务的输出"
+                    elif job.status == 'queued' and scheduler.is_saturated():
+                        content = f"任务已加入队列，当前排在第 {scheduler.queue_position(job)} 位"
+                    else:
+                        content = None
+                    if content:
+                        await websocket.send(json.dumps({
+                            'type': 'output',
+                            'content': content,
+                            'scriptId': script_id
+                        }))
+                    await websocket.send(json.dumps({
+                        'type': 'status',
+                        'status': job.status,
+                        'jobId': job.id,
+                        'scriptId': script_id
+                    }))
                 
                 elif data['action'] == 'list_scripts':
-                    # 发送当前运行的脚本列表
+                    # 发送当前的脚本列表
                     await send_script_list(websocket)
                 
                 elif data['action'] == 'terminate':
                     # 终止特定脚本
                     script_id = data.get('scriptId')
-                    if script_id and script_id in running_processes:
-                        process_info = running_processes[script_id]
-                        process_info['process'].terminate()
+                    job = await scheduler.terminate(script_id, websocket) if script_id else None
+                    if job:
                         await websocket.send(json.dumps({
                             'type': 'output',
-                            'content': f"已终止命令: {process_info['command']}",
+                            'content': f"已终止命令: {job.command}",
                             'scriptId': script_id
                         }))
                 
                 elif data['action'] == 'fetch_poets':
-                    # 获取诗人列表
+                    # 获取诗人列表：使用内存中的列表，客户端提供since_version和epoch时只发送变化部分
+                    if poet_cache.version == 0:
+                        # 启动时加载失败，再尝试一次
+                        await poet_cache.load()
+                    poet_cache.subscribe(websocket)
+                    since_version = data.get('since_version')
                     try:
-                        # 尝试导入获取诗人列表的函数
-                        sys.path.append(os.path.join(os.path.dirname(__file__)))
-                        from wordcloud_api_server import get_poets
-                        poets = get_poets()
+                        since_version = int(since_version) if since_version is not None else None
+                    except (TypeError, ValueError):
+                        # 版本号无效时发送完整列表
                         await websocket.send(json.dumps({
-                            'type': 'poet_list',
-                            'success': True,
-                            'poets': poets
-                        }))
-                    except Exception as e:
-                        print(f"获取诗人列表时出错: {str(e)}")
-                        await websocket.send(json.dumps({
-                            'type': 'poet_list',
+                            'type': 'error',
                             'success': False,
-                            'error': str(e)
+                            'message': f"无效的since_version {since_version!r}，发送完整诗人列表"
                         }))
+                        since_version = None
+                    await websocket.send(json.dumps(poet_cache.build_response(since_version, data.get('epoch'))))
+                
+                elif data['action'] == 'refresh_poets':
+                    # 立即重新加载诗人列表，变化会推送给所有订阅的客户端
+                    diff = await poet_cache.refresh()
+                    await websocket.send(json.dumps({
+                        'type': 'poet_list_refreshed',
+                        'success': poet_cache.error is None,
+                        'version': poet_cache.version,
+                        'changed': diff is not None
+                    }))
                 
                 # 处理可视化数据请求
-                elif data['action'] in ['get_emotion_data', 'get_topic_data', 'get_poem_detail']:
+                elif data['action'] in ACTION_TABLES:
                     # 检查是否导入了可视化API模块
                     if handle_visualization_command:
-                        # 处理可视化命令
-                        result = handle_visualization_command(data)
-                        # 使用json_serialize函数处理含有datetime的数据
-                        if json_serialize:
-                            await websocket.send(json_serialize(result))
-                        else:
-                            # 如果没有json_serialize函数，尝试使用标准json
-                            await websocket.send(json.dumps(result, default=str))
+                        # 先查缓存，未命中时才查询数据库；缓存的是按编码方式序列化好的数据
+                        tables = ACTION_TABLES[data['action']]
+                        cache_key = f"{result_cache.make_key(data)}|{codec.name}"
+                        hit, payload = result_cache.get(cache_key, tables)
+                        if not hit:
+                            # 处理可视化命令
+                            result = handle_visualization_command(data)
+                            # 使用json_serialize函数处理含有datetime的数据（没有时使用标准json）
+                            payload = codec.encode(result, json_serialize)
+                            # 只缓存成功的结果
+                            if not isinstance(result, dict) or result.get('success', True):
+                                result_cache.put(cache_key, tables, payload)
+                        await websocket.send(payload)
                     else:
                         # 发送错误信息
                         await websocket.send(json.dumps({
@@ -208,6 +203,49 @@ async def handle_connection(websocket):
                             'message': '可视化API模块未加载'
                         }))
                 
+                elif data['action'] == 'render_poet_distribution':
+                    # 无界面渲染诗人生命阶段分布图表，在线程中执行，不阻塞其他请求
+                    formats = [fmt for fmt in data.get('formats', ['png']) if fmt in ('png', 'svg')] or ['png']
+                    try:
+                        async with render_lock:
+                            rendered = await asyncio.to_thread(
+                                render_poet_distribution, formats, int(data.get('dpi', 300)))
+                        response = dict(rendered, type='poet_distribution_charts', success=True)
+                        if data.get('inline'):
+                            # 直接返回图片内容（base64），前端无需访问服务器文件
+                            response['images'] = {}
+                            for chart, chart_files in rendered['files'].items():
+                                response['images'][chart] = {}
+                                for fmt, path in chart_files.items():
+                                    with open(path, 'rb') as f:
+                                        response['images'][chart][fmt] = base64.b64encode(f.read()).decode('ascii')
+                    except Exception as e:
+                        response = {'type': 'poet_distribution_charts', 'success': False, 'error': str(e)}
+                    await websocket.send(json.dumps(response))
+                
+                elif data['action'] == 'negotiate':
+                    # 协商可视化数据的响应编码（json/msgpack）和压缩方式（none/zstd）
+                    negotiated = codec.negotiate(data.get('encoding'), data.get('compression'))
+                    await websocket.send(json.dumps(dict(negotiated, type='negotiated', success=True)))
+                
+                elif data['action'] == 'db_stats':
+                    # 检查空闲连接并返回连接池统计
+                    health = await asyncio.to_thread(db_pool.health_check)
+                    await websocket.send(json.dumps({
+                        'type': 'db_stats',
+                        'success': True,
+                        'health_check': health,
+                        'pools': pool_metrics()
+                    }))
+                
+                elif data['action'] == 'cache_stats':
+                    # 返回可视化缓存的命中统计
+                    await websocket.send(json.dumps({
+                        'type': 'cache_stats',
+                        'success': True,
+                        'stats': result_cache.stats()
+                    }))
+                
             except json.JSONDecodeError:
                 await websocket.send(json.dumps({
                     'type': 'output',
@@ -215,21 +253,20 @@ async def handle_connection(websocket):
                 }))
     except websockets.exceptions.ConnectionClosed:
         print("客户端断开连接")
+    finally:
+        poet_cache.unsubscribe(websocket)
 
 # 清理所有运行中的进程
 def cleanup_processes():
-    for script_id, info in list(running_processes.items()):
-        try:
-            if info['process'].poll() is None:  # 如果进程仍在运行
-                info['process'].terminate()
-                print(f"已终止进程: {info['command']}")
-        except:
-            pass
-    running_processes.clear()
+    scheduler.cleanup()
+    close_all_pools()
 
 # 启动WebSocket服务器
 async def main():
     # 在localhost的6789端口上启动WebSocket服务器
+    scheduler.start()
+    await poet_cache.load()
+    poet_cache.start()
     server = await websockets.serve(handle_connection, "localhost", 6789)
     print("服务器已启动在 ws://localhost:6789")
     print("现在可以从网页中运行Python脚本了")
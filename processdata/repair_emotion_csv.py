@@ -0,0 +1,243 @@
+import argparse
+import csv
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 输入和输出文件路径：原始导出文件 -> 可直接导入数据库的文件
+# （相当于依次运行fix_emotion_csv.py和events/convert_poemid.py）
+INPUT_FILE = r"D:\01\lunwen\processdata\events\emotion-Prob.csv"
+OUTPUT_FILE = r"D:\01\lunwen\processdata\events\emotion-Prob-fixed-int.csv"
+
+OUTPUT_HEADER = ['poemId', 'emotion', 'le_prob', 'ai_prob', 'xi_prob', 'nu/hao_prob', 'si_prob']
+PROBABILITY_COUNT = 5
+# 并行处理时每个分块的大小
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+# 每类问题最多记录的示例行数
+MAX_SAMPLES = 5
+
+# 预编译的正则表达式
+PROBABILITY_PATTERN = re.compile(r'(\d+\.\d+)')
+EMOTION_SEPARATOR = re.compile(r'[,\s\t]+')
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
+def new_summary():
+    return {
+        'lines': 0,
+        'written': 0,
+        'blank': 0,
+        'no_probability': 0,
+        'invalid_poem_id': 0,
+        'tabs_replaced': 0,
+        'poem_id_normalized': 0,
+        'emotions_normalized': 0,
+        'probabilities_padded': 0,
+        'probabilities_truncated': 0,
+        'samples': {}
+    }
+
+def add_sample(summary, kind, line_number, line):
+    samples = summary['samples'].setdefault(kind, [])
+    if len(samples) < MAX_SAMPLES:
+        samples.append((line_number, line[:200]))
+
+def repair_line(line, line_number, summary):
+    """修复一行数据，返回输出行（列表）；无法修复时返回None"""
+    summary['lines'] += 1
+    if not line.strip():
+        summary['blank'] += 1
+        return None
+
+    # 将制表符替换为逗号
+    if '\t' in line:
+        line = line.replace('\t', ',')
+        summary['tabs_replaced'] += 1
+
+    # 分离poemId
+    poem_id_text, _, rest_of_line = line.partition(',')
+    poem_id_text = poem_id_text.strip().replace('"', '')
+
+    # 寻找所有概率值，第一个概率之前是情感部分
+    prob_matches = PROBABILITY_PATTERN.findall(rest_of_line)
+    if not prob_matches:
+        summary['no_probability'] += 1
+        add_sample(summary, 'no_probability', line_number, line)
+        return None
+    first_prob_start = PROBABILITY_PATTERN.search(rest_of_line).start()
+
+    # poemId统一为整数
+    try:
+        poem_id = str(int(float(poem_id_text.strip())))
+    except (ValueError, OverflowError):
+        summary['invalid_poem_id'] += 1
+        add_sample(summary, 'invalid_poem_id', line_number, line)
+        return None
+    if poem_id != poem_id_text:
+        summary['poem_id_normalized'] += 1
+
+    # 情感可能以逗号、空格或制表符分隔，统一为 "情感1, 情感2"
+    emotion_part = rest_of_line[:first_prob_start].strip().replace('"', '')
+    emotions = [e.strip() for e in EMOTION_SEPARATOR.split(emotion_part) if e.strip()]
+    emotion_str = ", ".join(emotions)
+    if emotion_str != emotion_part.rstrip(','):
+        summary['emotions_normalized'] += 1
+
+    # 确保正好有5个概率值
+    probabilities = prob_matches[:PROBABILITY_COUNT]
+    if len(prob_matches) > PROBABILITY_COUNT:
+        summary['probabilities_truncated'] += 1
+    elif len(probabilities) < PROBABILITY_COUNT:
+        summary['probabilities_padded'] += 1
+        probabilities += ["0.0"] * (PROBABILITY_COUNT - len(probabilities))
+
+    summary['written'] += 1
+    return [poem_id, emotion_str] + probabilities
+
+def find_data_start(input_file):
+    """返回数据部分的起始字节位置（跳过BOM、开头的空行和标题行）"""
+    with open(input_file, 'rb') as f:
+        if f.read(3) != b'\xef\xbb\xbf':
+            f.seek(0)
+        while True:
+            line = f.readline()
+            if not line:
+                return f.tell()
+            if line.strip():
+                return f.tell()
+
+def split_ranges(input_file, start, chunk_size):
+    """把数据部分按chunk_size切分为以换行结尾的字节区间"""
+    size = os.path.getsize(input_file)
+    ranges = []
+    with open(input_file, 'rb') as f:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()  # 延伸到当前行末尾
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def repair_range(input_file, start, end, output_path=None):
+    """修复一个字节区间内的所有行；output_path为None时返回输出内容
+
+    返回 (输出内容或None, 区间内的行数, 统计)，统计中示例行的行号为区间内的相对行号。
+    """
+    summary = new_summary()
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+    lines = LINE_BREAK.split(data)
+    if lines and lines[-1] == '':
+        lines.pop()
+
+    buffer = io.StringIO() if output_path is None else open(output_path, 'w', encoding='utf-8', newline='')
+    try:
+        writer = csv.writer(buffer)
+        for i, line in enumerate(lines, 1):
+            row = repair_line(line, i, summary)
+            if row is not None:
+                writer.writerow(row)
+        content = buffer.getvalue() if output_path is None else None
+    finally:
+        buffer.close()
+    return content, len(lines), summary
+
+def _repair_range_to_file(args):
+    return repair_range(*args)
+
+def merge_summary(total, part, line_offset):
+    for key, value in part.items():
+        if key == 'samples':
+            for kind, samples in value.items():
+                merged = total['samples'].setdefault(kind, [])
+                for line_number, line in samples:
+                    if len(merged) < MAX_SAMPLES:
+                        merged.append((line_number + line_offset, line))
+        else:
+            total[key] += value
+
+def repair_emotion_csv(input_file=INPUT_FILE, output_file=OUTPUT_FILE, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """一次读取原始情感概率CSV并写出修复后的文件，返回修复统计
+
+    workers>1时按字节区间分块并行处理，各块的结果按顺序拼接。
+    """
+    start_time = time.perf_counter()
+    data_start = find_data_start(input_file)
+    ranges = split_ranges(input_file, data_start, chunk_size)
+    summary = new_summary()
+    # 示例行号从标题行之后的第一行算起（与fix_emotion_csv.py的行号一致）
+    line_offset = 0
+
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    tmp_output = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_output, 'w', encoding='utf-8-sig', newline='') as out:
+        csv.writer(out).writerow(OUTPUT_HEADER)
+        if workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                content, line_count, part = repair_range(input_file, start, end)
+                out.write(content)
+                merge_summary(summary, part, line_offset)
+                line_offset += line_count
+        else:
+            with tempfile.TemporaryDirectory(dir=output_dir) as part_dir:
+                tasks = [
+                    (input_file, start, end, os.path.join(part_dir, f'part-{i:05d}.csv'))
+                    for i, (start, end) in enumerate(ranges)
+                ]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    # map按提交顺序返回结果，保证输出顺序与输入一致
+                    for task, (_, line_count, part) in zip(tasks, executor.map(_repair_range_to_file, tasks)):
+                        with open(task[3], 'r', encoding='utf-8', newline='') as part_file:
+                            shutil.copyfileobj(part_file, out)
+                        merge_summary(summary, part, line_offset)
+                        line_offset += line_count
+    os.replace(tmp_output, output_file)
+    summary['seconds'] = time.perf_counter() - start_time
+    summary['chunks'] = len(ranges)
+    return summary
+
+def print_summary(summary, output_file):
+    print(f"处理 {summary['lines']} 行（{summary['chunks']} 个分块），写出 {summary['written']} 行，"
+          f"用时 {summary['seconds']:.2f} 秒")
+    labels = [
+        ('blank', '空行'),
+        ('no_probability', '没有概率值，已跳过'),
+        ('invalid_poem_id', 'poemId无法转换为整数，已跳过'),
+        ('tabs_replaced', '制表符替换为逗号'),
+        ('poem_id_normalized', 'poemId规范化为整数'),
+        ('emotions_normalized', '情感列表重新整理'),
+        ('probabilities_padded', '概率不足5个，补0.0'),
+        ('probabilities_truncated', '概率超过5个，只保留前5个')
+    ]
+    for key, label in labels:
+        if summary[key]:
+            print(f"  {label}: {summary[key]} 行")
+    for kind, samples in summary['samples'].items():
+        for line_number, line in samples:
+            print(f"  [{kind}] 第{line_number}行: {line}")
+    print(f"修复后的文件已保存到 {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='一次流式修复情感概率CSV（合并fix_emotion_csv和convert_poemid两步）')
+    parser.add_argument('--input', default=INPUT_FILE, help='原始情感概率CSV文件')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='修复后的CSV文件')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help='每个分块的大小（MB）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"错误: 找不到输入文件 {args.input}")
+        return
+    summary = repair_emotion_csv(args.input, args.output, args.workers, max(1, args.chunk_size) * 1024 * 1024)
+    print_summary(summary, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import asyncio
+import itertools
+import json
+import os
+import shlex
+import time
+import uuid
+from collections import deque
+
+# 最大并发任务数，可通过环境变量 SCRIPT_MAX_JOBS 配置
+DEFAULT_MAX_JOBS = int(os.environ.get('SCRIPT_MAX_JOBS', '2'))
+# 是否为每个并发槽位分配互不重叠的CPU核心（SCRIPT_PIN_CPUS=1 开启）
+DEFAULT_PIN_CPUS = os.environ.get('SCRIPT_PIN_CPUS', '0') == '1'
+# 保留最近完成的任务数量，供list_scripts展示
+FINISHED_HISTORY_SIZE = 20
+
+# 输出合并发送：每攒够N行或每隔M秒发送一次，避免逐行发送造成大量小帧
+OUTPUT_BATCH_LINES = 50
+OUTPUT_BATCH_INTERVAL = 0.1  # 秒
+# 子进程单行输出的最大长度（字节）
+STREAM_LINE_LIMIT = 1024 * 1024
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+
+def split_command(command):
+    """将命令字符串拆分为参数列表，供create_subprocess_exec使用"""
+    if os.name == 'nt':
+        # Windows下不按POSIX规则处理反斜杠，保留 D:\xx 这样的路径，只去掉引号
+        return [arg.replace('"', '') for arg in shlex.split(command, posix=False)]
+    return shlex.split(command)
+
+def normalize_cpus(cpus):
+    """把客户端提供的CPU核心列表规范化为不重复、升序的核心编号；None表示不指定，无效时抛出ValueError"""
+    if cpus is None:
+        return None
+    if isinstance(cpus, (str, bytes)) or not isinstance(cpus, (list, tuple)):
+        raise ValueError(f"cpus必须是CPU核心编号的列表: {cpus!r}")
+    cpu_count = os.cpu_count() or 1
+    normalized = set()
+    for cpu in cpus:
+        if isinstance(cpu, bool) or not isinstance(cpu, int) or not 0 <= cpu < cpu_count:
+            raise ValueError(f"无效的CPU核心编号 {cpu!r}（可用范围 0-{cpu_count - 1}）")
+        normalized.add(cpu)
+    return sorted(normalized) or None
+
+def set_process_affinity(pid, cpus):
+    """把进程绑定到指定的CPU核心，平台不支持时只打印警告"""
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(pid, cpus)
+            return True
+        import psutil  # Windows/macOS 下依赖psutil（可选）
+        psutil.Process(pid).cpu_affinity(list(cpus))
+        return True
+    except ImportError:
+        print("警告: 当前平台设置CPU亲和性需要安装psutil，已忽略")
+    except Exception as e:
+        print(f"警告: 设置CPU亲和性失败: {str(e)}")
+    return False
+
+class OutputBatcher:
+    """把子进程输出按行缓冲，按行数或时间间隔合并成一条websocket消息"""
+
+    def __init__(self, websocket, script_id, max_lines=OUTPUT_BATCH_LINES):
+        self.websocket = websocket
+        self.script_id = script_id
+        self.max_lines = max_lines
+        self.lines = []
+        self.closed = False  # 发送失败后不再发送，但继续读取子进程输出
+
+    async def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.max_lines:
+            await self.flush()
+
+    async def flush(self):
+        if not self.lines:
+            return
+        lines, self.lines = self.lines, []
+        if self.closed:
+            return
+        try:
+            await self.websocket.send(json.dumps({
+                'type': 'output',
+                'content': '\n'.join(lines),
+                'lines': len(lines),
+                'scriptId': self.script_id
+            }))
+        except Exception:
+            # 如果发送失败，假定连接已关闭
+            self.closed = True
+
+    async def send(self, message):
+        """发送一条非输出消息（状态等），发送前先把缓冲的输出发出去"""
+        await self.flush()
+        if self.closed:
+            return
+        message = dict(message, scriptId=self.script_id)
+        try:
+            await self.websocket.send(json.dumps(message))
+        except Exception:
+            self.closed = True
+
+class ScriptJob:
+    """调度器中的一个脚本任务"""
+
+    def __init__(self, command, priority=0, cpus=None):
+        self.id = str(uuid.uuid4())
+        self.command = command
+        self.key = ' '.join(split_command(command))  # 用于识别相同的命令
+        self.priority = priority
+        self.cpus = cpus
+        self.status = JOB_QUEUED
+        self.result = None  # completed / error / terminated / cancelled
+        self.exit_code = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.process = None
+        self.subscribers = []  # 每个订阅者一个OutputBatcher
+
+    def script_ids(self):
+        return [batcher.script_id for batcher in self.subscribers]
+
+    def to_dict(self):
+        script_ids = self.script_ids()
+        return {
+            'id': script_ids[0] if script_ids else self.id,
+            'jobId': self.id,
+            'scriptIds': script_ids,
+            'command': self.command,
+            'status': self.status,
+            'result': self.result,
+            'exit_code': self.exit_code,
+            'priority': self.priority,
+            'cpus': list(self.cpus) if self.cpus else None,
+            'submit_time': self.submit_time,
+            'start_time': self.start_time,
+            'end_time': self.end_time
+        }
+
+    async def broadcast(self, message):
+        for batcher in self.subscribers:
+            await batcher.send(message)
+
+class ScriptScheduler:
+    """有界的脚本任务调度器：优先级队列 + 固定数量的工作协程"""
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, pin_cpus=DEFAULT_PIN_CPUS):
+        self.max_jobs = max(1, max_jobs)
+        self.pin_cpus = pin_cpus
+        self.queue = asyncio.PriorityQueue()
+        self.sequence = itertools.count()  # 同优先级按提交顺序（FIFO）
+        self.active = {}  # job_id -> ScriptJob（排队中或运行中）
+        self.finished = deque(maxlen=FINISHED_HISTORY_SIZE)
+        self.workers = []
+        self.on_job_finished = None  # 可选回调：任务结束时调用 callback(job)
+
+    def slot_cpus(self, slot):
+        """为工作槽位分配互不重叠的CPU核心"""
+        cpu_count = os.cpu_count() or 1
+        if cpu_count < self.max_jobs:
+            return None
+        return list(range(cpu_count))[slot::self.max_jobs]
+
+    def start(self):
+        """启动工作协程，需在事件循环中调用"""
+        for slot in range(self.max_jobs):
+            self.workers.append(asyncio.create_task(self._worker(slot)))
+        print(f"任务调度器已启动，最大并发任务数: {self.max_jobs}")
+
+    async def submit(self, websocket, command, script_id, priority=0, cpus=None):
+        """提交任务；相同命令已在排队或运行时复用该任务，返回 (job, 是否复用)"""
+        batcher = OutputBatcher(websocket, script_id)
+        key = ' '.join(split_command(command))
+        for job in self.active.values():
+            if job.key == key:
+                job.subscribers.append(batcher)
+                return job, True
+
+        job = ScriptJob(command, priority=priority, cpus=cpus)
+        job.subscribers.append(batcher)
+        self.active[job.id] = job
+        # 优先级数值越大越先执行
+        await self.queue.put((-priority, next(self.sequence), job))
+        return job, False
+
+    def is_saturated(self):
+        """所有并发槽位是否都被占用"""
+        running = sum(1 for job in self.active.values() if job.status == JOB_RUNNING)
+        return running >= self.max_jobs
+
+    def queue_position(self, job):
+        """任务在等待队列中的位置（从1开始）"""
+        queued = sorted(
+            (j for j in self.active.values() if j.status == JOB_QUEUED),
+            key=lambda j: (-j.priority, j.submit_time)
+        )
+        for position, queued_job in enumerate(queued, 1):
+            if queued_job is job:
+                return position
+        return 0
+
+    def find_job(self, script_id, websocket=None):
+        """根据scriptId（或jobId）查找排队中或运行中的任务；指定websocket时只查找该客户端订阅的任务"""
+        for job in self.active.values():
+            if (websocket is None and job.id == script_id) or self._matching_subscribers(job, script_id, websocket):
+                return job
+        return None
+
+    def _matching_subscribers(self, job, script_id, websocket=None):
+        """任务中与scriptId（或jobId）对应、且属于该客户端的订阅者"""
+        return [
+            b for b in job.subscribers
+            if (websocket is None or b.websocket is websocket)
+            and (b.script_id == script_id or job.id == script_id)
+        ]
+
+    async def terminate(self, script_id, websocket=None):
+        """终止任务；还有其他订阅者时只取消当前客户端的订阅，最后一个订阅者离开时才真正终止"""
+        job = self.find_job(script_id, websocket)
+        if not job:
+            return None
+        matching = self._matching_subscribers(job, script_id, websocket)
+        if len(matching) < len(job.subscribers):
+            for batcher in matching:
+                job.subscribers.remove(batcher)
+                await batcher.send({'type': 'status', 'status': 'completed', 'result': 'detached'})
+            return job
+        if job.status == JOB_QUEUED:
+            # 排队中的任务直接标记为取消，工作协程取出时会跳过
+            await self._finish(job, 'cancelled')
+        elif job.process and job.process.returncode is None:
+            job.result = 'terminated'
+            job.process.terminate()
+        return job
+
+    def list_jobs(self):
+        """排队中/运行中的任务放在scripts中，最近完成的任务放在finished中"""
+        return {
+            'scripts': [job.to_dict() for job in self.active.values()],
+            'finished': [job.to_dict() for job in reversed(self.finished)],
+            'max_jobs': self.max_jobs
+        }
+
+    async def _worker(self, slot):
+        while True:
+            _, _, job = await self.queue.get()
+            if job.status != JOB_QUEUED:
+                continue  # 已取消
+            cpus = job.cpus or (self.slot_cpus(slot) if self.pin_cpus else None)
+            await self._run_job(job, cpus)
+
+    async def _run_job(self, job, cpus):
+        job.status = JOB_RUNNING
+        job.start_time = time.time()
+        timer_task = None
+        try:
+            # 子进程使用无缓冲、UTF-8输出，使print的内容能实时传回
+            env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONIOENCODING='utf-8')
+
+            # 在子进程中执行命令（异步，不阻塞事件循环）
+            job.process = await asyncio.create_subprocess_exec(
+                *split_command(job.command),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=env,
+                limit=STREAM_LINE_LIMIT
+            )
+            if cpus:
+                job.cpus = cpus
+                set_process_affinity(job.process.pid, cpus)
+            await job.broadcast({'type': 'status', 'status': 'running'})
+
+            # 实时发送输出（合并为批次）
+            timer_task = asyncio.create_task(self._flush_periodically(job))
+            while True:
+                line = await job.process.stdout.readline()
+                if not line:
+                    break
+                text = line.decode('utf-8', errors='replace').strip()
+                for batcher in list(job.subscribers):
+                    await batcher.add(text)
+
+            # 等待进程完成
+            await job.process.wait()
+            job.exit_code = job.process.returncode
+            await self._finish(job, job.result or 'completed')
+        except Exception as e:
+            if job.process and job.process.returncode is None:
+                try:
+                    job.process.terminate()
+                except:
+                    pass
+            await job.broadcast({'type': 'output', 'content': f"错误: {str(e)}"})
+            await self._finish(job, 'error')
+        finally:
+            if timer_task:
+                timer_task.cancel()
+
+    async def _flush_periodically(self, job):
+        """定时发送缓冲区中的输出，保证慢速输出也能及时送达"""
+        while True:
+            await asyncio.sleep(OUTPUT_BATCH_INTERVAL)
+            for batcher in list(job.subscribers):
+                await batcher.flush()
+
+    async def _finish(self, job, result):
+        job.status = JOB_FINISHED
+        job.result = result
+        job.end_time = time.time()
+        self.active.pop(job.id, None)
+        self.finished.append(job)
+        # 前端只识别completed/error两种结束状态
+        status = 'completed' if result in ('completed', 'terminated', 'cancelled') else 'error'
+        await job.broadcast({
+            'type': 'status',
+            'status': status,
+            'result': result,
+            'exit_code': job.exit_code
+        })
+        if self.on_job_finished:
+            try:
+                self.on_job_finished(job)
+            except Exception as e:
+                print(f"任务结束回调出错: {str(e)}")
+
+    def cleanup(self):
+        """终止所有运行中的进程（同步调用，用于退出时清理）"""
+        for job in list(self.active.values()):
+            try:
+                if job.process and job.process.returncode is None:  # 如果进程仍在运行
+                    job.process.terminate()
+                    print(f"已终止进程: {job.command}")
+            except:
+                pass
+        self.active.clear()
+        for worker in self.workers:
+            worker.cancel()
@@ -0,0 +1,38 @@
+import hashlib
+import os
+
+import joblib
+import numpy as np
+
+# 拟合好的降维/聚类模型保存在本地缓存目录，供增量处理新诗词时直接transform
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'models')
+
+def data_fingerprint(keys, vectors):
+    """训练数据的内容指纹：诗词ID顺序和向量内容任一变化都会改变指纹"""
+    h = hashlib.sha1()
+    h.update('\n'.join(str(key) for key in keys).encode('utf-8'))
+    h.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+def model_path(name):
+    return os.path.join(MODEL_DIR, f'{name}.joblib')
+
+def save_model(name, payload):
+    """保存模型及其元数据（字典），先写临时文件再替换，避免留下不完整的模型文件"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = model_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(payload, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def load_model(name):
+    """读取保存的模型，不存在或无法读取时返回None"""
+    path = model_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        print(f"读取模型 {path} 失败: {e}")
+        return None
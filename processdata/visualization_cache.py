@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# 缓存目录和版本文件：可视化脚本写入新结果后更新版本号，服务器据此让缓存失效
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+VERSION_FILE = os.path.join(CACHE_DIR, 'visualization_versions.json')
+
+# 每个可视化命令依赖的数据表
+ACTION_TABLES = {
+    'get_emotion_data': ('emotion_probability_visualization',),
+    'get_topic_data': ('topic_visualization',),
+    'get_poem_detail': ('emotion_probability_visualization', 'topic_visualization')
+}
+
+# 不参与缓存键计算的字段（只用于前端区分请求）
+IGNORED_KEY_FIELDS = ('requestId',)
+
+def read_visualization_versions():
+    """读取各数据表的版本号，文件不存在时返回空字典"""
+    try:
+        with open(VERSION_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def mark_visualization_updated(table):
+    """可视化结果表写入新数据后调用，使服务器中相关缓存失效"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        versions = read_visualization_versions()
+        entry = versions.get(table, {})
+        versions[table] = {
+            'version': entry.get('version', 0) + 1,
+            'updated_at': time.time()
+        }
+        # 先写临时文件再替换，避免服务器读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(versions, f, ensure_ascii=False)
+        os.replace(tmp_path, VERSION_FILE)
+        print(f"已更新可视化缓存版本: {table} -> {versions[table]['version']}")
+    except Exception as e:
+        print(f"更新可视化缓存版本失败: {str(e)}")
+
+class ResultCache:
+    """可视化命令结果的进程内LRU缓存，带TTL和基于数据表版本的自动失效"""
+
+    def __init__(self, max_entries=128, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (过期时间, 依赖表的版本, 值)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._versions = {}
+        self._versions_mtime = None
+
+    def make_key(self, data):
+        """按action和参数生成缓存键"""
+        params = {k: v for k, v in data.items() if k not in IGNORED_KEY_FIELDS}
+        return json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+    def current_versions(self, tables):
+        """获取数据表当前版本，只在版本文件修改后重新读取"""
+        try:
+            mtime = os.stat(VERSION_FILE).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._versions_mtime:
+            self._versions = read_visualization_versions()
+            self._versions_mtime = mtime
+        return tuple(self._versions.get(table, {}).get('version', 0) for table in tables)
+
+    def get(self, key, tables):
+        """返回 (是否命中, 值)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, versions, value = entry
+                if expires_at >= time.time() and versions == self.current_versions(tables):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                # 过期或数据已更新
+                del self.entries[key]
+                self.invalidations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, tables, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, self.current_versions(tables), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / total if total else 0.0
+            }
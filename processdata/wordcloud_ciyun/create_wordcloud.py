@@ -1,5 +1,4 @@
 import os
-import pymysql
 import numpy as np
 import pandas as pd
 from wordcloud import WordCloud, ImageColorGenerator, STOPWORDS
@@ -15,22 +14,23 @@ import tkinter as tk
 from tkinter import ttk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import argparse
+import sys
+
+# 导入上级目录的数据库连接池模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_pool, DRIVER_PYMYSQL
+
+# 数据库连接池（连接参数见db/config.py，可用环境变量覆盖）
+db_pool = get_pool(driver=DRIVER_PYMYSQL)
 
 # 设置matplotlib支持中文显示
 matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'SimSun', 'Arial Unicode MS']  # 优先使用的字体系列
 matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号'-'显示为方块的问题
 matplotlib.rcParams['font.family'] = 'sans-serif'
 
-# 连接MySQL数据库
+# 从连接池获取MySQL连接，用完后调用db_pool.release归还
 def connect_to_mysql():
-    connection = pymysql.connect(
-        host='localhost',
-        user='root',
-        password='123456',  # 请替换为您的数据库密码
-        database='lunwen',
-        charset='utf8mb4'
-    )
-    return connection
+    return db_pool.acquire()
 
 # 获取所有诗人列表
 def get_poets():
@@ -44,7 +44,7 @@ def get_poets():
             poets = [result[0] for result in results if result[0]]
             return poets
     finally:
-        connection.close()
+        db_pool.release(connection)
 
 # 根据诗人获取topicWords数据
 def get_topic_words_by_poet(poet_name=None):
@@ -68,7 +68,7 @@ def get_topic_words_by_poet(poet_name=None):
             results = cursor.fetchall()
             return results
     finally:
-        connection.close()
+        db_pool.release(connection)
 
 # 处理topicWords数据，统计词频
 def process_topic_words(topic_words_data):
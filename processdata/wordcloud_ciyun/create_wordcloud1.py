@@ -1,5 +1,4 @@
 import os
-import pymysql
 import numpy as np
 import pandas as pd
 from wordcloud import WordCloud, ImageColorGenerator
@@ -10,17 +9,18 @@ import re
 import cv2
 import traceback
 import hashlib
+import sys
 
-# 连接MySQL数据库
+# 导入上级目录的数据库连接池模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import get_pool, DRIVER_PYMYSQL
+
+# 数据库连接池（连接参数见db/config.py，可用环境变量覆盖）
+db_pool = get_pool(driver=DRIVER_PYMYSQL)
+
+# 从连接池获取MySQL连接，用完后调用db_pool.release归还
 def connect_to_mysql():
-    connection = pymysql.connect(
-        host='localhost',
-        user='root',
-        password='123456',  # 请替换为您的数据库密码
-        database='lunwen',
-        charset='utf8mb4'
-    )
-    return connection
+    return db_pool.acquire()
 
 # 从数据库获取topicWords数据
 def get_topic_words():
@@ -33,7 +33,7 @@ def get_topic_words():
             results = cursor.fetchall()
             return results
     finally:
-        connection.close()
+        db_pool.release(connection)
 
 # 处理topicWords数据，统计词频
 def process_topic_words(topic_words_data):